@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'PROJECT.settings')
+# Serve the read endpoints with async views (see app_api/async_urls.py).
+os.environ.setdefault('ASYNC_READS', '1')
 
 application = get_asgi_application()
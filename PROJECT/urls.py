@@ -8,9 +8,15 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
+from app_api.metrics import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("api/v1/", include("app_api.urls")),
+    path("metrics/", metrics_view, name="metrics"),
+    path(
+        "api/v1/",
+        include("app_api.async_urls" if settings.ASYNC_READS else "app_api.urls"),
+    ),
     path("api/v1/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("api/v1/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path(
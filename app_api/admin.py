@@ -1,18 +1,132 @@
+import json
+
+from django.conf import settings
 from django.contrib import admin
-from django.contrib.auth.models import Group as UserGroup
+from django.contrib.auth.models import Group as UserGroup, Permission
 from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
 from .models import Admin, Teacher, Parent, Student, Subject, Group, Lesson, Attendance
 
 User = get_user_model()
 
+ADMIN_EXACT_COUNT_LIMIT = getattr(settings, "ADMIN_EXACT_COUNT_LIMIT", 10000)
+
+
+def estimate_count(queryset):
+    """
+    Returns the planner's row estimate of a queryset on PostgreSQL, which costs
+    no table scan, or None on other databases.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts exactly only when the planner estimates fewer than ADMIN_EXACT_COUNT_LIMIT
+    rows. Larger changelists show the estimate, as COUNT(*) over millions of rows
+    would dominate the page.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate >= ADMIN_EXACT_COUNT_LIMIT:
+            return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Base admin for tables too large to count or to list in <select> widgets."""
+
+    paginator = EstimatedCountPaginator
+    # Skips the unfiltered COUNT(*) shown next to filtered results.
+    show_full_result_count = False
+
+
+class UserAdmin(LargeTableAdmin):
+    list_display = ("email", "first_name", "last_name", "role", "is_active", "created")
+    # Served by the role-leading indexes and, on PostgreSQL, the trigram indexes.
+    list_filter = ("role",)
+    search_fields = ("first_name", "last_name", "email")
+    ordering = ("-created", "-id")
+    autocomplete_fields = ("student_groups",)
+    filter_horizontal = ("groups", "user_permissions")
+
+    def formfield_for_manytomany(self, db_field, request=None, **kwargs):
+        if db_field.name == "user_permissions":
+            # Permission.__str__ shows its content type.
+            kwargs["queryset"] = Permission.objects.select_related("content_type")
+        return super().formfield_for_manytomany(db_field, request=request, **kwargs)
+
+
+class RoleAdmin(UserAdmin):
+    """Admin of a role proxy, whose manager already filters on the role."""
+
+    list_filter = ()
+
+
+class SubjectAdmin(admin.ModelAdmin):
+    list_display = ("name", "groups_count", "students_count")
+    search_fields = ("name",)
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = (
+        "name",
+        "teacher",
+        "subject",
+        "lesson_days",
+        "start_date",
+        "end_date",
+        "is_active",
+        "students_count",
+    )
+    list_select_related = ("teacher", "subject")
+    list_filter = ("is_active", "lesson_days")
+    search_fields = ("name",)
+    autocomplete_fields = ("teacher", "subject")
+
+
+class LessonAdmin(LargeTableAdmin):
+    list_display = ("lesson_date", "group", "theme")
+    # Group.__str__ shows the teacher's name.
+    list_select_related = ("group__teacher",)
+    search_fields = ("theme", "group__name")
+    ordering = ("-id",)
+    autocomplete_fields = ("group",)
+
+
+class AttendanceAdmin(LargeTableAdmin):
+    list_display = ("student", "lesson__group", "lesson__lesson_date", "is_absent")
+    list_select_related = ("student", "lesson__group__teacher")
+    # The date filter narrows the lessons first, then reads attendance through the
+    # (lesson, student) unique index.
+    list_filter = ("is_absent", ("lesson__lesson_date", admin.DateFieldListFilter))
+    ordering = ("-id",)
+    raw_id_fields = ("lesson",)
+    autocomplete_fields = ("student",)
+
+
 admin.site.unregister(UserGroup)
-admin.site.register(User)
-admin.site.register(Admin)
-admin.site.register(Teacher)
-admin.site.register(Parent)
-admin.site.register(Student)
-admin.site.register(Subject)
-admin.site.register(Group)
-admin.site.register(Lesson)
-admin.site.register(Attendance)
+admin.site.register(User, UserAdmin)
+admin.site.register(Admin, RoleAdmin)
+admin.site.register(Teacher, RoleAdmin)
+admin.site.register(Parent, RoleAdmin)
+admin.site.register(Student, RoleAdmin)
+admin.site.register(Subject, SubjectAdmin)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Lesson, LessonAdmin)
+admin.site.register(Attendance, AttendanceAdmin)
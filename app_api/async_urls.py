@@ -0,0 +1,30 @@
+from django.urls import path
+
+from . import views
+from .async_views import AsyncSyncView, read_views
+from .urls import urlpatterns as sync_urlpatterns
+
+users_list, users_detail = read_views(views.UserViewSet)
+teachers_list, teachers_detail = read_views(views.TeacherViewSet)
+students_list, students_detail = read_views(views.StudentViewSet)
+subjects_list, subjects_detail = read_views(views.SubjectViewSet)
+groups_list, groups_detail = read_views(views.GroupViewSet)
+lessons_list, lessons_detail = read_views(views.LessonViewSet)
+
+# Read routes served with the async ORM, ahead of the regular router routes
+# that still handle every other endpoint.
+urlpatterns = [
+    path("users/", users_list, name="users-list"),
+    path("users/<int:pk>/", users_detail, name="users-detail"),
+    path("teachers/", teachers_list, name="teachers-list"),
+    path("teachers/<int:pk>/", teachers_detail, name="teachers-detail"),
+    path("students/", students_list, name="students-list"),
+    path("students/<int:pk>/", students_detail, name="students-detail"),
+    path("subjects/", subjects_list, name="subjects-list"),
+    path("subjects/<int:pk>/", subjects_detail, name="subjects-detail"),
+    path("groups/", groups_list, name="groups-list"),
+    path("groups/<int:pk>/", groups_detail, name="groups-detail"),
+    path("lessons/", lessons_list, name="lessons-list"),
+    path("lessons/<int:pk>/", lessons_detail, name="lessons-detail"),
+    path("sync/", AsyncSyncView.as_view(), name="sync-list"),
+] + sync_urlpatterns
@@ -0,0 +1,171 @@
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.response import Response
+
+from . import views
+from .mixins import CachedListMixin
+
+LIST_ACTIONS = {"get": "list", "post": "create"}
+DETAIL_ACTIONS = {
+    "get": "retrieve",
+    "put": "update",
+    "patch": "partial_update",
+    "delete": "destroy",
+}
+
+
+class AsyncReadView(View):
+    """
+    Serves the list or detail route of a DRF viewset under ASGI.
+
+    GET and HEAD are answered with the async ORM, reusing the viewset's queryset,
+    filters, pagination, serializers and conditional GET validators, so a slow
+    client never holds a worker thread. Every other method is delegated to the
+    regular sync viewset.
+    """
+
+    viewset_class = None
+    actions = None
+    sync_view = None
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        viewset_class = initkwargs.get("viewset_class", cls.viewset_class)
+        initkwargs["sync_view"] = viewset_class.as_view(initkwargs.get("actions", cls.actions))
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    def get_viewset(self, request, *args, **kwargs):
+        viewset = self.viewset_class()
+        viewset.action_map = self.actions
+        viewset.args = args
+        viewset.kwargs = kwargs
+        viewset.format_kwarg = None
+        viewset.request = viewset.initialize_request(request, *args, **kwargs)
+        viewset.headers = viewset.default_response_headers
+        return viewset
+
+    async def get(self, request, *args, **kwargs):
+        viewset = self.get_viewset(request, *args, **kwargs)
+        drf_request = viewset.request
+
+        try:
+            # Authentication, permissions, throttling and content negotiation.
+            await sync_to_async(viewset.initial)(drf_request, *args, **kwargs)
+            if self.actions is DETAIL_ACTIONS:
+                response = await self.aretrieve(viewset, **kwargs)
+            else:
+                response = await self.alist(viewset)
+        except Exception as exc:
+            response = viewset.handle_exception(exc)
+
+        return viewset.finalize_response(drf_request, response, *args, **kwargs)
+
+    async def head(self, request, *args, **kwargs):
+        return await self.get(request, *args, **kwargs)
+
+    async def alist(self, viewset):
+        """Lists through the response cache of viewsets with CachedListMixin."""
+        if not isinstance(viewset, CachedListMixin):
+            return await self.alist_uncached(viewset)
+
+        # The cache backends are sync.
+        response = await sync_to_async(viewset.get_cached_response)(viewset.request)
+        if response is None:
+            response = await self.alist_uncached(viewset)
+            await sync_to_async(viewset.cache_response)(viewset.request, response)
+        return response
+
+    async def alist_uncached(self, viewset):
+        queryset = viewset.filter_queryset(viewset.get_queryset())
+
+        values = await queryset.order_by().aaggregate(**viewset.get_validator_aggregates())
+        # Lists carry no Last-Modified (see ConditionalGetMixin).
+        etag, _, _ = viewset.build_validators(values)
+        not_modified = viewset.get_not_modified_response(etag, None)
+        if not_modified is not None:
+            return viewset.set_validator_headers(not_modified, etag, None)
+
+        page = await viewset.paginator.apaginate_queryset(queryset, viewset.request, view=viewset)
+        if page is None:
+            page = [obj async for obj in queryset]
+            response = Response(viewset.get_serializer(page, many=True).data)
+        else:
+            response = viewset.get_paginated_response(
+                viewset.get_serializer(page, many=True).data
+            )
+
+        return viewset.set_validator_headers(response, etag, None)
+
+    async def aretrieve(self, viewset, **kwargs):
+        lookup_url_kwarg = viewset.lookup_url_kwarg or viewset.lookup_field
+        try:
+            queryset = viewset.filter_queryset(viewset.get_queryset()).filter(
+                **{viewset.lookup_field: kwargs[lookup_url_kwarg]}
+            )
+        except (TypeError, ValueError):
+            raise Http404
+
+        values = await queryset.order_by().aaggregate(**viewset.get_validator_aggregates())
+        etag, last_modified, count = viewset.build_validators(values)
+        if not count:
+            raise Http404
+
+        not_modified = viewset.get_not_modified_response(etag, last_modified)
+        if not_modified is not None:
+            return viewset.set_validator_headers(not_modified, etag, last_modified)
+
+        try:
+            instance = await queryset.aget()
+        except queryset.model.DoesNotExist:
+            raise Http404
+        await sync_to_async(viewset.check_object_permissions)(viewset.request, instance)
+
+        response = Response(viewset.get_serializer(instance).data)
+        return viewset.set_validator_headers(response, etag, last_modified)
+
+    async def delegate(self, request, *args, **kwargs):
+        return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+    post = put = patch = delete = options = delegate
+
+
+class AsyncSyncView(View):
+    """Async counterpart of SyncViewSet.list()."""
+
+    async def get(self, request):
+        viewset = views.SyncViewSet()
+        viewset.action_map = {"get": "list"}
+        viewset.args, viewset.kwargs = (), {}
+        viewset.format_kwarg = None
+        drf_request = viewset.request = viewset.initialize_request(request)
+        viewset.headers = viewset.default_response_headers
+
+        try:
+            await sync_to_async(viewset.initial)(drf_request)
+            response = Response(data=await self.get_data(viewset, drf_request))
+        except Exception as exc:
+            response = viewset.handle_exception(exc)
+
+        return viewset.finalize_response(drf_request, response)
+
+    async def get_data(self, viewset, request):
+        state = await sync_to_async(viewset.get_state)(request)
+        changes = {
+            resource: [obj async for obj in queryset]
+            for resource, queryset, _ in viewset.get_changes(state)
+        }
+        tombstones = viewset.get_tombstones(state)
+        if tombstones is not None:
+            tombstones = [tombstone async for tombstone in tombstones]
+        return viewset.build_data(request, state, changes, tombstones)
+
+
+def read_views(viewset_class):
+    """Returns the (list view, detail view) pair of a viewset."""
+    return (
+        AsyncReadView.as_view(viewset_class=viewset_class, actions=LIST_ACTIONS),
+        AsyncReadView.as_view(viewset_class=viewset_class, actions=DETAIL_ACTIONS),
+    )
@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .routers import primary_reads
+
+
+class LocalLRUCache:
+    """
+    Thread-safe, process-local LRU cache whose entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class CachedUserStore:
+    """
+    Two-level cache of authenticated users: a process-local LRU in front of
+    Django's cache framework.
+
+    An entry holds the values of `fields`, those authentication and permission
+    checks read, and the digest of the password hash that simplejwt compares with
+    the "hash_password" claim of tokens (which carry the same digest). The password
+    hash itself is never cached; it and the other fields are deferred and loaded
+    from the primary on access.
+
+    Saving or deleting a user invalidates both levels in the current process and
+    the second level in the configured cache. The second level is shared by every
+    process only with a shared backend (Redis, set REDIS_URL); other processes may
+    then keep serving a stale user from their local level for at most
+    AUTH_USER_CACHE_LOCAL_TTL seconds. With the per-process local-memory backend
+    they keep it for up to AUTH_USER_CACHE_TTL seconds.
+    """
+
+    key_prefix = "auth:user:"
+    fields = (
+        "id",
+        "email",
+        "first_name",
+        "last_name",
+        "role",
+        "is_active",
+        "is_staff",
+        "is_superuser",
+    )
+
+    def __init__(self):
+        self.local = LocalLRUCache(
+            maxsize=getattr(settings, "AUTH_USER_CACHE_SIZE", 1024),
+            ttl=getattr(settings, "AUTH_USER_CACHE_LOCAL_TTL", 30),
+        )
+        self.ttl = getattr(settings, "AUTH_USER_CACHE_TTL", 300)
+
+    def get(self, user_id):
+        """Returns the cached (user, password digest) of `user_id`, or None."""
+        entry = self.local.get(user_id)
+        if entry is None:
+            entry = cache.get(f"{self.key_prefix}{user_id}")
+            if entry is None:
+                return None
+            self.local.set(user_id, entry)
+
+        values, password_digest = entry
+        model = get_user_model()
+        # from_db() takes the values in the order of the model's fields.
+        names = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+        # Every request gets its own instance, so that one request cannot modify another's user.
+        user = model.from_db(DEFAULT_DB_ALIAS, names, [values[name] for name in names])
+        return user, password_digest
+
+    def set(self, user):
+        entry = (
+            {field: getattr(user, field) for field in self.fields},
+            get_md5_hash_password(user.password),
+        )
+        self.local.set(user.pk, entry)
+        cache.set(f"{self.key_prefix}{user.pk}", entry, self.ttl)
+
+    def invalidate(self, user_id):
+        def delete():
+            self.local.delete(user_id)
+            cache.delete(f"{self.key_prefix}{user_id}")
+
+        delete()
+        # A request running concurrently with the write may have re-cached the old row.
+        transaction.on_commit(delete)
+
+
+user_store = CachedUserStore()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user from `user_store`,
+    so that authenticating a request does not hit the database in the common case.
+    Cached users go through the same is_active and CHECK_REVOKE_TOKEN checks.
+
+    On a miss the user is read from the primary: it is cached for a while, so a
+    replica that has not caught up with a change (e.g. a deactivation) would make
+    the stale row outlive the replication lag.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        cached = user_store.get(user_id)
+        if cached is None:
+            with primary_reads():
+                user = super().get_user(validated_token)
+            user_store.set(user)
+            return user
+
+        user, password_digest = cached
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if (
+            api_settings.CHECK_REVOKE_TOKEN
+            and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != password_digest
+        ):
+            raise AuthenticationFailed(
+                _("The user's password has been changed."), code="password_changed"
+            )
+
+        return user
@@ -0,0 +1,195 @@
+import io
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.http import Http404
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = "/api/v1/"
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+# Response headers passed back for every sub-request.
+RESPONSE_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Location", "Server-Timing")
+# Headers a sub-request may set; anything else (Host, X-Forwarded-For, ...) comes
+# from the batch request.
+SUB_REQUEST_HEADERS = (
+    "Accept-Language",
+    "If-Match",
+    "If-Modified-Since",
+    "If-None-Match",
+    "If-Unmodified-Since",
+)
+# Outer request headers that sub-requests must not inherit.
+PER_REQUEST_META = (
+    "CONTENT_LENGTH",
+    "CONTENT_TYPE",
+    "HTTP_ACCEPT",
+    "HTTP_ACCEPT_ENCODING",
+    "HTTP_IF_MATCH",
+    "HTTP_IF_MODIFIED_SINCE",
+    "HTTP_IF_NONE_MATCH",
+    "HTTP_IF_UNMODIFIED_SINCE",
+    "QUERY_STRING",
+)
+
+BATCH_WORKERS = getattr(settings, "BATCH_WORKERS", 4)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def build_request(outer, method, path, body=None, headers=None):
+    """
+    Builds a sub-request that inherits the outer request's environment, including
+    its Authorization header, but has its own method, path, query, JSON body and
+    SUB_REQUEST_HEADERS. Other headers are ignored.
+    """
+    url = urlsplit(path)
+    payload = b"" if body is None else json.dumps(body).encode()
+
+    environ = {key: value for key, value in outer.META.items() if key not in PER_REQUEST_META}
+    environ.update(
+        {
+            "REQUEST_METHOD": method,
+            "PATH_INFO": url.path,
+            "SCRIPT_NAME": "",
+            "QUERY_STRING": url.query,
+            "HTTP_ACCEPT": "application/json",
+            "CONTENT_TYPE": "application/json",
+            "CONTENT_LENGTH": str(len(payload)),
+            "wsgi.input": io.BytesIO(payload),
+        }
+    )
+    allowed = {name.lower() for name in SUB_REQUEST_HEADERS}
+    for name, value in (headers or {}).items():
+        if name.lower() in allowed:
+            environ["HTTP_" + name.upper().replace("-", "_")] = value
+
+    return WSGIRequest(environ)
+
+
+def resolve_view(path):
+    """Returns the resolver match of an API path, or None if it is not a batchable route."""
+    path = urlsplit(path).path
+    if not path.startswith(API_PREFIX):
+        return None
+    try:
+        match = resolve(path)
+    except (Resolver404, Http404):
+        return None
+    if match.url_name == "batch-list":
+        return None
+    return match
+
+
+def run_one(outer, item):
+    match = resolve_view(item["path"])
+    if match is None:
+        return {"status": 404, "headers": {}, "body": {"detail": "Not found."}}
+
+    request = build_request(
+        outer, item["method"], item["path"], item.get("body"), item.get("headers")
+    )
+    request.resolver_match = match
+
+    view = match.func
+    if iscoroutinefunction(view):
+        response = async_to_sync(view)(request, *match.args, **match.kwargs)
+    else:
+        response = view(request, *match.args, **match.kwargs)
+    if hasattr(response, "render"):
+        response.render()
+
+    if response.streaming:
+        # Exports are meant to be downloaded, not embedded in a JSON body.
+        response.close()
+        detail = "Streaming responses cannot be batched."
+        return {"status": 406, "headers": {}, "body": {"detail": detail}}
+    if hasattr(response, "data"):
+        body = response.data
+    elif response.content and response.get("Content-Type", "").startswith("application/json"):
+        body = json.loads(response.content)
+    else:
+        body = response.content.decode() or None
+
+    return {
+        "status": response.status_code,
+        "headers": {name: response[name] for name in RESPONSE_HEADERS if response.has_header(name)},
+        "body": None if response.status_code == 304 else body,
+    }
+
+
+def run_item(outer, item):
+    """run_one(), answering an unhandled error with a 500 entry instead of failing the batch."""
+    try:
+        return run_one(outer, item)
+    except Exception:
+        logger.exception("Batch sub-request %s %s failed", item["method"], item["path"])
+        return {"status": 500, "headers": {}, "body": {"detail": "A server error occurred."}}
+
+
+def run_in_thread(outer, item):
+    try:
+        return run_item(outer, item)
+    finally:
+        # Pool threads open their own database connections.
+        connections.close_all()
+
+
+def run_batch(outer, items, parallel=False):
+    """
+    Runs sub-requests against the API routes and returns their responses in order.
+
+    With `parallel`, consecutive read sub-requests (GET/HEAD/OPTIONS) run
+    concurrently on a shared thread pool, each in a copy of the batch request's
+    context, so they keep its replica routing and metrics. Writes always run alone
+    and in order, so a read listed after a write sees its effect. A sub-request
+    failing with an unhandled error gets a 500 entry; the others still run.
+
+    Parameters:
+        - outer (HttpRequest): The batch request, providing authentication and environment.
+        - items (list): Dicts with "method", "path" and optional "body" and "headers".
+        - parallel (bool): Run independent reads concurrently.
+
+    Returns:
+        - list: {"status": <int>, "headers": {...}, "body": <data>} per sub-request.
+    """
+    global _executor
+
+    if not parallel or BATCH_WORKERS <= 1:
+        return [run_item(outer, item) for item in items]
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="batch")
+
+    results = []
+    reads = []
+    for item in items + [None]:
+        if item is not None and item["method"] in READ_METHODS:
+            reads.append(item)
+            continue
+
+        if len(reads) > 1:
+            # A context can only be entered by one thread at a time: one copy per read.
+            futures = [
+                _executor.submit(copy_context().run, run_in_thread, outer, read) for read in reads
+            ]
+            results.extend(future.result() for future in futures)
+        else:
+            results.extend(run_item(outer, read) for read in reads)
+        reads = []
+
+        if item is not None:
+            results.append(run_item(outer, item))
+
+    return results
@@ -0,0 +1,179 @@
+import random
+from datetime import date, time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+
+from . import cache
+from .models import (
+    Attendance,
+    Group,
+    Lesson,
+    LessonAttendanceSummary,
+    LessonOccurrence,
+    StudentAttendanceSummary,
+    Subject,
+    User,
+)
+from .utils import LessonDays, Roles
+
+BENCH_PASSWORD = "bench-password"
+BENCH_ADMIN_EMAIL = "bench-admin@example.com"
+
+
+def analyze(*models):
+    """
+    Updates the planner statistics of the tables of `models`. Without it, rows just
+    inserted in bulk stay invisible to the planner until autovacuum gets to them, which
+    it never does inside a benchmark that is rolled back, so queries would be planned
+    as if the tables were empty.
+    """
+    with connection.cursor() as cursor:
+        for model in models:
+            cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+
+
+def seed_dataset(
+    students=3000,
+    groups=200,
+    subjects=20,
+    teachers=50,
+    weeks=16,
+    absence_rate=0.1,
+    seed=0,
+    batch_size=1000,
+):
+    """
+    Creates a synthetic school with bulk inserts: an admin, teachers, students
+    enrolled in one or two groups each, a term of lessons per group that is
+    half over, and attendance for every lesson held so far.
+
+    Counters, lessons and attendance summaries are built the same way the app
+    maintains them, and the tables are analyzed afterwards, so the API serves and
+    plans the data like production data.
+
+    Parameters:
+        - students, groups, subjects, teachers (int): Number of rows to create.
+        - weeks (int): Term length, centred on today.
+        - absence_rate (float): Share of attendance rows marked absent.
+        - seed (int): Seed of the random generator, so runs are reproducible.
+
+    Returns:
+        - dict: Row counts of the created data.
+    """
+    rng = random.Random(seed)
+    password = make_password(BENCH_PASSWORD)
+    today = date.today()
+    start = today - timedelta(weeks=weeks // 2)
+
+    def user(role, number):
+        return User(
+            email=f"bench-{role}-{number}@example.com",
+            username=f"bench-{role}-{number}",
+            first_name=f"Bench {role}",
+            last_name=str(number),
+            role=role,
+            password=password,
+        )
+
+    User.objects.bulk_create(
+        [
+            User(
+                email=BENCH_ADMIN_EMAIL,
+                username="bench-admin",
+                first_name="Bench",
+                last_name="Admin",
+                role=Roles.ADMIN,
+                password=password,
+            )
+        ]
+    )
+    teacher_ids = [
+        teacher.pk
+        for teacher in User.objects.bulk_create(
+            [user(Roles.TEACHER, number) for number in range(teachers)], batch_size=batch_size
+        )
+    ]
+    student_ids = [
+        student.pk
+        for student in User.objects.bulk_create(
+            [user(Roles.STUDENT, number) for number in range(students)], batch_size=batch_size
+        )
+    ]
+    subject_ids = [
+        subject.pk
+        for subject in Subject.objects.bulk_create(
+            [Subject(name=f"Bench subject {number}") for number in range(subjects)]
+        )
+    ]
+    hours = [rng.randrange(8, 18) for _ in range(groups)]
+    group_ids = [
+        group.pk
+        for group in Group.objects.bulk_create(
+            [
+                Group(
+                    name=f"Bench group {number}",
+                    teacher_id=rng.choice(teacher_ids),
+                    subject_id=rng.choice(subject_ids),
+                    lesson_days=rng.choice(LessonDays.values),
+                    start_date=start,
+                    end_date=start + timedelta(weeks=weeks),
+                    lesson_start_time=time(hour),
+                    lesson_end_time=time(hour + 1, 30),
+                )
+                for number, hour in enumerate(hours)
+            ],
+            batch_size=batch_size,
+        )
+    ]
+
+    enrolled = {group_id: [] for group_id in group_ids}
+    through = User.student_groups.through
+    memberships = []
+    for student_id in student_ids:
+        for group_id in rng.sample(group_ids, k=min(len(group_ids), rng.choice((1, 2)))):
+            enrolled[group_id].append(student_id)
+            memberships.append(through(user_id=student_id, group_id=group_id))
+    through.objects.bulk_create(memberships, batch_size=batch_size)
+
+    Group.objects.filter(pk__in=group_ids).refresh_counters()
+    Subject.objects.filter(pk__in=subject_ids).refresh_counters()
+    Group.objects.filter(pk__in=group_ids).materialize_lessons(batch_size=batch_size)
+    LessonOccurrence.objects.refresh(group_ids=group_ids, batch_size=batch_size)
+
+    held = Lesson.objects.filter(group__in=group_ids, lesson_date__lte=today).values_list(
+        "pk", "group_id"
+    )
+    attendance = [
+        Attendance(lesson_id=lesson_id, student_id=student_id, is_absent=rng.random() < absence_rate)
+        for lesson_id, group_id in held.iterator()
+        for student_id in enrolled[group_id]
+    ]
+    Attendance.objects.bulk_create(attendance, batch_size=batch_size)
+    analyze(User, Subject, Group, through, Lesson, LessonOccurrence, Attendance)
+
+    StudentAttendanceSummary.objects.refresh(group_ids=group_ids)
+    LessonAttendanceSummary.objects.refresh()
+    analyze(StudentAttendanceSummary, LessonAttendanceSummary)
+    cache.invalidate(*cache.RESOURCES)
+
+    return {
+        "teachers": len(teacher_ids),
+        "students": len(student_ids),
+        "subjects": len(subject_ids),
+        "groups": len(group_ids),
+        "memberships": len(memberships),
+        "lessons": Lesson.objects.filter(group__in=group_ids).count(),
+        "attendance": len(attendance),
+    }
+
+
+def percentiles(samples, points=(0.5, 0.9, 0.95, 0.99)):
+    """Returns {"p50": ..., ...} of the samples (nearest-rank), or None values when empty."""
+    samples = sorted(samples)
+    return {
+        f"p{round(point * 100)}": (
+            samples[min(len(samples) - 1, int(len(samples) * point))] if samples else None
+        )
+        for point in points
+    }
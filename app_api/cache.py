@@ -0,0 +1,89 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+KEY_PREFIX = "responses"
+RESPONSE_CACHE_TTL = getattr(settings, "RESPONSE_CACHE_TTL", 300)
+
+# Cached list endpoints.
+RESOURCES = ("subjects", "groups", "teachers", "students", "timetables")
+
+
+def get_version(resource):
+    """
+    Returns the current version of a resource. Bumping it orphans every cached
+    response of the resource at once.
+    """
+    key = f"{KEY_PREFIX}:version:{resource}"
+    version = cache.get(key)
+    if version is None:
+        # A fresh, never reused version, in case the old one was evicted while
+        # responses cached under it are still around.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate(*resources):
+    """Drops the cached responses of the given resources, now and once the transaction commits."""
+
+    def bump():
+        for resource in resources:
+            key = f"{KEY_PREFIX}:version:{resource}"
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), None)
+            cache.set(f"{KEY_PREFIX}:invalidated:{resource}", time.time(), None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def invalidated_within(resource, seconds):
+    """Whether the resource was invalidated in the last `seconds` seconds."""
+    invalidated = cache.get(f"{KEY_PREFIX}:invalidated:{resource}")
+    return invalidated is not None and time.time() - invalidated < seconds
+
+
+def response_key(resource, request):
+    """
+    Builds the cache key of a response from the path, the query parameters,
+    the caller's role and the negotiated media type.
+    """
+    user = request.user
+    role = getattr(user, "role", None) if user.is_authenticated else "anonymous"
+    parts = [
+        request.path,
+        "&".join(f"{key}={value}" for key, value in sorted(request.query_params.lists())),
+        str(role),
+        request.META.get("HTTP_ACCEPT", ""),
+    ]
+    digest = hashlib.md5("|".join(parts).encode()).hexdigest()
+    return f"{KEY_PREFIX}:{resource}:{get_version(resource)}:{digest}"
+
+
+def record(resource, outcome):
+    """Counts a cache "hits" or "misses" outcome of a resource."""
+    key = f"{KEY_PREFIX}:stats:{resource}:{outcome}"
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def stats():
+    keys = {
+        f"{KEY_PREFIX}:stats:{resource}:{outcome}": (resource, outcome)
+        for resource in RESOURCES
+        for outcome in ("hits", "misses")
+    }
+    values = cache.get_many(keys)
+    result = {resource: {"hits": 0, "misses": 0} for resource in RESOURCES}
+    for key, (resource, outcome) in keys.items():
+        result[resource][outcome] = values.get(key, 0)
+    return result
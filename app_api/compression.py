@@ -0,0 +1,143 @@
+import gzip
+import re
+import zlib
+
+import brotli
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/msgpack",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+ENCODINGS = ("br", "gzip")
+
+_token = re.compile(r"\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?")
+
+
+def accepted_encoding(header):
+    """
+    Picks the best supported encoding of an Accept-Encoding header, preferring
+    Brotli over gzip at equal weight. Returns None if neither is acceptable.
+    """
+    weights = {}
+    for part in header.split(","):
+        match = _token.match(part)
+        if not match:
+            continue
+        try:
+            weights[match.group(1).lower()] = float(match.group(2) or 1)
+        except ValueError:
+            continue
+
+    candidates = [
+        (weights.get(encoding, weights.get("*", 0)), -index, encoding)
+        for index, encoding in enumerate(ENCODINGS)
+    ]
+    weight, _, encoding = max(candidates)
+    return encoding if weight > 0 else None
+
+
+def compress_stream(sequence, compressor):
+    """Compresses an iterable of bytes with `compressor`, a (process, finish) pair."""
+    process, finish = compressor
+    for item in sequence:
+        data = process(item)
+        if data:
+            yield data
+    yield finish()
+
+
+async def acompress_stream(sequence, compressor):
+    """Async counterpart of compress_stream() for async iterators."""
+    process, finish = compressor
+    async for item in sequence:
+        data = process(item)
+        if data:
+            yield data
+    yield finish()
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with Brotli or gzip, whichever the client prefers.
+
+    Only textual/API media types at least RESPONSE_COMPRESSION_MIN_SIZE bytes long are
+    compressed, since small bodies gain little and cost CPU on both ends. Streaming
+    responses, sync or async, are compressed on the fly as one stream. Like Django's
+    GZipMiddleware, strong ETags are made weak, as the encoded bytes differ from the
+    identity representation.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, "RESPONSE_COMPRESSION_MIN_SIZE", 1024)
+        self.brotli_quality = getattr(settings, "RESPONSE_COMPRESSION_BROTLI_QUALITY", 5)
+        self.gzip_level = getattr(settings, "RESPONSE_COMPRESSION_GZIP_LEVEL", 6)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def get_compressor(self, encoding):
+        """Returns the (process, finish) functions of a new streaming compressor."""
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            return compressor.process, compressor.finish
+        # 16 + MAX_WBITS writes a gzip header and trailer around the deflate stream.
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress, compressor.flush
+
+    def process_response(self, request, response):
+        if response.has_header("Content-Encoding") or response.status_code == 206:
+            return response
+        content_type = response.get("Content-Type", "")
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        # The representation depends on Accept-Encoding from here on.
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        encoding = accepted_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            compress = acompress_stream if response.is_async else compress_stream
+            response.streaming_content = compress(
+                response.streaming_content, self.get_compressor(encoding)
+            )
+            del response.headers["Content-Length"]
+        else:
+            if encoding == "br":
+                compressed = brotli.compress(response.content, quality=self.brotli_quality)
+            else:
+                compressed = gzip.compress(response.content, self.gzip_level, mtime=0)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+
+        return response
@@ -0,0 +1,105 @@
+from itertools import groupby, islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import FilteredRelation, Q, Value
+
+from .models import Attendance, Group, Lesson, User
+
+EXPORT_CHUNK_SIZE = getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+
+
+async def aiterate(chunks):
+    """
+    Async iterator over the byte chunks of a sync iterable, for streaming under ASGI,
+    where a sync iterator is read to the end before anything is sent.
+
+    Up to EXPORT_CHUNK_SIZE chunks are pulled and joined per step, in the thread that
+    runs the request's sync code, so the database cursors stay on its connection.
+    """
+    iterator = iter(chunks)
+    next_batch = sync_to_async(lambda: list(islice(iterator, EXPORT_CHUNK_SIZE)))
+    try:
+        while batch := await next_batch():
+            yield b"".join(batch)
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            # Releases the open cursors if the client went away.
+            await sync_to_async(close)()
+
+
+def roster_rows(group_id=None):
+    """
+    Yields a header and one row per enrolled student, ordered by group and name.
+
+    Parameters:
+        - group_id (int): Only export this group (default: every group).
+    """
+    through = Group.user_set.through
+    enrollments = through.objects.filter(user__role="student")
+    if group_id is not None:
+        enrollments = enrollments.filter(group_id=group_id)
+
+    yield ["group_id", "group", "student_id", "first_name", "last_name", "email"]
+    yield from enrollments.order_by(
+        "group__name", "user__last_name", "user__first_name", "user_id"
+    ).values_list(
+        "group_id", "group__name", "user_id", "user__first_name", "user__last_name", "user__email"
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def attendance_matrix_rows(group_id):
+    """
+    Yields the attendance of a group pivoted to one row per student and one column
+    per lesson ("A" absent, "P" present, empty if not marked), followed by the
+    student's absence and lesson totals.
+
+    Students are read with their marks joined in, as one cursor ordered by student,
+    so only the current student's row is held in memory and every row reflects the
+    same snapshot. Only the lessons listed in the header are joined: a lesson added
+    while the export runs is left out. Students no longer enrolled are included
+    while they have attendance in the group.
+    """
+    lessons = list(
+        Lesson.objects.filter(group_id=group_id)
+        .order_by("lesson_date", "pk")
+        .values_list("pk", "lesson_date")
+    )
+    columns = {lesson_id: index for index, (lesson_id, _) in enumerate(lessons)}
+
+    yield [
+        "student_id",
+        "first_name",
+        "last_name",
+        *(lesson_date.isoformat() for _, lesson_date in lessons),
+        "absences",
+        "lessons",
+    ]
+
+    through = Group.user_set.through
+    students = User.objects.filter(
+        Q(pk__in=through.objects.filter(group_id=group_id, user__role="student").values("user_id"))
+        | Q(pk__in=Attendance.objects.filter(lesson__group_id=group_id).values("student_id"))
+    ).order_by("last_name", "first_name", "pk")
+    if columns:
+        students = students.annotate(
+            marks=FilteredRelation("attendance", condition=Q(attendance__lesson_id__in=columns))
+        ).values_list("pk", "first_name", "last_name", "marks__lesson_id", "marks__is_absent")
+    else:
+        # An empty IN list would match no student at all.
+        students = students.values_list("pk", "first_name", "last_name", Value(None), Value(None))
+
+    rows = students.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    for (student_id, first_name, last_name), marks in groupby(rows, key=lambda row: row[:3]):
+        cells = [""] * len(lessons)
+        absences = marked = 0
+        for *_, lesson_id, is_absent in marks:
+            if lesson_id is None:
+                # The outer join of a student without marks.
+                continue
+            cells[columns[lesson_id]] = "A" if is_absent else "P"
+            absences += is_absent
+            marked += 1
+
+        yield [student_id, first_name, last_name, *cells, absences, marked]
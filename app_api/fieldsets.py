@@ -0,0 +1,139 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.relations import ManyRelatedField
+from rest_framework.serializers import BaseSerializer, ListSerializer, SerializerMethodField
+
+
+def parse_fieldset(value):
+    """
+    Parses a comma separated list of (dotted) field names into a tree.
+
+    "id,name,teacher.first_name" -> {"id": {}, "name": {}, "teacher": {"first_name": {}}}
+
+    Returns:
+        - dict | None: The tree, or None when the value is empty.
+    """
+    tree = {}
+    for path in (value or "").split(","):
+        node = tree
+        for name in filter(None, (part.strip() for part in path.split("."))):
+            node = node.setdefault(name, {})
+    return tree or None
+
+
+class QueryPlan:
+    """Columns, joins and prefetches a set of serializer fields reads."""
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self.only = set()
+        self.select_related = set()
+        self.prefetch_related = set()
+
+    def add_lookup(self, model, prefix, parts):
+        """
+        Adds a lookup such as ["subject", "name"] relative to `model` (reached through
+        `prefix`). Returns False when it is not a chain of forward relations ending in
+        a concrete field, a many-to-many field or an annotation.
+        """
+        if not prefix and len(parts) == 1 and parts[0] in self.queryset.query.annotations:
+            return True
+
+        for index, part in enumerate(parts):
+            try:
+                field = model._meta.get_field(part)
+            except FieldDoesNotExist:
+                return False
+
+            path = prefix + "__".join(parts[: index + 1])
+            last = index == len(parts) - 1
+
+            if field.many_to_many and last and field.concrete:
+                self.prefetch_related.add(path)
+                return True
+            if not field.concrete or field.many_to_many:
+                return False
+            if last:
+                self.only.add(path)
+                return True
+            if not field.is_relation:
+                return False
+
+            self.select_related.add(path)
+            model = field.related_model
+
+        return True
+
+    def add_fields(self, model, fields, prefix=""):
+        """Adds the bound serializer `fields`. Returns False if one of them cannot be mapped."""
+        for name, field in fields.items():
+            if field.write_only:
+                continue
+
+            if isinstance(field, (ListSerializer, ManyRelatedField)):
+                if len(field.source_attrs) != 1:
+                    return False
+                self.prefetch_related.add(prefix + field.source_attrs[0])
+                continue
+
+            if isinstance(field, BaseSerializer):
+                # An expanded forward relation, narrowed recursively.
+                if len(field.source_attrs) != 1:
+                    return False
+                try:
+                    relation = model._meta.get_field(field.source_attrs[0])
+                except FieldDoesNotExist:
+                    return False
+                if not (relation.concrete and relation.is_relation and not relation.many_to_many):
+                    return False
+
+                path = prefix + relation.name
+                self.select_related.add(path)
+                self.only.add(path)
+                if not self.add_fields(relation.related_model, field.fields, f"{path}__"):
+                    return False
+                continue
+
+            if isinstance(field, SerializerMethodField):
+                lookups = getattr(field.parent, "field_dependencies", {}).get(name)
+                if lookups is None:
+                    return False
+                for lookup in lookups:
+                    if not self.add_lookup(model, prefix, lookup.split("__")):
+                        return False
+                continue
+
+            if field.source == "*" or not self.add_lookup(model, prefix, field.source_attrs):
+                return False
+
+        return True
+
+
+def narrow_queryset(queryset, fields, required=()):
+    """
+    Restricts a queryset to what the bound serializer `fields` read: .only() for the
+    columns, select_related() for the traversed foreign keys and prefetch_related()
+    for many-to-many fields. The queryset's own joins and prefetches are replaced.
+
+    The queryset is returned unchanged when a field reads something that cannot be
+    mapped to the model, e.g. a property or a SerializerMethodField without
+    `field_dependencies`.
+
+    Parameters:
+        - queryset (QuerySet): The queryset to narrow.
+        - fields (dict): Bound fields of the serializer, i.e. `serializer.fields`.
+        - required (iterable): Extra lookups to load, e.g. the pagination ordering.
+    """
+    plan = QueryPlan(queryset)
+    if not plan.add_fields(queryset.model, fields):
+        return queryset
+    for lookup in required:
+        if not plan.add_lookup(queryset.model, "", lookup.split("__")):
+            return queryset
+
+    queryset = queryset.select_related(None).prefetch_related(None)
+    if plan.select_related:
+        queryset = queryset.select_related(*sorted(plan.select_related))
+    if plan.prefetch_related:
+        queryset = queryset.prefetch_related(*sorted(plan.prefetch_related))
+
+    return queryset.only(queryset.model._meta.pk.name, *sorted(plan.only))
@@ -0,0 +1,154 @@
+import io
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PHOTO_SIZES = getattr(settings, "PROFILE_PHOTO_SIZES", (64, 128, 256))
+PROFILE_PHOTO_MAX_UPLOAD_SIZE = getattr(settings, "PROFILE_PHOTO_MAX_UPLOAD_SIZE", 5 * 1024 * 1024)
+FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+
+_executor = None
+
+
+def validate_profile_photo_size(file):
+    if file.size > PROFILE_PHOTO_MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            f"Profile photos may not exceed {PROFILE_PHOTO_MAX_UPLOAD_SIZE // (1024 * 1024)} MB."
+        )
+
+
+def variant_name(source, size, extension):
+    stem = posixpath.splitext(posixpath.basename(source))[0]
+    return posixpath.join(posixpath.dirname(source), "variants", f"{stem}_{size}.{extension}")
+
+
+def render_variants(source):
+    """
+    Renders square WebP and JPEG variants of the stored image `source` for every
+    size in PROFILE_PHOTO_SIZES and saves them next to it.
+
+    Returns:
+        - dict: {"source": source, "sizes": {"<size>": {"webp": name, "jpeg": name}}}
+    """
+    with default_storage.open(source) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+
+    sizes = {}
+    for size in PROFILE_PHOTO_SIZES:
+        resized = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        sizes[str(size)] = {}
+        for extension, image_format in FORMATS.items():
+            buffer = io.BytesIO()
+            converted = resized if image_format == "WEBP" else resized.convert("RGB")
+            if converted.mode not in ("RGB", "RGBA"):
+                converted = converted.convert("RGBA")
+            converted.save(buffer, image_format, quality=80, optimize=True)
+
+            name = variant_name(source, size, extension)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            sizes[str(size)][extension] = default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    return {"source": source, "sizes": sizes}
+
+
+def variant_names(derivatives):
+    """Returns the stored names of every variant listed in `derivatives`."""
+    return {
+        name
+        for names in (derivatives or {}).get("sizes", {}).values()
+        for name in names.values()
+    }
+
+
+def update_profile_photo_variants(user_id, source):
+    """
+    Renders the variants of a user's photo and records them on the user, unless the
+    photo has been replaced in the meantime. Variants that are no longer referenced
+    are deleted: those of the user's previous photo once the new ones are recorded,
+    or the new ones if the photo was replaced.
+
+    Returns:
+        - bool: Whether the variants were recorded.
+    """
+    from .authentication import user_store
+    from .cache import invalidate
+    from .models import User
+
+    derivatives = render_variants(source)
+
+    with transaction.atomic():
+        current = (
+            User.objects.select_for_update()
+            .filter(pk=user_id)
+            .values_list("profile_photo", "profile_photo_derivatives")
+            .first()
+        )
+        recorded = current is not None and current[0] == source
+        if recorded:
+            User.objects.filter(pk=user_id).update(
+                profile_photo_derivatives=derivatives, updated=timezone.now()
+            )
+            unused = variant_names(current[1]) - variant_names(derivatives)
+        else:
+            unused = variant_names(derivatives) - variant_names(current and current[1])
+
+    for name in unused:
+        default_storage.delete(name)
+
+    if recorded:
+        user_store.invalidate(user_id)
+        invalidate("teachers", "students", "groups")
+    return recorded
+
+
+def generate_profile_photo_variants(user_id, source):
+    """Background job of schedule_profile_photo_variants()."""
+    try:
+        update_profile_photo_variants(user_id, source)
+    except Exception:
+        logger.exception("Could not render variants of %s", source)
+    finally:
+        # No request cycle closes the connections of the pool's threads.
+        connections.close_all()
+
+
+def schedule_profile_photo_variants(user_id, source):
+    """Queues the variant generation on a shared pool of background threads."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "PROFILE_PHOTO_WORKERS", 2),
+            thread_name_prefix="profile-photos",
+        )
+    return _executor.submit(generate_profile_photo_variants, user_id, source)
+
+
+def profile_photo_variant_urls(user, extension=None):
+    """
+    Returns {"<size>": {"webp": url, "jpeg": url}} for the user's current photo,
+    or an empty dict while the variants are not generated yet.
+    """
+    derivatives = user.profile_photo_derivatives or {}
+    if derivatives.get("source") != user.profile_photo.name:
+        return {}
+
+    return {
+        size: {
+            ext: default_storage.url(name)
+            for ext, name in names.items()
+            if extension is None or ext == extension
+        }
+        for size, names in derivatives.get("sizes", {}).items()
+    }
@@ -0,0 +1,195 @@
+import csv
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from rest_framework.serializers import (
+    CharField,
+    ChoiceField,
+    EmailField,
+    IntegerField,
+    ListField,
+    Serializer,
+)
+
+from . import cache
+from .models import Group
+from .signals import refresh_enrollment_counters
+from .utils import Roles
+
+User = get_user_model()
+
+# Below this many passwords, starting worker threads costs more than it saves.
+POOL_THRESHOLD = 16
+
+TAKEN_ERROR = {"non_field_errors": ["A user with this email or full name already exists."]}
+
+
+class UserImportRowSerializer(Serializer):
+    email = EmailField(max_length=100)
+    first_name = CharField(max_length=100)
+    last_name = CharField(max_length=100)
+    password = CharField(required=False, allow_blank=True, write_only=True)
+    role = ChoiceField(choices=Roles.choices, default=Roles.STUDENT)
+    student_groups = ListField(child=IntegerField(), required=False, default=list)
+
+
+def parse_csv(content):
+    """
+    Parses CSV text with the columns of UserImportRowSerializer into rows.
+    "student_groups" holds group ids separated by ";".
+    """
+    rows = []
+    for row in csv.DictReader(io.StringIO(content)):
+        row = {key.strip(): (value or "").strip() for key, value in row.items() if key}
+        groups = row.pop("student_groups", "")
+        row["student_groups"] = [group for group in groups.split(";") if group]
+        if not row.get("role"):
+            row.pop("role", None)
+        rows.append(row)
+    return rows
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    Hashes the passwords with the default hasher, spreading the work across a
+    pool of threads when there are enough of them. Empty passwords become unusable.
+
+    PBKDF2, the default hasher, runs in OpenSSL without holding the GIL, so the
+    threads hash in parallel without forking the server process.
+    """
+    passwords = [password or None for password in passwords]
+    workers = workers or getattr(settings, "USER_IMPORT_WORKERS", None) or os.cpu_count()
+
+    if workers <= 1 or len(passwords) < POOL_THRESHOLD:
+        return [make_password(password) for password in passwords]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(make_password, passwords))
+
+
+def create_users(users, rows, errors):
+    """
+    Inserts the users with one bulk INSERT. If another import or signup took one
+    of their emails or names since they were checked, the users are inserted one
+    by one instead and the rows that still conflict are added to `errors`.
+
+    Returns:
+        - list: (user, row index, data) of the users created.
+    """
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create(users, batch_size=1000)
+        return [(user, index, data) for user, (index, data) in zip(users, rows)]
+    except IntegrityError:
+        pass
+
+    created = []
+    for user, (index, data) in zip(users, rows):
+        # Ids set by the rolled back INSERT.
+        user.pk = None
+        user._state.adding = True
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create([user])
+        except IntegrityError:
+            errors.append({"row": index, "errors": TAKEN_ERROR})
+        else:
+            created.append((user, index, data))
+    return created
+
+
+def import_users(rows, workers=None):
+    """
+    Validates and creates users in bulk.
+
+    Invalid rows are reported and skipped, the valid ones are inserted with one
+    bulk INSERT for the users and one for their group memberships.
+
+    Parameters:
+        - rows (list): Dicts with the fields of UserImportRowSerializer.
+        - workers (int): Number of password hashing threads (default: USER_IMPORT_WORKERS
+          or the CPU count).
+
+    Returns:
+        - dict: {"created": <count>, "errors": [{"row": <index>, "errors": {...}}, ...]}
+    """
+    errors = []
+    valid = []
+
+    for index, row in enumerate(rows):
+        serializer = UserImportRowSerializer(data=row)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({"row": index, "errors": serializer.errors})
+
+    # Uniqueness and group checks are done for the whole batch at once.
+    emails = {data["email"] for _, data in valid}
+    names = {(data["first_name"], data["last_name"]) for _, data in valid}
+    group_ids = {group_id for _, data in valid for group_id in data["student_groups"]}
+
+    taken_emails = set(User.objects.filter(email__in=emails).values_list("email", flat=True))
+    taken_names = set(
+        User.objects.filter(
+            first_name__in={first for first, _ in names},
+            last_name__in={last for _, last in names},
+        ).values_list("first_name", "last_name")
+    )
+    known_groups = set(Group.objects.filter(pk__in=group_ids).values_list("pk", flat=True))
+
+    accepted = []
+    for index, data in valid:
+        row_errors = {}
+        name = (data["first_name"], data["last_name"])
+
+        if data["email"] in taken_emails:
+            row_errors["email"] = ["A user with this email already exists."]
+        if name in taken_names:
+            row_errors["non_field_errors"] = ["A user with this full name already exists."]
+        unknown = [pk for pk in data["student_groups"] if pk not in known_groups]
+        if unknown:
+            row_errors["student_groups"] = [f"Unknown groups: {unknown}."]
+
+        if row_errors:
+            errors.append({"row": index, "errors": row_errors})
+            continue
+
+        taken_emails.add(data["email"])
+        taken_names.add(name)
+        accepted.append((index, data))
+
+    hashes = hash_passwords([data.get("password") for _, data in accepted], workers=workers)
+    users = [
+        User(
+            email=data["email"],
+            username=data["email"].split("@")[0],
+            first_name=data["first_name"],
+            last_name=data["last_name"],
+            role=data["role"],
+            password=password,
+        )
+        for (_, data), password in zip(accepted, hashes)
+    ]
+
+    with transaction.atomic():
+        created = create_users(users, accepted, errors)
+        through = User.student_groups.through
+        through.objects.bulk_create(
+            [
+                through(user_id=user.pk, group_id=group_id)
+                for user, _, data in created
+                for group_id in set(data["student_groups"])
+            ],
+            batch_size=1000,
+        )
+        # Bulk inserts send no m2m_changed signals.
+        refresh_enrollment_counters(group_ids=group_ids & known_groups)
+        cache.invalidate("teachers", "students", "groups", "subjects", "timetables")
+
+    errors.sort(key=lambda error: error["row"])
+    return {"created": len(created), "errors": errors}
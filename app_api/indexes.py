@@ -0,0 +1,22 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.db.backends.ddl_references import Statement
+
+
+class PostgresOnlyGinIndex(GinIndex):
+    """
+    GinIndex that is only created on PostgreSQL.
+
+    Other databases (SQLite in development and tests) cannot build GIN indexes or
+    operator classes, and their schema editors recreate every index in Meta.indexes
+    whenever they rebuild a table, so there the index is an empty statement.
+    """
+
+    def create_sql(self, model, schema_editor, using="", **kwargs):
+        if schema_editor.connection.vendor != "postgresql":
+            return Statement("")
+        return super().create_sql(model, schema_editor, using=using, **kwargs)
+
+    def remove_sql(self, model, schema_editor, **kwargs):
+        if schema_editor.connection.vendor != "postgresql":
+            return Statement("")
+        return super().remove_sql(model, schema_editor, **kwargs)
@@ -0,0 +1,314 @@
+import itertools
+import json
+import platform
+import statistics
+import subprocess
+import time
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from app_api.benchmarks import BENCH_ADMIN_EMAIL, BENCH_PASSWORD, percentiles, seed_dataset
+from app_api.models import Lesson, User
+from app_api.urls import router
+
+API_PREFIX = "/api/v1/"
+BATCH_PATH = f"{API_PREFIX}batch/"
+# Users created by every POST users/import/ request.
+IMPORT_ROWS = 50
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a synthetic dataset with bulk inserts and measures latency percentiles "
+        "and SQL query counts of every route in app_api.urls and of the token endpoints, "
+        "failing if any of them answers with a non-2xx status. "
+        "Runs on the configured database (DB_ENGINE=sqlite for a local SQLite file); "
+        "the data is rolled back afterwards unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=3000)
+        parser.add_argument("--groups", type=int, default=200)
+        parser.add_argument("--subjects", type=int, default=20)
+        parser.add_argument("--teachers", type=int, default=50)
+        parser.add_argument("--weeks", type=int, default=16, help="Term length.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--iterations", type=int, default=30, help="Timed requests per route.")
+        parser.add_argument("--warmup", type=int, default=3, help="Untimed requests per route.")
+        parser.add_argument(
+            "--clear-cache",
+            action="store_true",
+            help="Clear the cache before every request to measure uncached responses.",
+        )
+        parser.add_argument("--keep", action="store_true", help="Commit the seeded data.")
+        parser.add_argument("--output", help="Write the results as JSON to this file.")
+        parser.add_argument("--compare", help="JSON results of an earlier run to compare against.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            started = time.perf_counter()
+            dataset = seed_dataset(
+                students=options["students"],
+                groups=options["groups"],
+                subjects=options["subjects"],
+                teachers=options["teachers"],
+                weeks=options["weeks"],
+                seed=options["seed"],
+            )
+            self.stdout.write(
+                f"Seeded {dataset} in {time.perf_counter() - started:.1f}s "
+                f"on {connection.vendor}."
+            )
+
+            admin = User.objects.get(email=BENCH_ADMIN_EMAIL)
+            client = Client(
+                SERVER_NAME="localhost",
+                HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(admin).access_token}",
+            )
+
+            results = {}
+            for name, method, path, payload in self.get_cases(admin):
+                results[name] = self.measure(client, method, path, payload, options)
+                self.report(name, results[name])
+
+            if not options["keep"]:
+                transaction.set_rollback(True)
+
+        output = {
+            "environment": self.get_environment(),
+            "options": {
+                key: options[key]
+                for key in (
+                    "students", "groups", "subjects", "teachers", "weeks", "seed",
+                    "iterations", "warmup", "clear_cache",
+                )
+            },
+            "dataset": dataset,
+            "results": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(output, file, indent=2)
+        if options["compare"]:
+            with open(options["compare"]) as file:
+                self.compare(json.load(file), output)
+
+        failed = [
+            f"{name} ({','.join(map(str, result['statuses']))})"
+            for name, result in results.items()
+            if any(not 200 <= status < 300 for status in result["statuses"])
+        ]
+        if failed:
+            raise CommandError(f"Routes answered with non-2xx statuses: {', '.join(failed)}.")
+
+    def get_ids(self):
+        """Picks the rows the parametrized routes are requested for."""
+        lesson = (
+            Lesson.objects.filter(attendance__isnull=False).order_by("pk").select_related("group")
+        ).first()
+        if lesson is None:
+            raise CommandError("The dataset has no lesson with attendance.")
+        students = list(
+            User.objects.filter(student_groups=lesson.group_id).values_list("pk", flat=True)
+        )
+        return {"group": lesson.group_id, "lesson": lesson.pk, "students": students}
+
+    def get_query(self, route, ids):
+        """Query string of the routes that require parameters."""
+        queries = {
+            "timetable/": f"?student={ids['students'][0]}",
+            "exports/attendance/": f"?group={ids['group']}",
+            "exports/rosters/": f"?group={ids['group']}",
+        }
+        return queries.get(route, "")
+
+    def get_payload(self, route, ids):
+        """
+        Returns a callable building the body of a POST route, or None for the POST
+        routes that are not measured (the create routes of the model viewsets).
+        """
+        imported = itertools.count()
+
+        def import_rows():
+            batch = next(imported)
+            # Without passwords, so that the import is not dominated by password hashing.
+            return [
+                {
+                    "email": f"bench-import-{batch}-{number}@example.com",
+                    "first_name": f"Import {batch}",
+                    "last_name": str(number),
+                    "student_groups": [ids["group"]],
+                }
+                for number in range(IMPORT_ROWS)
+            ]
+
+        payloads = {
+            "users/import/": import_rows,
+            "batch/": lambda: {
+                "requests": [
+                    {"method": "GET", "path": f"{API_PREFIX}groups/"},
+                    {"method": "GET", "path": f"{API_PREFIX}subjects/"},
+                    {"method": "GET", "path": f"{API_PREFIX}lessons/{ids['lesson']}/"},
+                ],
+                # Pool threads use connections of their own, which cannot see the
+                # dataset while it is in this command's transaction.
+                "parallel": False,
+            },
+            "lessons/{pk}/attendance/": lambda: {
+                "attendance": [
+                    {"student": student, "is_absent": index % 10 == 0}
+                    for index, student in enumerate(ids["students"])
+                ]
+            },
+        }
+        return payloads.get(route)
+
+    def get_cases(self, admin):
+        """
+        Yields (name, method, path, payload) for the list and detail routes of every
+        viewset in the router, their extra actions and the token endpoints, with the
+        query parameters and bodies the routes require.
+        `payload` is a callable returning the request body, built outside of the timing.
+        """
+        ids = self.get_ids()
+        yield "GET api-root", "get", API_PREFIX, None
+
+        for prefix, viewset, _ in router.registry:
+            routes = []
+            if hasattr(viewset, "list"):
+                routes.append(("get", f"{prefix}/"))
+            if hasattr(viewset, "create") and not hasattr(viewset, "list"):
+                routes.append(("post", f"{prefix}/"))
+            for extra_action in viewset.get_extra_actions():
+                if not extra_action.detail:
+                    for method in extra_action.mapping:
+                        routes.append((method, f"{prefix}/{extra_action.url_path}/"))
+
+            pk = None
+            if hasattr(viewset, "retrieve"):
+                pk = ids["lesson"] if prefix == "lessons" else self.get_pk(viewset)
+                if pk is None:
+                    self.stderr.write(f"Skipping {prefix} detail routes: no rows.")
+                else:
+                    routes.append(("get", f"{prefix}/{{pk}}/"))
+                    for extra_action in viewset.get_extra_actions():
+                        if extra_action.detail:
+                            for method in extra_action.mapping:
+                                routes.append(
+                                    (method, f"{prefix}/{{pk}}/{extra_action.url_path}/")
+                                )
+
+            for method, route in routes:
+                path = f"{API_PREFIX}{route.format(pk=pk)}{self.get_query(route, ids)}"
+                if method == "get":
+                    yield f"GET {route}", "get", path, None
+                elif method == "post":
+                    payload = self.get_payload(route, ids)
+                    if payload is not None:
+                        yield f"POST {route}", "post", path, payload
+
+        credentials = {"email": BENCH_ADMIN_EMAIL, "password": BENCH_PASSWORD}
+        yield "POST token/", "post", f"{API_PREFIX}token/", lambda: credentials
+        # Refresh tokens are rotated and blacklisted, so every request needs a fresh one.
+        fresh = lambda: {"refresh": str(RefreshToken.for_user(admin))}  # noqa: E731
+        yield "POST token/refresh/", "post", f"{API_PREFIX}token/refresh/", fresh
+        yield "POST token/blacklist/", "post", f"{API_PREFIX}token/blacklist/", fresh
+
+    def get_pk(self, viewset):
+        return viewset.queryset.order_by("pk").values_list("pk", flat=True).first()
+
+    def measure(self, client, method, path, payload, options):
+        latencies = []
+        queries = []
+        statuses = set()
+
+        for iteration in range(options["warmup"] + options["iterations"]):
+            data = payload() if payload else None
+            if options["clear_cache"]:
+                cache.clear()
+
+            executed = 0
+
+            def count(execute, sql, params, many, context):
+                nonlocal executed
+                executed += 1
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(count):
+                started = time.perf_counter()
+                if method == "get":
+                    response = client.get(path)
+                else:
+                    response = client.post(path, data, content_type="application/json")
+                # Streamed exports are produced while they are consumed.
+                content = (
+                    b"".join(response.streaming_content)
+                    if response.streaming
+                    else response.content
+                )
+                elapsed = time.perf_counter() - started
+
+            statuses.add(response.status_code)
+            if path == BATCH_PATH and response.status_code == 200:
+                statuses.update(item["status"] for item in response.json())
+            if iteration >= options["warmup"]:
+                latencies.append(elapsed)
+                queries.append(executed)
+
+        return {
+            "path": path,
+            "statuses": sorted(statuses),
+            **percentiles(latencies),
+            "mean": statistics.fmean(latencies),
+            "max": max(latencies),
+            "queries": max(queries),
+            "queries_min": min(queries),
+            "response_bytes": len(content),
+        }
+
+    def get_environment(self):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+
+        return {
+            "commit": commit,
+            "database": connection.vendor,
+            "database_version": ".".join(map(str, connection.get_database_version())),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        }
+
+    def report(self, name, result):
+        statuses = ",".join(map(str, result["statuses"]))
+        self.stdout.write(
+            f"{name:<42} {statuses:>8}  p50 {result['p50'] * 1000:8.2f}ms  "
+            f"p95 {result['p95'] * 1000:8.2f}ms  p99 {result['p99'] * 1000:8.2f}ms  "
+            f"{result['queries']:>4} queries"
+        )
+
+    def compare(self, baseline, current):
+        """Prints the p50 and query count changes of every route present in both runs."""
+        self.stdout.write(
+            f"\nCompared with {baseline['environment'].get('commit') or 'baseline'} "
+            f"({baseline['environment']['database']}):"
+        )
+        for name, result in current["results"].items():
+            previous = baseline["results"].get(name)
+            if previous is None:
+                continue
+            change = (result["p50"] / previous["p50"] - 1) * 100 if previous["p50"] else 0
+            queries = result["queries"] - previous["queries"]
+            line = f"{name:<42} p50 {change:+7.1f}%  queries {queries:+d}"
+            self.stdout.write(
+                self.style.WARNING(line) if change > 10 or queries > 0 else line
+            )
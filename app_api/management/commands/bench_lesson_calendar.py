@@ -0,0 +1,72 @@
+from datetime import date, time, timedelta
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app_api.models import Group, Subject, User
+from app_api.utils import LessonDays, Roles
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks lesson materialization for a term of synthetic groups. "
+        "All data is created inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--groups", type=int, default=500)
+        parser.add_argument("--weeks", type=int, default=20, help="Term length.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            groups = self.seed(options["groups"], options["weeks"])
+
+            self.measure("Initial term", groups)
+
+            # Shift half of the terms by a week and swap the lesson days of a quarter.
+            edited = groups.filter(pk__in=groups.values("pk")[: options["groups"] // 2])
+            for group in edited:
+                group.end_date += timedelta(weeks=1)
+                if group.pk % 2:
+                    group.lesson_days = LessonDays.even
+            Group.objects.bulk_update(edited, ["end_date", "lesson_days"])
+
+            self.measure("After edits", groups)
+            self.measure("No changes", groups)
+
+            transaction.set_rollback(True)
+
+    def seed(self, count, weeks):
+        teacher = User.objects.create(
+            email="bench-teacher@example.com",
+            first_name="Bench",
+            last_name="Teacher",
+            role=Roles.TEACHER,
+        )
+        subject = Subject.objects.create(name="Bench subject")
+        start = date.today()
+        groups = Group.objects.bulk_create(
+            Group(
+                name=f"Bench group {number}",
+                teacher_id=teacher.pk,
+                subject=subject,
+                lesson_days=LessonDays.odd,
+                start_date=start,
+                end_date=start + timedelta(weeks=weeks),
+                lesson_start_time=time(9),
+                lesson_end_time=time(10, 30),
+            )
+            for number in range(count)
+        )
+        return Group.objects.filter(pk__in=[group.pk for group in groups])
+
+    def measure(self, label, groups):
+        started = perf_counter()
+        created, deleted, _ = groups.materialize_lessons()
+        elapsed = perf_counter() - started
+
+        self.stdout.write(
+            f"{label:<14} {groups.count():>6} groups  {created:>7} created  "
+            f"{deleted:>7} deleted  {elapsed:8.3f}s"
+        )
@@ -0,0 +1,104 @@
+import json
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from rest_framework.renderers import JSONRenderer
+
+from app_api.benchmarks import seed_dataset
+from app_api.renderers import MessagePackRenderer, ORJSONRenderer
+
+ROUTES = ("/api/v1/users/", "/api/v1/groups/")
+RENDERERS = {
+    "json": JSONRenderer(),
+    "orjson": ORJSONRenderer(),
+    "msgpack": MessagePackRenderer(),
+}
+ENCODINGS = ("identity", "gzip", "br")
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures bytes on the wire and serialization/render time of the users and "
+        "groups lists for every response format (DRF JSON, orjson, MessagePack) and "
+        "encoding (identity, gzip, Brotli). The seeded data is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=3000)
+        parser.add_argument("--groups", type=int, default=200)
+        parser.add_argument("--page-size", type=int, default=200)
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--output", help="Write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        results = {}
+
+        with transaction.atomic():
+            seed_dataset(students=options["students"], groups=options["groups"])
+            client = Client(SERVER_NAME="localhost")
+
+            for route in ROUTES:
+                path = f"{route}?page_size={options['page_size']}"
+                results[route] = self.measure(client, path, options["iterations"])
+                self.report(route, results[route])
+
+            transaction.set_rollback(True)
+
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump({"options": options, "results": results}, file, indent=2, default=str)
+
+    def measure(self, client, path, iterations):
+        serializer_ms = []
+        for _ in range(iterations):
+            cache.clear()
+            response = client.get(path, HTTP_ACCEPT="application/json")
+            serializer_ms.append(self.server_timing(response, "serializer"))
+        data = response.data
+
+        formats = {}
+        for name, renderer in RENDERERS.items():
+            timings = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                renderer.render(data)
+                timings.append((time.perf_counter() - started) * 1000)
+
+            wire = {}
+            for encoding in ENCODINGS:
+                response = client.get(
+                    path, HTTP_ACCEPT=renderer.media_type, HTTP_ACCEPT_ENCODING=encoding
+                )
+                assert response.get("Content-Encoding", "identity") == encoding, encoding
+                wire[encoding] = len(response.content)
+
+            formats[name] = {"render_ms": statistics.median(timings), "bytes": wire}
+
+        return {
+            "items": len(data["results"]),
+            "serializer_ms": statistics.median(serializer_ms),
+            "formats": formats,
+        }
+
+    def server_timing(self, response, metric):
+        for entry in response.get("Server-Timing", "").split(","):
+            name, *params = entry.strip().split(";")
+            if name == metric:
+                for param in params:
+                    if param.startswith("dur="):
+                        return float(param[4:])
+        return None
+
+    def report(self, route, result):
+        self.stdout.write(
+            f"{route} ({result['items']} items, serializer {result['serializer_ms']:.2f}ms)"
+        )
+        for name, values in result["formats"].items():
+            sizes = "  ".join(
+                f"{encoding} {size:>8}B" for encoding, size in values["bytes"].items()
+            )
+            self.stdout.write(f"  {name:<8} render {values['render_ms']:7.2f}ms  {sizes}")
@@ -0,0 +1,157 @@
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection, connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+
+from app_api.benchmarks import percentiles
+from app_api.metrics import pool_stats
+
+PATHS = ("/api/v1/lessons/?page_size=20", "/api/v1/users/?page_size=20")
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures request latency and throughput under concurrent requests with the "
+        "configured connection handling, acquiring and releasing the database connection "
+        "around every request like the WSGI handler does. Compare the modes by running "
+        "with DB_POOL=0 --output base.json, then with DB_POOL=1 --compare base.json. "
+        "Reads the rows already in the database (e.g. from bench_api --keep)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", default=PATHS, help="API paths to request.")
+        parser.add_argument("--requests", type=int, default=400, help="Timed requests per path.")
+        parser.add_argument("--concurrency", type=int, default=4, help="Worker threads.")
+        parser.add_argument("--warmup", type=int, default=10, help="Untimed requests per path.")
+        parser.add_argument("--output", help="Write the results as JSON to this file.")
+        parser.add_argument("--compare", help="JSON results of an earlier run to compare against.")
+
+    def handle(self, *args, **options):
+        mode = self.get_mode()
+        self.stdout.write(f"{connection.vendor}, {mode}, {options['concurrency']} threads")
+
+        lock = threading.Lock()
+        acquired = 0
+
+        def count(sender, **kwargs):
+            nonlocal acquired
+            with lock:
+                acquired += 1
+
+        connection_created.connect(count, weak=False)
+        results = {}
+        try:
+            for path in options["paths"]:
+                acquired = 0
+                before = pool_stats().get("default", {})
+                results[path] = self.measure(path, options)
+                after = pool_stats().get("default", {})
+
+                results[path]["connections_acquired"] = acquired
+                results[path]["connections_opened"] = (
+                    after.get("connections_num", 0) - before.get("connections_num", 0)
+                    if after
+                    else acquired
+                )
+                results[path]["pool_wait_ms"] = after.get("requests_wait_ms", 0) - before.get(
+                    "requests_wait_ms", 0
+                )
+                self.report(path, results[path])
+        finally:
+            connection_created.disconnect(count)
+
+        output = {
+            "mode": mode,
+            "database": connection.vendor,
+            "options": {key: options[key] for key in ("requests", "concurrency", "warmup")},
+            "results": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(output, file, indent=2)
+        if options["compare"]:
+            with open(options["compare"]) as file:
+                self.compare(json.load(file), output)
+
+    def get_mode(self):
+        settings_dict = connection.settings_dict
+        pool = settings_dict.get("OPTIONS", {}).get("pool")
+        if pool:
+            options = pool if isinstance(pool, dict) else {}
+            return (
+                f"pool (min_size={options.get('min_size', 4)}, "
+                f"max_size={options.get('max_size', options.get('min_size', 4))})"
+            )
+        return f"CONN_MAX_AGE={settings_dict.get('CONN_MAX_AGE', 0)}"
+
+    def request(self, client, path):
+        started = time.perf_counter()
+        # request_started and request_finished release the connection around a request.
+        close_old_connections()
+        response = client.get(path)
+        close_old_connections()
+        return time.perf_counter() - started, response.status_code
+
+    def work(self, path, requests):
+        client = Client(SERVER_NAME="localhost")
+        try:
+            return [self.request(client, path) for _ in range(requests)]
+        finally:
+            connections.close_all()
+
+    def measure(self, path, options):
+        self.work(path, options["warmup"])
+
+        concurrency = options["concurrency"]
+        shares = [
+            options["requests"] // concurrency + (worker < options["requests"] % concurrency)
+            for worker in range(concurrency)
+        ]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            samples = [
+                sample
+                for samples in executor.map(lambda share: self.work(path, share), shares)
+                for sample in samples
+            ]
+        elapsed = time.perf_counter() - started
+
+        latencies = [latency for latency, _ in samples]
+        return {
+            "statuses": sorted({status for _, status in samples}),
+            **percentiles(latencies),
+            "mean": statistics.fmean(latencies),
+            "max": max(latencies),
+            "throughput": len(samples) / elapsed,
+        }
+
+    def report(self, path, result):
+        statuses = ",".join(map(str, result["statuses"]))
+        self.stdout.write(
+            f"{path:<36} {statuses:>8}  p50 {result['p50'] * 1000:7.2f}ms  "
+            f"p95 {result['p95'] * 1000:7.2f}ms  p99 {result['p99'] * 1000:7.2f}ms  "
+            f"{result['throughput']:7.1f} req/s  {result['connections_opened']:>5} connects  "
+            f"{result['pool_wait_ms']:>6}ms pool wait"
+        )
+
+    def compare(self, baseline, current):
+        """Prints the p50/p95 and throughput changes of every path present in both runs."""
+        self.stdout.write(f"\nCompared with {baseline['mode']}:")
+        for path, result in current["results"].items():
+            previous = baseline["results"].get(path)
+            if previous is None:
+                continue
+            changes = [
+                (result[key] / previous[key] - 1) * 100 if previous[key] else 0
+                for key in ("p50", "p95", "throughput")
+            ]
+            self.stdout.write(
+                f"{path:<36} p50 {changes[0]:+7.1f}%  p95 {changes[1]:+7.1f}%  "
+                f"throughput {changes[2]:+7.1f}%"
+            )
@@ -0,0 +1,144 @@
+import asyncio
+import importlib.util
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+SERVERS = {
+    "wsgi": ("gunicorn", ["-m", "gunicorn", "PROJECT.wsgi:application", "--workers"]),
+    "asgi": ("uvicorn", ["-m", "uvicorn", "PROJECT.asgi:application", "--workers"]),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the throughput of the WSGI (gunicorn) and ASGI (uvicorn) deployments "
+        "under many concurrent, optionally slow, client connections."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/api/v1/subjects/")
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--workers", type=int, default=2, help="Server processes.")
+        parser.add_argument(
+            "--client-delay",
+            type=float,
+            default=0.05,
+            help="Seconds each client waits between sending the request line and its headers.",
+        )
+        parser.add_argument("--port", type=int, default=8700)
+        parser.add_argument("--output", help="Write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        results = {}
+
+        for offset, (name, (module, arguments)) in enumerate(SERVERS.items()):
+            if importlib.util.find_spec(module) is None:
+                self.stderr.write(f"Skipping {name}: {module} is not installed.")
+                continue
+
+            port = options["port"] + offset
+            command = [sys.executable, *arguments, str(options["workers"])]
+            command += ["--bind", f"127.0.0.1:{port}"] if module == "gunicorn" else ["--port", str(port)]
+
+            server = subprocess.Popen(
+                command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=os.environ.copy()
+            )
+            try:
+                self.wait_for_port(port)
+                results[name] = asyncio.run(self.load(port, options))
+            finally:
+                server.terminate()
+                server.wait()
+
+            self.report(name, results[name])
+
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump({"options": {k: options[k] for k in (
+                    "path", "concurrency", "requests", "workers", "client_delay"
+                )}, "results": results}, file, indent=2)
+
+    def wait_for_port(self, port, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=1):
+                    return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f"Server on port {port} did not start.")
+
+    async def load(self, port, options):
+        latencies = []
+        errors = 0
+        remaining = options["requests"]
+        lock = asyncio.Lock()
+
+        async def client():
+            nonlocal remaining, errors
+            while True:
+                async with lock:
+                    if remaining <= 0:
+                        return
+                    remaining -= 1
+
+                started = time.perf_counter()
+                try:
+                    status = await self.request(port, options["path"], options["client_delay"])
+                except OSError:
+                    status = None
+                if status == 200:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(options["concurrency"])))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else None  # noqa: E731
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "seconds": elapsed,
+            "requests_per_second": len(latencies) / elapsed,
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "mean": statistics.fmean(latencies) if latencies else None,
+        }
+
+    async def request(self, port, path, delay):
+        """Sends a GET like a slow mobile client would, returning the response status."""
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            writer.write(f"GET {path} HTTP/1.1\r\n".encode())
+            await writer.drain()
+            await asyncio.sleep(delay)
+            writer.write(b"Host: 127.0.0.1\r\nAccept: application/json\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+
+            status_line = await reader.readline()
+            await reader.read()
+            return int(status_line.split()[1]) if status_line else None
+        finally:
+            writer.close()
+
+    def report(self, name, result):
+        def ms(value):
+            return f"{value * 1000:8.1f}ms" if value is not None else "       -"
+
+        self.stdout.write(
+            f"{name}: {result['requests']:>6} ok {result['errors']:>4} failed "
+            f"{result['requests_per_second']:8.1f} req/s  "
+            f"p50 {ms(result['p50'])}  p95 {ms(result['p95'])}  p99 {ms(result['p99'])}"
+        )
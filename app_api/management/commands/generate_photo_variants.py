@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from app_api.images import update_profile_photo_variants
+from app_api.models import User
+
+
+class Command(BaseCommand):
+    help = "Renders the resized variants of every uploaded profile photo that lacks them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", action="store_true", help="Re-render variants that already exist."
+        )
+
+    def handle(self, *args, **options):
+        default = User._meta.get_field("profile_photo").get_default()
+        users = User.objects.exclude(Q(profile_photo="") | Q(profile_photo=default))
+
+        count = 0
+        for pk, source, derivatives in users.values_list(
+            "pk", "profile_photo", "profile_photo_derivatives"
+        ).iterator():
+            if options["all"] or (derivatives or {}).get("source") != source:
+                try:
+                    update_profile_photo_variants(pk, source)
+                except Exception as error:
+                    self.stderr.write(f"Could not render variants of {source}: {error}")
+                    continue
+                count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rendered variants for {count} photos."))
@@ -0,0 +1,30 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app_api.imports import import_users, parse_csv
+
+
+class Command(BaseCommand):
+    help = "Creates users in bulk from a CSV or JSON file, reporting invalid rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=Path, help="CSV or JSON file of users.")
+        parser.add_argument(
+            "--workers", type=int, default=None, help="Password hashing threads."
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        try:
+            content = path.read_text(encoding="utf-8-sig")
+        except OSError as error:
+            raise CommandError(error)
+
+        rows = json.loads(content) if path.suffix == ".json" else parse_csv(content)
+        report = import_users(rows, workers=options["workers"])
+
+        for error in report["errors"]:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(f"Created {report['created']} users."))
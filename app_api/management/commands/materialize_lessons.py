@@ -0,0 +1,37 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from app_api.models import Group
+
+
+class Command(BaseCommand):
+    help = "Creates and removes Lesson rows so that they match the groups' schedules."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "groups", nargs="*", type=int, help="Group ids (default: all active groups)."
+        )
+
+    def handle(self, *args, **options):
+        groups = Group.objects.all()
+        if options["groups"]:
+            groups = groups.filter(pk__in=options["groups"])
+        else:
+            groups = groups.filter(is_active=True)
+
+        started = perf_counter()
+        created, deleted, kept = groups.materialize_lessons()
+        elapsed = perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {created} and deleted {deleted} lessons in {elapsed:.2f}s."
+            )
+        )
+        if kept:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Kept {kept} out-of-schedule lessons that already have attendance."
+                )
+            )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from app_api.models import Tombstone
+from app_api.sync import SYNC_TOMBSTONE_RETENTION, database_now
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes the tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS. Clients whose "
+        "last sync is older are told to sync from scratch."
+    )
+
+    def handle(self, *args, **options):
+        cutoff = database_now(DEFAULT_DB_ALIAS) - SYNC_TOMBSTONE_RETENTION
+        deleted, _ = Tombstone.objects.filter(created__lt=cutoff).delete()
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} tombstones."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app_api.models import LessonAttendanceSummary, StudentAttendanceSummary
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the attendance summary tables from the Attendance table."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            students = StudentAttendanceSummary.objects.refresh()
+            lessons = LessonAttendanceSummary.objects.refresh()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {len(students)} student and {len(lessons)} lesson summaries."
+            )
+        )
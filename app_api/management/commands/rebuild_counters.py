@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app_api import cache
+from app_api.models import Group, Subject
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the stored enrollment counters of all groups and subjects."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            groups = Group.objects.all().refresh_counters()
+            subjects = Subject.objects.all().refresh_counters()
+            cache.invalidate("groups", "subjects")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt counters for {groups} groups and {subjects} subjects.")
+        )
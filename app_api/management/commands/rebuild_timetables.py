@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app_api import cache
+from app_api.models import LessonOccurrence
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the lesson occurrences that timetables are served from."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "groups", nargs="*", type=int, help="Group ids (default: all groups)."
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            occurrences = LessonOccurrence.objects.refresh(group_ids=options["groups"] or None)
+            cache.invalidate("timetables")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(occurrences)} lesson occurrences."))
@@ -1,5 +1,32 @@
+from collections import defaultdict
+from itertools import groupby
+
+from django.apps import apps
 from django.contrib.auth.models import UserManager as Manager
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def delete_without_signals(model, pks, batch_size=1000, exclude=None):
+    """
+    Deletes the rows of `model` with the given primary keys by batches of plain
+    DELETE statements, without loading them or sending per-row delete signals.
+    Nothing is cascaded or protected, so the rows that may have gained references
+    since their ids were read must be skipped by the `exclude` condition, which is
+    checked by the DELETE statements themselves.
+
+    Returns:
+        - int: The number of deleted rows.
+    """
+    using = router.db_for_write(model)
+    deleted = 0
+    for start in range(0, len(pks), batch_size):
+        rows = model._base_manager.filter(pk__in=pks[start:start + batch_size])
+        if exclude is not None:
+            rows = rows.exclude(exclude)
+        deleted += rows._raw_delete(using)
+    return deleted
 
 
 class UserManager(Manager):
@@ -133,3 +160,388 @@ class ParentManager(RoleBasedManager):
 
     def get_queryset(self):
         return super().get_queryset().filter(role="parent")
+
+
+class GroupQuerySet(models.QuerySet):
+    """Custom queryset for Group model."""
+
+    def with_listing_data(self):
+        """
+        Join the teacher and subject rows, so that serializing a page of groups
+        costs a constant number of queries.
+        """
+        return self.select_related("teacher", "subject")
+
+    def refresh_counters(self):
+        """
+        Recompute the stored students_count of every group in the queryset
+        with a single UPDATE statement.
+        """
+        through = self.model.user_set.through
+        students = (
+            through.objects.filter(group_id=models.OuterRef("pk"), user__role="student")
+            .order_by()
+            .values("group_id")
+            .annotate(count=models.Count("user_id"))
+            .values("count")
+        )
+        return self.update(
+            students_count=Coalesce(models.Subquery(students), 0),
+            updated=timezone.now(),
+        )
+
+    def materialize_lessons(self, batch_size=1000):
+        """
+        Brings the Lesson rows of every group in the queryset in line with the
+        group's schedule (lesson_days between start_date and end_date).
+
+        Missing dates are bulk-inserted and dates no longer in the schedule are
+        deleted, so re-running after an edit only touches the changed dates.
+        Lessons that already have attendance are never deleted. The deleted lessons
+        send no per-row signals: their tombstones are inserted in bulk and the
+        cached timetables are invalidated once.
+
+        Returns:
+            - tuple: (created, deleted, kept) lesson counts, where "kept" counts
+              out-of-schedule lessons left in place because of their attendance.
+        """
+        lesson_model = self.model.lesson_set.field.model
+        attendance_model = lesson_model.attendance_set.field.model
+
+        groups = list(self.only("id", "lesson_days", "start_date", "end_date"))
+        existing = defaultdict(dict)
+        lessons = (
+            lesson_model.objects.filter(group__in=[group.pk for group in groups])
+            .annotate(
+                has_attendance=models.Exists(
+                    attendance_model.objects.filter(lesson=models.OuterRef("pk"))
+                )
+            )
+            .values_list("pk", "group_id", "lesson_date", "has_attendance")
+        )
+        for pk, group_id, lesson_date, has_attendance in lessons.iterator():
+            existing[group_id].setdefault(lesson_date, []).append((pk, has_attendance))
+
+        to_create = []
+        to_delete = []
+        kept = 0
+        for group in groups:
+            scheduled = set(group.lesson_dates())
+            current = existing[group.pk]
+
+            to_create.extend(
+                lesson_model(group_id=group.pk, theme="", lesson_date=lesson_date)
+                for lesson_date in sorted(scheduled - current.keys())
+            )
+            for lesson_date in current.keys() - scheduled:
+                for pk, has_attendance in current[lesson_date]:
+                    if has_attendance:
+                        kept += 1
+                    else:
+                        to_delete.append(pk)
+
+        with transaction.atomic():
+            lesson_model.objects.bulk_create(to_create, batch_size=batch_size)
+            if to_delete:
+                # Attendance may have been marked since the lessons were read.
+                deleted = delete_without_signals(
+                    lesson_model,
+                    to_delete,
+                    batch_size,
+                    exclude=models.Exists(
+                        attendance_model.objects.filter(lesson=models.OuterRef("pk"))
+                    ),
+                )
+                if deleted < len(to_delete):
+                    survivors = set(
+                        lesson_model.objects.filter(pk__in=to_delete).values_list("pk", flat=True)
+                    )
+                    to_delete = [pk for pk in to_delete if pk not in survivors]
+                    kept += len(survivors)
+            if to_create or to_delete:
+                # Bulk writes send no signals.
+                from .signals import record_bulk_changes
+
+                record_bulk_changes(lesson_model, deleted_pks=to_delete)
+
+        return len(to_create), len(to_delete), kept
+
+    def overlapping(self, teacher, lesson_days, start_date, end_date, start_time, end_time):
+        """
+        Active groups of the teacher on the same lesson days whose terms and lesson
+        times overlap the given ones. Served by the group_teacher_schedule_idx index.
+        """
+        return self.filter(
+            is_active=True,
+            teacher=teacher,
+            lesson_days=lesson_days,
+            lesson_start_time__lt=end_time,
+            lesson_end_time__gt=start_time,
+            start_date__lte=end_date,
+            end_date__gte=start_date,
+        )
+
+    def schedule_conflicts(self):
+        """
+        Yields every pair of active groups in the queryset that the same teacher
+        teaches on the same lesson days at overlapping times and terms.
+
+        The groups are read in group_teacher_schedule_idx order, and each
+        (teacher, lesson_days) run is swept by lesson_start_time, comparing a
+        group only with the earlier groups whose lessons have not ended yet.
+
+        Returns:
+            - generator: (earlier, later) pairs of dicts with the id, name, teacher,
+              lesson_days, start_date, end_date, lesson_start_time and lesson_end_time.
+        """
+        rows = (
+            self.filter(is_active=True)
+            .order_by("teacher_id", "lesson_days", "lesson_start_time", "pk")
+            .values(
+                "id",
+                "name",
+                "teacher",
+                "lesson_days",
+                "start_date",
+                "end_date",
+                "lesson_start_time",
+                "lesson_end_time",
+            )
+        )
+
+        runs = groupby(rows.iterator(), key=lambda row: (row["teacher"], row["lesson_days"]))
+        for _, run in runs:
+            ongoing = []
+            for group in run:
+                ongoing = [
+                    other
+                    for other in ongoing
+                    if other["lesson_end_time"] > group["lesson_start_time"]
+                ]
+                for other in ongoing:
+                    if (
+                        other["start_date"] <= group["end_date"]
+                        and group["start_date"] <= other["end_date"]
+                    ):
+                        yield other, group
+                ongoing.append(group)
+
+
+class SubjectQuerySet(models.QuerySet):
+    """Custom queryset for Subject model."""
+
+    def refresh_counters(self):
+        """
+        Recompute the stored groups_count and students_count of every subject
+        in the queryset with a single UPDATE statement.
+        """
+        group_model = self.model.group_set.field.model
+        through = group_model.user_set.through
+        groups = (
+            group_model.objects.filter(subject_id=models.OuterRef("pk"))
+            .order_by()
+            .values("subject_id")
+            .annotate(count=models.Count("pk"))
+            .values("count")
+        )
+        students = (
+            through.objects.filter(
+                group__subject_id=models.OuterRef("pk"), user__role="student"
+            )
+            .order_by()
+            .values("group__subject_id")
+            .annotate(count=models.Count("user_id", distinct=True))
+            .values("count")
+        )
+        return self.update(
+            groups_count=Coalesce(models.Subquery(groups), 0),
+            students_count=Coalesce(models.Subquery(students), 0),
+            updated=timezone.now(),
+        )
+
+
+class AttendanceQuerySet(models.QuerySet):
+    """Custom queryset for Attendance model."""
+
+    def bulk_mark(self, lesson, marks):
+        """
+        Upsert the attendance of a lesson roster with a single INSERT ... ON CONFLICT
+        statement, keyed on (lesson, student), and refresh the affected summaries.
+
+        Parameters:
+            - lesson (Lesson): The lesson being marked.
+            - marks (dict): Maps student ids to their is_absent value.
+        """
+        self.bulk_create(
+            [
+                self.model(lesson=lesson, student_id=student_id, is_absent=is_absent)
+                for student_id, is_absent in marks.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["lesson", "student"],
+            update_fields=["is_absent", "updated"],
+        )
+
+        apps.get_model("app_api", "StudentAttendanceSummary").objects.refresh(
+            group_ids=[lesson.group_id], student_ids=list(marks)
+        )
+        apps.get_model("app_api", "LessonAttendanceSummary").objects.refresh(
+            keys=[(lesson.group_id, lesson.lesson_date)]
+        )
+
+        return self.filter(lesson=lesson)
+
+
+class StudentAttendanceSummaryQuerySet(models.QuerySet):
+    """Custom queryset for StudentAttendanceSummary model."""
+
+    def refresh(self, group_ids=None, student_ids=None):
+        """
+        Recompute the summaries of the given students in the given groups from the
+        Attendance table with a single GROUP BY query. Omitting both rebuilds every row.
+
+        Summaries are upserted in place, so they keep their ids, and only those whose
+        (student, group) is missing from the aggregate are deleted. They are matched
+        against it here rather than with NOT EXISTS, whose plan degrades to nested
+        sequential scans while the table statistics predate a bulk load.
+        """
+        attendance_model = apps.get_model("app_api", "Attendance")
+        attendance = attendance_model.objects.all()
+        scope = self.all()
+        if group_ids is not None:
+            attendance = attendance.filter(lesson__group_id__in=group_ids)
+            scope = scope.filter(group_id__in=group_ids)
+        if student_ids is not None:
+            attendance = attendance.filter(student_id__in=student_ids)
+            scope = scope.filter(student_id__in=student_ids)
+
+        rows = (
+            attendance.order_by()
+            .values("student_id", "lesson__group_id")
+            .annotate(
+                lessons=models.Count("pk"),
+                absences=models.Count("pk", filter=models.Q(is_absent=True)),
+            )
+        )
+
+        with transaction.atomic():
+            rows = list(rows.iterator())
+            summaries = self.bulk_create(
+                [
+                    self.model(
+                        student_id=row["student_id"],
+                        group_id=row["lesson__group_id"],
+                        lessons_count=row["lessons"],
+                        absences_count=row["absences"],
+                    )
+                    for row in rows
+                ],
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=["student", "group"],
+                update_fields=["lessons_count", "absences_count", "updated"],
+            )
+            marked = {(row["student_id"], row["lesson__group_id"]) for row in rows}
+            stale = [
+                pk
+                for pk, student_id, group_id in scope.values_list("pk", "student_id", "group_id")
+                if (student_id, group_id) not in marked
+            ]
+            delete_without_signals(self.model, stale)
+            return summaries
+
+
+class LessonAttendanceSummaryQuerySet(models.QuerySet):
+    """Custom queryset for LessonAttendanceSummary model."""
+
+    def refresh(self, keys=None):
+        """
+        Recompute the summaries of the given (group_id, lesson_date) pairs from the
+        Attendance table with a single GROUP BY query. Omitting keys rebuilds every row.
+
+        Summaries are upserted in place, so they keep their ids, and only those whose
+        (group, lesson_date) is missing from the aggregate are deleted.
+        """
+        attendance_model = apps.get_model("app_api", "Attendance")
+        attendance = attendance_model.objects.all()
+        scope = self.all()
+        if keys is not None:
+            condition = models.Q(pk__in=[])
+            for group_id, lesson_date in set(keys):
+                condition |= models.Q(group_id=group_id, lesson_date=lesson_date)
+            scope = scope.filter(condition)
+
+            condition = models.Q(pk__in=[])
+            for group_id, lesson_date in set(keys):
+                condition |= models.Q(lesson__group_id=group_id, lesson__lesson_date=lesson_date)
+            attendance = attendance.filter(condition)
+
+        rows = (
+            attendance.order_by()
+            .values("lesson__group_id", "lesson__lesson_date")
+            .annotate(
+                present=models.Count("pk", filter=models.Q(is_absent=False)),
+                absent=models.Count("pk", filter=models.Q(is_absent=True)),
+            )
+        )
+
+        with transaction.atomic():
+            rows = list(rows.iterator())
+            summaries = self.bulk_create(
+                [
+                    self.model(
+                        group_id=row["lesson__group_id"],
+                        lesson_date=row["lesson__lesson_date"],
+                        present_count=row["present"],
+                        absent_count=row["absent"],
+                    )
+                    for row in rows
+                ],
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=["group", "lesson_date"],
+                update_fields=["present_count", "absent_count", "updated"],
+            )
+            marked = {(row["lesson__group_id"], row["lesson__lesson_date"]) for row in rows}
+            stale = [
+                pk
+                for pk, group_id, lesson_date in scope.values_list("pk", "group_id", "lesson_date")
+                if (group_id, lesson_date) not in marked
+            ]
+            delete_without_signals(self.model, stale)
+            return summaries
+
+
+class LessonOccurrenceQuerySet(models.QuerySet):
+    """Custom queryset for LessonOccurrence model."""
+
+    def refresh(self, group_ids=None, batch_size=1000):
+        """
+        Rebuild the occurrences of the given groups from their schedules. Inactive
+        groups get none. Omitting group_ids rebuilds every row.
+        """
+        groups = apps.get_model("app_api", "Group").objects.filter(is_active=True)
+        scope = self.all()
+        if group_ids is not None:
+            groups = groups.filter(pk__in=group_ids)
+            scope = scope.filter(group_id__in=group_ids)
+
+        groups = groups.only(
+            "id", "lesson_days", "start_date", "end_date", "lesson_start_time", "lesson_end_time"
+        )
+
+        with transaction.atomic():
+            scope.delete()
+            return self.bulk_create(
+                [
+                    self.model(
+                        group_id=group.pk,
+                        date=date,
+                        start_time=group.lesson_start_time,
+                        end_time=group.lesson_end_time,
+                    )
+                    for group in groups.iterator()
+                    for date in group.lesson_dates()
+                ],
+                batch_size=batch_size,
+            )
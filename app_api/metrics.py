@@ -0,0 +1,391 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from ipaddress import ip_address, ip_network
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.serializers import ListSerializer
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets.
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Addresses allowed to scrape /metrics/ without a staff session.
+METRICS_ALLOWED_NETWORKS = [
+    ip_network(network)
+    for network in getattr(settings, "METRICS_ALLOWED_NETWORKS", ("127.0.0.0/8", "::1/128"))
+]
+
+current_stats = ContextVar("request_stats", default=None)
+
+
+class RequestStats:
+    """Measurements of a single request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.fingerprints = Counter()
+        # Parallel batch sub-requests record into the stats of the batch request.
+        self._lock = threading.Lock()
+
+    def record_query(self, sql, duration):
+        key = fingerprint(sql)
+        with self._lock:
+            self.queries += 1
+            self.db_time += duration
+            self.fingerprints[key] += 1
+
+    def record_serializer(self, duration):
+        with self._lock:
+            self.serializer_time += duration
+
+    @property
+    def duplicates(self):
+        """Fingerprints of the queries that ran more than once, with their counts."""
+        return {key: count for key, count in self.fingerprints.items() if count > 1}
+
+
+def label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def fingerprint(sql):
+    # Parameters are passed separately from the SQL, so the text identifies the query shape.
+    return hashlib.sha1(sql.encode()).hexdigest()[:12]
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                return
+        self.counts[-1] += 1
+
+
+class MetricsRegistry:
+    """
+    Per-route histograms of this process, rendered in the Prometheus text format.
+    Every server process keeps and exposes its own registry.
+    """
+
+    metrics = {
+        "http_request_duration_seconds": ("Request duration.", SECONDS_BUCKETS),
+        "http_request_db_seconds": ("Time spent in SQL queries per request.", SECONDS_BUCKETS),
+        "http_request_db_queries": ("SQL queries per request.", QUERY_BUCKETS),
+        "http_request_serializer_seconds": ("Time spent serializing per request.", SECONDS_BUCKETS),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = defaultdict(dict)
+        self._duplicates = Counter()
+
+    def observe(self, route, method, duration, stats):
+        values = {
+            "http_request_duration_seconds": duration,
+            "http_request_db_seconds": stats.db_time,
+            "http_request_db_queries": stats.queries,
+            "http_request_serializer_seconds": stats.serializer_time,
+        }
+        labels = (route, method)
+        with self._lock:
+            for name, value in values.items():
+                histogram = self._histograms[name].get(labels)
+                if histogram is None:
+                    histogram = self._histograms[name][labels] = Histogram(self.metrics[name][1])
+                histogram.observe(value)
+            self._duplicates[labels] += sum(count - 1 for count in stats.duplicates.values())
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (description, buckets) in self.metrics.items():
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} histogram")
+                for (route, method), histogram in sorted(self._histograms[name].items()):
+                    labels = f'route="{label(route)}",method="{method}"'
+                    cumulative = 0
+                    for bound, count in zip((*buckets, "+Inf"), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                    lines.append(f"{name}_count{{{labels}}} {cumulative}")
+
+            name = "http_request_duplicate_queries_total"
+            lines.append(f"# HELP {name} Repeated executions of an identical SQL query.")
+            lines.append(f"# TYPE {name} counter")
+            for (route, method), count in sorted(self._duplicates.items()):
+                lines.append(f'{name}{{route="{label(route)}",method="{method}"}} {count}')
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper adding every query to the metrics of the current request."""
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record_query(sql, time.perf_counter() - started)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    Wraps every new connection, of any alias and thread, with record_query(). The
+    request's stats travel in a context variable, which also reaches the threads
+    that run the queries of async views.
+    """
+    if record_query not in connection.execute_wrappers:
+        # First, so that execute_wrapper() blocks still pop their own wrapper last.
+        connection.execute_wrappers.insert(0, record_query)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records the SQL query count, database time, duplicate queries and serializer time
+    of every request. Emits them in a Server-Timing header and feeds the per-route
+    histograms served by the metrics endpoint.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "REQUEST_METRICS", True)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+
+        return self.process_stats(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+
+        return self.process_stats(request, response, stats, time.perf_counter() - started)
+
+    def process_stats(self, request, response, stats, duration):
+        match = request.resolver_match
+        route = match.route.lstrip("^").rstrip("$") if match else "unmatched"
+        registry.observe(route, request.method, duration, stats)
+
+        duplicates = stats.duplicates
+        response["Server-Timing"] = ", ".join(
+            [
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"',
+                f'dupq;desc="{sum(duplicates.values()) - len(duplicates)} duplicate queries"',
+                f"serializer;dur={stats.serializer_time * 1000:.1f}",
+                f"total;dur={duration * 1000:.1f}",
+            ]
+        )
+        if duplicates:
+            logger.info("Duplicate queries on %s %s: %s", request.method, route, duplicates)
+
+        return response
+
+
+def record_serializer_time(started):
+    stats = current_stats.get()
+    if stats is not None:
+        stats.record_serializer(time.perf_counter() - started)
+
+
+class TimedListSerializer(ListSerializer):
+    @property
+    def data(self):
+        started = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            record_serializer_time(started)
+
+
+class TimedSerializerMixin:
+    """Adds the time spent producing `serializer.data` to the request's metrics."""
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        serializer = super().many_init(*args, **kwargs)
+        # Only the plain list class is swapped, custom `list_serializer_class`es are kept.
+        if type(serializer) is ListSerializer:
+            serializer.__class__ = TimedListSerializer
+        return serializer
+
+    @property
+    def data(self):
+        started = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            record_serializer_time(started)
+
+
+# psycopg_pool statistics exported per database alias: (metric, type, description, stat, scale).
+POOL_METRICS = (
+    ("db_pool_size", "gauge", "Connections in the pool, busy or idle.", "pool_size", 1),
+    ("db_pool_available", "gauge", "Idle connections in the pool.", "pool_available", 1),
+    ("db_pool_max_size", "gauge", "Maximum size of the pool.", "pool_max", 1),
+    (
+        "db_pool_requests_waiting",
+        "gauge",
+        "Requests waiting for a connection.",
+        "requests_waiting",
+        1,
+    ),
+    (
+        "db_pool_requests_total",
+        "counter",
+        "Connections requested from the pool.",
+        "requests_num",
+        1,
+    ),
+    (
+        "db_pool_requests_queued_total",
+        "counter",
+        "Connection requests that had to wait for a free connection.",
+        "requests_queued",
+        1,
+    ),
+    (
+        "db_pool_wait_seconds_total",
+        "counter",
+        "Time spent waiting for a connection.",
+        "requests_wait_ms",
+        0.001,
+    ),
+    (
+        "db_pool_request_errors_total",
+        "counter",
+        "Connection requests that timed out or failed.",
+        "requests_errors",
+        1,
+    ),
+    (
+        "db_pool_connections_total",
+        "counter",
+        "Connections opened by the pool.",
+        "connections_num",
+        1,
+    ),
+    (
+        "db_pool_connect_seconds_total",
+        "counter",
+        "Time spent opening connections.",
+        "connections_ms",
+        0.001,
+    ),
+)
+
+
+def pool_stats():
+    """Returns the psycopg_pool statistics of every pooled database alias of this process."""
+    stats = {}
+    for alias in connections:
+        pool = getattr(connections[alias], "pool", None)
+        if pool is not None:
+            stats[alias] = pool.get_stats()
+    return stats
+
+
+def render_pool_metrics(stats):
+    lines = []
+    for name, kind, description, key, scale in POOL_METRICS:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        for alias, values in sorted(stats.items()):
+            lines.append(f'{name}{{alias="{label(alias)}"}} {values.get(key, 0) * scale}')
+
+    name = "db_pool_utilization"
+    lines.append(f"# HELP {name} Share of the maximum pool size in use.")
+    lines.append(f"# TYPE {name} gauge")
+    for alias, values in sorted(stats.items()):
+        busy = values.get("pool_size", 0) - values.get("pool_available", 0)
+        utilization = busy / values["pool_max"] if values.get("pool_max") else 0
+        lines.append(f'{name}{{alias="{label(alias)}"}} {utilization}')
+
+    return "\n".join(lines) + "\n"
+
+
+def may_read_metrics(request):
+    """
+    Whether the request comes from a staff user or straight from an address in
+    METRICS_ALLOWED_NETWORKS. Requests relayed by a proxy (with X-Forwarded-For)
+    are not taken as internal, since REMOTE_ADDR is then the proxy's.
+    """
+    user = getattr(request, "user", None)
+    if user is not None and user.is_active and user.is_staff:
+        return True
+    if "HTTP_X_FORWARDED_FOR" in request.META:
+        return False
+
+    try:
+        address = ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(address in network for network in METRICS_ALLOWED_NETWORKS)
+
+
+def metrics_view(request):
+    """
+    Serves the per-route request histograms and the connection pool statistics
+    of this process in the Prometheus text format, to staff users and to the
+    internal networks only.
+    """
+    if not may_read_metrics(request):
+        return HttpResponseForbidden()
+
+    content = registry.render()
+    stats = pool_stats()
+    if stats:
+        content += render_pool_metrics(stats)
+    return HttpResponse(content, content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.4 on 2026-10-17 22:43
+
+from django.db import migrations, models
+
+
+def populate_counters(apps, schema_editor):
+    Group = apps.get_model("app_api", "Group")
+    Subject = apps.get_model("app_api", "Subject")
+    User = apps.get_model("app_api", "User")
+
+    for group in Group.objects.all():
+        group.students_count = User.objects.filter(
+            student_groups=group, role="student"
+        ).count()
+        group.save(update_fields=["students_count"])
+
+    for subject in Subject.objects.all():
+        subject.groups_count = Group.objects.filter(subject=subject).count()
+        subject.students_count = User.objects.filter(
+            student_groups__subject=subject, role="student"
+        ).distinct().count()
+        subject.save(update_fields=["groups_count", "students_count"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_api', '0008_rename_student_group_user_student_groups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='students_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='subject',
+            name='groups_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='subject',
+            name='students_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
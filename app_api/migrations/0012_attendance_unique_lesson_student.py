@@ -0,0 +1,35 @@
+# Generated by Django 5.1.4 on 2026-10-17 22:45
+
+from django.db import migrations, models
+
+
+def remove_duplicate_attendance(apps, schema_editor):
+    """Keeps only the most recently updated row of every (lesson, student) pair."""
+    Attendance = apps.get_model("app_api", "Attendance")
+
+    seen = set()
+    duplicates = []
+    for pk, lesson_id, student_id in Attendance.objects.order_by(
+        "-updated", "-id"
+    ).values_list("pk", "lesson_id", "student_id").iterator():
+        if (lesson_id, student_id) in seen:
+            duplicates.append(pk)
+        else:
+            seen.add((lesson_id, student_id))
+
+    Attendance.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_api', '0011_sync_tombstones_and_updated_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_attendance, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='attendance',
+            constraint=models.UniqueConstraint(fields=('lesson', 'student'), name='unique_lesson_student'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.1.4 on 2026-10-17 22:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_summaries(apps, schema_editor):
+    Attendance = apps.get_model("app_api", "Attendance")
+    StudentAttendanceSummary = apps.get_model("app_api", "StudentAttendanceSummary")
+    LessonAttendanceSummary = apps.get_model("app_api", "LessonAttendanceSummary")
+
+    rows = Attendance.objects.order_by().values("student_id", "lesson__group_id").annotate(
+        lessons=Count("pk"), absences=Count("pk", filter=Q(is_absent=True))
+    )
+    StudentAttendanceSummary.objects.bulk_create(
+        [
+            StudentAttendanceSummary(
+                student_id=row["student_id"],
+                group_id=row["lesson__group_id"],
+                lessons_count=row["lessons"],
+                absences_count=row["absences"],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+    rows = Attendance.objects.order_by().values("lesson__group_id", "lesson__lesson_date").annotate(
+        present=Count("pk", filter=Q(is_absent=False)), absent=Count("pk", filter=Q(is_absent=True))
+    )
+    LessonAttendanceSummary.objects.bulk_create(
+        [
+            LessonAttendanceSummary(
+                group_id=row["lesson__group_id"],
+                lesson_date=row["lesson__lesson_date"],
+                present_count=row["present"],
+                absent_count=row["absent"],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_api', '0012_attendance_unique_lesson_student'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonAttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('lesson_date', models.DateField()),
+                ('present_count', models.PositiveIntegerField(default=0)),
+                ('absent_count', models.PositiveIntegerField(default=0)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_api.group')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('group', 'lesson_date'), name='unique_group_lesson_date_summary')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentAttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('lessons_count', models.PositiveIntegerField(default=0)),
+                ('absences_count', models.PositiveIntegerField(default=0)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_api.group')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_api.student')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('student', 'group'), name='unique_student_group_summary')],
+            },
+        ),
+        migrations.RunPython(populate_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.4 on 2026-10-17 22:51
+
+import app_api.images
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_api', '0013_attendance_summaries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='profile_photo_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='profile_photo',
+            field=models.ImageField(blank=True, default='users/user-default.png', upload_to='users/', validators=[app_api.images.validate_profile_photo_size]),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.4 on 2026-10-17 23:03
+
+import app_api.indexes
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class PostgresOnlyTrigramExtension(TrigramExtension):
+    """TrigramExtension whose reverse, like its forward, is a no-op on other databases."""
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_api', '0014_profile_photo_derivatives'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role', '-created', '-id'], name='user_role_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role', 'updated'], name='user_role_updated_idx'),
+        ),
+        PostgresOnlyTrigramExtension(),
+        migrations.AddIndex(
+            model_name='user',
+            index=app_api.indexes.PostgresOnlyGinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('first_name'), name='gin_trgm_ops'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('last_name'), name='gin_trgm_ops'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('email'), name='gin_trgm_ops'), condition=models.Q(('role', 'teacher')), name='teacher_search_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=app_api.indexes.PostgresOnlyGinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('first_name'), name='gin_trgm_ops'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('last_name'), name='gin_trgm_ops'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('email'), name='gin_trgm_ops'), condition=models.Q(('role', 'student')), name='student_search_trgm_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.1.4 on 2026-10-17 23:12
+
+import django.db.models.deletion
+from datetime import timedelta
+
+from django.db import migrations, models
+
+from app_api.utils import LessonDays
+
+
+def populate_occurrences(apps, schema_editor):
+    Group = apps.get_model("app_api", "Group")
+    LessonOccurrence = apps.get_model("app_api", "LessonOccurrence")
+
+    occurrences = []
+    for group in Group.objects.filter(is_active=True):
+        weekdays = LessonDays(group.lesson_days).weekdays
+        day = group.start_date
+        while day <= group.end_date:
+            if day.isoweekday() in weekdays:
+                occurrences.append(
+                    LessonOccurrence(
+                        group_id=group.pk,
+                        date=day,
+                        start_time=group.lesson_start_time,
+                        end_time=group.lesson_end_time,
+                    )
+                )
+            day += timedelta(days=1)
+
+    LessonOccurrence.objects.bulk_create(occurrences, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_api', '0015_role_indexes_and_trigram_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonOccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['group', 'lesson_date'], name='lesson_group_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='lessonoccurrence',
+            name='group',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_api.group'),
+        ),
+        migrations.AddConstraint(
+            model_name='lessonoccurrence',
+            constraint=models.UniqueConstraint(fields=('group', 'date'), name='unique_group_occurrence_date'),
+        ),
+        migrations.RunPython(populate_occurrences, migrations.RunPython.noop),
+    ]
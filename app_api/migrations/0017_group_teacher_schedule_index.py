@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-17 23:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_api', '0016_lesson_occurrences'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['teacher', 'lesson_days', 'lesson_start_time', 'lesson_end_time'], name='group_teacher_schedule_idx'),
+        ),
+    ]
@@ -0,0 +1,211 @@
+import hashlib
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date
+from rest_framework.response import Response
+
+from . import cache
+from .fieldsets import narrow_queryset, parse_fieldset
+from .routers import read_from_replica
+
+
+class ConditionalGetMixin:
+    """
+    Adds an ETag validator to the list and retrieve actions of a viewset, and a
+    Last-Modified validator to retrieve.
+
+    The validators are computed with a single MAX(updated)/COUNT query over the
+    filtered queryset (narrowed to one row for retrieve), so a request carrying
+    matching If-None-Match/If-Modified-Since headers gets a 304 response without
+    fetching or serializing any rows. Lists get no Last-Modified: a row deleted or
+    filtered out of a list does not move MAX(updated), only the count in the ETag.
+
+    `conditional_fields` lists the timestamp fields the serialized data depends on,
+    including those of embedded related rows (e.g. "teacher__updated").
+    """
+
+    conditional_fields = ("updated",)
+
+    def get_validator_aggregates(self):
+        aggregates = {
+            f"max_{index}": Max(field) for index, field in enumerate(self.conditional_fields)
+        }
+        aggregates["count"] = Count("pk", distinct=True)
+        return aggregates
+
+    def build_validators(self, values):
+        """Turns the result of the validator aggregates into (etag, last_modified, count)."""
+        timestamps = [
+            value for key, value in values.items() if key != "count" and value is not None
+        ]
+        key = "|".join(
+            [
+                self.request.get_full_path(),
+                self.request.META.get("HTTP_ACCEPT", ""),
+                *(str(values[key]) for key in sorted(values)),
+            ]
+        )
+        etag = f'"{hashlib.md5(key.encode()).hexdigest()}"'
+        last_modified = max(timestamps) if timestamps else None
+
+        return etag, last_modified, values["count"]
+
+    def get_validators(self, queryset):
+        return self.build_validators(
+            queryset.order_by().aggregate(**self.get_validator_aggregates())
+        )
+
+    def get_not_modified_response(self, etag, last_modified):
+        """Returns a 304 (or 412) response if the request's preconditions say so, else None."""
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        return get_conditional_response(self.request, etag=etag, last_modified=timestamp)
+
+    def set_validator_headers(self, response, etag, last_modified):
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if last_modified:
+                response["Last-Modified"] = http_date(int(last_modified.timestamp()))
+        return response
+
+    def conditional_response(self, queryset, render, detail=False):
+        etag, last_modified, count = self.get_validators(queryset)
+        if detail and not count:
+            # Let retrieve() produce its 404.
+            return render()
+        if not detail:
+            last_modified = None
+
+        response = self.get_not_modified_response(etag, last_modified) or render()
+        return self.set_validator_headers(response, etag, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        return self.conditional_response(
+            queryset, lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        render = lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs)  # noqa: E731
+
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]}
+            )
+        except (TypeError, ValueError, ValidationError):
+            return render()
+
+        return self.conditional_response(queryset, render, detail=True)
+
+
+class CachedListMixin:
+    """
+    Serves the list action of a viewset from the response cache.
+
+    Responses are keyed by path, query parameters, the caller's role and media type,
+    and are dropped by the signal handlers whenever the rows they show change.
+    `cache_resource` names the resource in app_api.cache.RESOURCES.
+
+    The ETag and Last-Modified validators of a response are cached with its data,
+    and conditional requests are answered from them, so a cached body is never
+    sent with validators computed later from newer rows. The mixin must therefore
+    come before ConditionalGetMixin in the bases of a viewset.
+    """
+
+    cache_resource = None
+    cached_headers = ("ETag", "Last-Modified")
+
+    def may_be_stale(self):
+        """
+        Whether the response was read from a replica that may not have caught up
+        with the latest write yet, in which case it must not be cached under the
+        new version.
+        """
+        return read_from_replica.get() and cache.invalidated_within(
+            self.cache_resource, getattr(settings, "REPLICA_STICKY_SECONDS", 10)
+        )
+
+    def get_cache_key(self, request):
+        return cache.response_key(self.cache_resource, request)
+
+    def get_cached_response(self, request):
+        """
+        Returns the cached response of the request, or a 304 (or 412) response if
+        the request's preconditions match its cached validators, or None on a miss.
+        """
+        entry = cache.cache.get(self.get_cache_key(request))
+        if entry is None:
+            cache.record(self.cache_resource, "misses")
+            return None
+
+        cache.record(self.cache_resource, "hits")
+        headers = entry["headers"]
+        last_modified = headers.get("Last-Modified")
+        response = get_conditional_response(
+            request,
+            etag=headers.get("ETag"),
+            last_modified=parse_http_date(last_modified) if last_modified else None,
+        )
+        if response is None:
+            response = Response(data=entry["data"])
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    def cache_response(self, request, response):
+        """Caches a successful list response with its validators."""
+        if response.status_code != 200 or self.may_be_stale():
+            return
+        entry = {
+            "data": response.data,
+            "headers": {
+                name: response[name] for name in self.cached_headers if response.has_header(name)
+            },
+        }
+        cache.cache.set(self.get_cache_key(request), entry, cache.RESPONSE_CACHE_TTL)
+
+    def list(self, request, *args, **kwargs):
+        response = self.get_cached_response(request)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+            self.cache_response(request, response)
+        return response
+
+
+class SparseFieldsMixin:
+    """
+    Adds ?fields= and ?expand= to the list and retrieve actions of a viewset.
+
+    ?fields=id,name,teacher.first_name picks the serialized fields (dotted names
+    reach into expanded relations) and ?expand=teacher embeds a related object
+    instead of its id (see serializers.FieldSelectionMixin). The selection is also
+    applied to the queryset, so the SQL only selects and joins what is rendered.
+    """
+
+    sparse_actions = ("list", "retrieve")
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in self.sparse_actions:
+            params = self.request.query_params
+            kwargs.setdefault("fieldset", parse_fieldset(params.get("fields")))
+            kwargs.setdefault("expand", parse_fieldset(params.get("expand")))
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in self.sparse_actions:
+            return queryset
+
+        ordering = getattr(self.paginator, "ordering", None) or ()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+
+        return narrow_queryset(
+            queryset,
+            self.get_serializer().fields,
+            required=[field.lstrip("-") for field in ordering],
+        )
@@ -1,20 +1,65 @@
+from datetime import timedelta
 from uuid import uuid4
 
 from django.contrib.auth.hashers import check_password, make_password
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import OpClass
 from django.db import models
+from django.db.models.functions import Upper
 
+from .images import validate_profile_photo_size
+from .indexes import PostgresOnlyGinIndex
 from .managers import (
     AdminManager,
+    AttendanceQuerySet,
+    GroupQuerySet,
+    LessonAttendanceSummaryQuerySet,
+    LessonOccurrenceQuerySet,
     ParentManager,
+    StudentAttendanceSummaryQuerySet,
     StudentManager,
+    SubjectQuerySet,
     TeacherManager,
     UserManager,
 )
 from .utils import LessonDays, Roles
 
 
-class User(AbstractUser):
+class LoadedValuesMixin:
+    """
+    Keeps the field values an instance was last loaded with or saved with in
+    `_loaded_values`, so that signal handlers can tell what a save changes without
+    reading the row again. Fields that were never loaded (deferred) are missing.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self.remember_values(fields)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.remember_values(kwargs.get("update_fields"))
+
+    def remember_values(self, fields=None):
+        """Records the current values of `fields` (default: every loaded field) as stored."""
+        self._loaded_values = {
+            **getattr(self, "_loaded_values", {}),
+            **{
+                field.attname: field.to_python(self.__dict__[field.attname])
+                for field in self._meta.concrete_fields
+                if (fields is None or field.name in fields or field.attname in fields)
+                and field.attname in self.__dict__
+            },
+        }
+
+
+class User(LoadedValuesMixin, AbstractUser):
     """
     Custom user model extending Django's AbstractUser.
 
@@ -24,10 +69,15 @@ class User(AbstractUser):
         - first_name (CharField): User's first name.
         - last_name (CharField): User's last name.
         - profile_photo (ImageField): Optional profile photo for the user. Defaults to "media/users/user-default.png".
+        - profile_photo_derivatives (JSONField): Storage names of the resized variants of profile_photo.
         - roles (CharField): User's role for the system. Defaults to "student". Choices: "admin", "teacher", "parent", "student".
 
     Meta:
         - constraints: Ensures that the combination of first_name and last_name is unique.
+        - indexes: Role-leading indexes serve the Admin/Teacher/Student/Parent lists and syncs.
+          Teacher and student name/email search is served by partial pg_trgm GIN indexes
+          on UPPER(first_name/last_name/email), the expressions of icontains on PostgreSQL
+          (PostgreSQL only).
 
     Additional Attributes:
         - USERNAME_FIELD (str): Specifies 'email' as the field used for authentication.
@@ -45,8 +95,12 @@ class User(AbstractUser):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     profile_photo = models.ImageField(
-        default="users/user-default.png", upload_to="users/", blank=True
+        default="users/user-default.png",
+        upload_to="users/",
+        blank=True,
+        validators=[validate_profile_photo_size],
     )
+    profile_photo_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     role = models.CharField(
         max_length=10, choices=Roles.choices, default=Roles.STUDENT)
     student_groups = models.ManyToManyField(to="Group")
@@ -61,6 +115,26 @@ class User(AbstractUser):
                 fields=["first_name", "last_name"], name="unique_full_name"
             )
         ]
+        indexes = [
+            models.Index(fields=["-created", "-id"], name="user_created_id_idx"),
+            models.Index(fields=["updated"], name="user_updated_idx"),
+            models.Index(fields=["role", "-created", "-id"], name="user_role_created_id_idx"),
+            models.Index(fields=["role", "updated"], name="user_role_updated_idx"),
+            # ?search= on the teacher and student lists: SearchFilter's icontains is
+            # UPPER("field"::text) LIKE UPPER('%term%') on PostgreSQL, which these
+            # pg_trgm indexes serve for terms of three or more characters.
+            *(
+                PostgresOnlyGinIndex(
+                    *(
+                        OpClass(Upper(field), name="gin_trgm_ops")
+                        for field in ("first_name", "last_name", "email")
+                    ),
+                    condition=models.Q(role=role),
+                    name=f"{role}_search_trgm_idx",
+                )
+                for role in (Roles.TEACHER, Roles.STUDENT)
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         """
@@ -167,12 +241,22 @@ class Subject(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
     name = models.CharField(max_length=100, unique=True)
+    groups_count = models.PositiveIntegerField(default=0, editable=False)
+    students_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = SubjectQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-created", "-id"], name="subject_created_id_idx"),
+            models.Index(fields=["updated"], name="subject_updated_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
 
-class Group(models.Model):
+class Group(LoadedValuesMixin, models.Model):
     # id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
@@ -185,10 +269,40 @@ class Group(models.Model):
     lesson_start_time = models.TimeField()
     lesson_end_time = models.TimeField()
     is_active = models.BooleanField(default=True)
+    students_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = GroupQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-created", "-id"], name="group_created_id_idx"),
+            models.Index(fields=["updated"], name="group_updated_idx"),
+            models.Index(
+                fields=["teacher", "lesson_days", "lesson_start_time", "lesson_end_time"],
+                condition=models.Q(is_active=True),
+                name="group_teacher_schedule_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.teacher.full_name}"
 
+    def lesson_dates(self):
+        """
+        Returns every date between start_date and end_date (inclusive)
+        that falls on one of the group's lesson days.
+        """
+        weekdays = LessonDays(self.lesson_days).weekdays
+        day = self.start_date
+        dates = []
+
+        while day <= self.end_date:
+            if day.isoweekday() in weekdays:
+                dates.append(day)
+            day += timedelta(days=1)
+
+        return dates
+
 
 class Lesson(models.Model):
     # id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
@@ -198,6 +312,12 @@ class Lesson(models.Model):
     theme = models.CharField(max_length=200)
     lesson_date = models.DateField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["updated"], name="lesson_updated_idx"),
+            models.Index(fields=["group", "lesson_date"], name="lesson_group_date_idx"),
+        ]
+
     def __str__(self):
         return self.theme
 
@@ -210,5 +330,132 @@ class Attendance(models.Model):
     student = models.ForeignKey(to=Student, on_delete=models.PROTECT)
     is_absent = models.BooleanField(default=True)
 
+    objects = AttendanceQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["lesson", "student"], name="unique_lesson_student"
+            )
+        ]
+
     def __str__(self):
         return f"{self.student.full_name} - {self.is_absent}"
+
+
+class StudentAttendanceSummary(models.Model):
+    """
+    Precomputed attendance totals of a student in a group, kept up to date
+    whenever attendance is written.
+
+    Fields:
+        - student (ForeignKey): The student.
+        - group (ForeignKey): The group whose lessons are counted.
+        - lessons_count (PositiveIntegerField): Lessons the student was marked for.
+        - absences_count (PositiveIntegerField): Lessons the student was absent from.
+    """
+
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    student = models.ForeignKey(to=Student, on_delete=models.CASCADE)
+    group = models.ForeignKey(to=Group, on_delete=models.CASCADE)
+    lessons_count = models.PositiveIntegerField(default=0)
+    absences_count = models.PositiveIntegerField(default=0)
+
+    objects = StudentAttendanceSummaryQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["student", "group"], name="unique_student_group_summary"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} - {self.group_id}: {self.absences_count}/{self.lessons_count}"
+
+
+class LessonAttendanceSummary(models.Model):
+    """
+    Precomputed attendance totals of a group on a lesson date, kept up to date
+    whenever attendance is written.
+
+    Fields:
+        - group (ForeignKey): The group.
+        - lesson_date (DateField): The date of the group's lesson(s).
+        - present_count (PositiveIntegerField): Students marked present.
+        - absent_count (PositiveIntegerField): Students marked absent.
+    """
+
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    group = models.ForeignKey(to=Group, on_delete=models.CASCADE)
+    lesson_date = models.DateField()
+    present_count = models.PositiveIntegerField(default=0)
+    absent_count = models.PositiveIntegerField(default=0)
+
+    objects = LessonAttendanceSummaryQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["group", "lesson_date"], name="unique_group_lesson_date_summary"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.group_id} - {self.lesson_date}: {self.absent_count} absent"
+
+
+class LessonOccurrence(models.Model):
+    """
+    Precomputed lesson occurrence of an active group, one row per scheduled date,
+    rebuilt whenever the group's schedule changes. Timetables are read from here
+    instead of expanding lesson_days between start_date and end_date per request.
+
+    Fields:
+        - group (ForeignKey): The group.
+        - date (DateField): A date on one of the group's lesson days.
+        - start_time (TimeField): The group's lesson_start_time.
+        - end_time (TimeField): The group's lesson_end_time.
+    """
+
+    group = models.ForeignKey(to=Group, on_delete=models.CASCADE)
+    date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+
+    objects = LessonOccurrenceQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["group", "date"], name="unique_group_occurrence_date")
+        ]
+
+    def __str__(self):
+        return f"{self.group_id} - {self.date} {self.start_time}-{self.end_time}"
+
+
+class Tombstone(models.Model):
+    """
+    Record of a deleted row, served by the sync endpoint so that clients can
+    drop their local copy.
+
+    Fields:
+        - created (DateTimeField): When the row was deleted.
+        - resource (CharField): Sync resource name of the row, e.g. "users".
+        - object_id (PositiveBigIntegerField): Primary key of the deleted row.
+    """
+
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    resource = models.CharField(max_length=50)
+    object_id = models.PositiveBigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created"], name="tombstone_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.resource} #{self.object_id}"
@@ -0,0 +1,82 @@
+import msgpack
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .spreadsheets import stream_csv, stream_xlsx
+
+# Values orjson and msgpack cannot encode natively (Decimal, lazy strings, querysets...)
+# and datetimes, whose DRF formatting (milliseconds, "Z" for UTC) is kept.
+_encoder = JSONEncoder()
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Drop-in replacement for DRF's JSONRenderer that encodes with orjson.
+
+    The output matches JSONRenderer's compact, UTF-8 output. Indented output
+    (e.g. for the browsable API) falls back to JSONRenderer.
+    """
+
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=_encoder.default, option=self.options)
+
+        # Like JSONRenderer, escape U+2028/U+2029 so the output is valid JavaScript.
+        if b"\xe2\x80" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Renders MessagePack for clients sending "Accept: application/msgpack" (or ?format=msgpack).
+    Values without a MessagePack type are converted like the JSON renderers do.
+    """
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        return msgpack.packb(data, default=_encoder.default, datetime=False)
+
+
+class CSVRenderer(BaseRenderer):
+    """Renders a list of rows (lists of values) as CSV. Used by the export endpoints."""
+
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        return b"".join(stream_csv(data))
+
+
+class XLSXRenderer(BaseRenderer):
+    """Renders a list of rows (lists of values) as a single-sheet XLSX workbook."""
+
+    media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    format = "xlsx"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        return b"".join(stream_xlsx(data))
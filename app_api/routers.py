@@ -0,0 +1,156 @@
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+API_PREFIX = "/api/"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+PIN_COOKIE = "pin_primary"
+PIN_KEY_PREFIX = "replicas:pin"
+
+# Whether reads of the current request may be served by a replica.
+read_from_replica = ContextVar("read_from_replica", default=False)
+
+
+class ReplicaRouter:
+    """
+    Sends reads to a random DATABASE_REPLICAS alias while ReplicaRoutingMiddleware
+    allows it, and everything else to the primary ("default").
+
+    Reads outside of requests (management commands, migrations, the shell) and
+    inside a transaction on the primary always use the primary. The first write of
+    a request pins its remaining reads to the primary, so it reads its own writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, "DATABASE_REPLICAS", ())
+        if not replicas or not read_from_replica.get():
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        read_from_replica.set(False)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+
+def client_key(request):
+    """Identifies a client by its Authorization header, or else by its address."""
+    identity = request.META.get("HTTP_AUTHORIZATION") or request.META.get("REMOTE_ADDR", "")
+    return f"{PIN_KEY_PREFIX}:{hashlib.sha1(identity.encode()).hexdigest()}"
+
+
+@contextmanager
+def primary_reads():
+    """Sends the reads made inside the block to the primary."""
+    token = read_from_replica.set(False)
+    try:
+        yield
+    finally:
+        read_from_replica.reset(token)
+
+
+def replica_reads(content):
+    """Keeps replica reads enabled while a streaming response is being consumed."""
+    token = read_from_replica.set(True)
+    try:
+        yield from content
+    finally:
+        read_from_replica.reset(token)
+
+
+async def areplica_reads(content):
+    """Async counterpart of replica_reads() for async streaming responses."""
+    token = read_from_replica.set(True)
+    try:
+        async for chunk in content:
+            yield chunk
+    finally:
+        read_from_replica.reset(token)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets safe-method API requests read from the replicas, unless the client wrote
+    within the last REPLICA_STICKY_SECONDS (read-your-writes).
+
+    A write pins the client to the primary both with a cookie and with a cache
+    entry keyed by its Authorization header (or address), for clients that drop
+    cookies. The window should exceed the usual replication lag.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sticky_seconds = getattr(settings, "REPLICA_STICKY_SECONDS", 10)
+        self.enabled = bool(getattr(settings, "DATABASE_REPLICAS", ()))
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        key = client_key(request)
+        use_replica = self.may_use_replica(request) and not cache.get(key)
+
+        token = read_from_replica.set(use_replica)
+        try:
+            response = self.get_response(request)
+        finally:
+            read_from_replica.reset(token)
+
+        if request.method not in SAFE_METHODS:
+            cache.set(key, True, self.sticky_seconds)
+        return self.process_response(request, response, use_replica)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        key = client_key(request)
+        use_replica = self.may_use_replica(request) and not await cache.aget(key)
+
+        token = read_from_replica.set(use_replica)
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_from_replica.reset(token)
+
+        if request.method not in SAFE_METHODS:
+            await cache.aset(key, True, self.sticky_seconds)
+        return self.process_response(request, response, use_replica)
+
+    def may_use_replica(self, request):
+        return (
+            request.method in SAFE_METHODS
+            and request.path.startswith(API_PREFIX)
+            and PIN_COOKIE not in request.COOKIES
+        )
+
+    def process_response(self, request, response, use_replica):
+        if use_replica and response.streaming:
+            wrap = areplica_reads if response.is_async else replica_reads
+            response.streaming_content = wrap(response.streaming_content)
+
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                PIN_COOKIE, "1", max_age=self.sticky_seconds, httponly=True, samesite="Lax"
+            )
+
+        return response
@@ -1,10 +1,34 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from rest_framework.serializers import ModelSerializer, SerializerMethodField
+from rest_framework.serializers import (
+    BooleanField,
+    CharField,
+    ChoiceField,
+    DictField,
+    IntegerField,
+    JSONField,
+    ListField,
+    ModelSerializer,
+    Serializer,
+    SerializerMethodField,
+    ValidationError,
+)
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth.hashers import make_password
 
-from .models import Subject, Group
+from .batch import SUB_REQUEST_HEADERS
+from .images import profile_photo_variant_urls
+from .metrics import TimedSerializerMixin
+from .models import (
+    Attendance,
+    Group,
+    Lesson,
+    LessonAttendanceSummary,
+    LessonOccurrence,
+    StudentAttendanceSummary,
+    Subject,
+)
 
 User = get_user_model()
 
@@ -20,16 +44,74 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         token["last_name"] = user.last_name
         token["full_name"] = f"{user.first_name} {user.last_name}"
         token["email"] = user.email
-        token["profile_photo"] = user.profile_photo.url
+        token["profile_photo"] = cls.get_profile_photo_url(user)
         token["role"] = user.role
 
         return token
 
+    @staticmethod
+    def get_profile_photo_url(user):
+        """Returns the smallest JPEG variant of the photo, falling back to the original."""
+        variants = profile_photo_variant_urls(user, extension="jpeg")
+        if variants:
+            return variants[min(variants, key=int)]["jpeg"]
+        return user.profile_photo.url
+
 
 class MyTokenObtainPairView(TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
 
 
+class FieldSelectionMixin:
+    """
+    Lets callers choose the serialized fields and expand related objects.
+
+    `fieldset` and `expand` are trees as returned by fieldsets.parse_fieldset(), e.g.
+    GroupSerializer(group, fieldset={"id": {}, "teacher": {"first_name": {}}}).
+    A nested selection such as "teacher.first_name" implies expanding "teacher".
+
+    `expandable_fields` maps a field name to the serializer class that replaces its
+    default (primary key) representation when expanded. `field_dependencies` lists
+    the model lookups that SerializerMethodFields read, so views can narrow their
+    queries (see fieldsets.narrow_queryset()).
+    """
+
+    expandable_fields = {}
+
+    def __init__(self, *args, fieldset=None, expand=None, **kwargs):
+        self.fieldset = fieldset
+        self.expand = dict(expand or {})
+        for name, nested in (fieldset or {}).items():
+            if nested and name in self.expandable_fields:
+                self.expand.setdefault(name, {})
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+
+        unknown = set(self.expand) - set(self.expandable_fields)
+        if unknown:
+            raise ValidationError(
+                {"expand": [f"Unknown expandable fields: {', '.join(sorted(unknown))}."]}
+            )
+        for name, nested_expand in self.expand.items():
+            fields[name] = self.expandable_fields[name](
+                fieldset=(self.fieldset or {}).get(name) or None,
+                expand=nested_expand,
+                read_only=True,
+            )
+
+        if self.fieldset is not None:
+            unknown = set(self.fieldset) - set(fields)
+            if unknown:
+                raise ValidationError(
+                    {"fields": [f"Unknown fields: {', '.join(sorted(unknown))}."]}
+                )
+            fields = {name: field for name, field in fields.items() if name in self.fieldset}
+
+        return fields
+
+
 class PasswordHashMixin:
     def create(self, validated_data):
         # Default to None if not provided
@@ -55,10 +137,37 @@ class PasswordHashMixin:
         return user
 
 
-class UserSerializer(ModelSerializer, PasswordHashMixin):
+class ProfilePhotoVariantsMixin:
+    field_dependencies = {
+        "profile_photo_variants": ("profile_photo", "profile_photo_derivatives"),
+    }
+
+    def get_profile_photo_variants(self, obj):
+        """
+        Returns the URLs of the resized photo variants, keyed by size and format,
+        e.g. {"64": {"webp": ..., "jpeg": ...}}, or {} while they are being generated.
+        """
+        request = self.context.get("request")
+        variants = profile_photo_variant_urls(obj)
+        if request is not None:
+            for urls in variants.values():
+                for extension, url in urls.items():
+                    urls[extension] = request.build_absolute_uri(url)
+        return variants
+
+
+class UserSerializer(
+    TimedSerializerMixin,
+    FieldSelectionMixin,
+    ModelSerializer,
+    PasswordHashMixin,
+    ProfilePhotoVariantsMixin,
+):
+    profile_photo_variants = SerializerMethodField()
+
     class Meta:
         model = User
-        fields = "__all__"
+        exclude = ["profile_photo_derivatives"]
         extra_kwargs = {
             "password": {
                 "write_only": True,
@@ -66,11 +175,19 @@ class UserSerializer(ModelSerializer, PasswordHashMixin):
         }
 
 
-class TeacherSerializer(ModelSerializer, PasswordHashMixin):
+class TeacherSerializer(
+    TimedSerializerMixin,
+    FieldSelectionMixin,
+    ModelSerializer,
+    PasswordHashMixin,
+    ProfilePhotoVariantsMixin,
+):
+    profile_photo_variants = SerializerMethodField()
+
     class Meta:
         model = User
         exclude = ["last_login", "date_joined", "groups",
-                   "user_permissions", "student_groups"]
+                   "user_permissions", "student_groups", "profile_photo_derivatives"]
         extra_kwargs = {
             "password": {
                 "write_only": True,
@@ -78,10 +195,19 @@ class TeacherSerializer(ModelSerializer, PasswordHashMixin):
         }
 
 
-class StudentSerializer(ModelSerializer, PasswordHashMixin):
+class StudentSerializer(
+    TimedSerializerMixin,
+    FieldSelectionMixin,
+    ModelSerializer,
+    PasswordHashMixin,
+    ProfilePhotoVariantsMixin,
+):
+    profile_photo_variants = SerializerMethodField()
+
     class Meta:
         model = User
-        exclude = ["last_login", "date_joined", "groups", "user_permissions"]
+        exclude = ["last_login", "date_joined", "groups",
+                   "user_permissions", "profile_photo_derivatives"]
         extra_kwargs = {
             "password": {
                 "write_only": True,
@@ -89,38 +215,239 @@ class StudentSerializer(ModelSerializer, PasswordHashMixin):
         }
 
 
-class SubjectSerializer(ModelSerializer):
-    students = SerializerMethodField()
-    groups = SerializerMethodField()
+class SubjectSerializer(TimedSerializerMixin, FieldSelectionMixin, ModelSerializer):
+    students = IntegerField(source="students_count", read_only=True)
+    groups = IntegerField(source="groups_count", read_only=True)
 
     class Meta:
         model = Subject
-        fields = "__all__"
+        exclude = ["students_count", "groups_count"]
 
-    def get_students(self, obj):
-        """
-        Returns the count of unique students associated with the subject.
-        """
-        return User.objects.filter(student_groups__in=obj.group_set.all()).distinct().count()
 
-    def get_groups(self, obj):
-        """
-        Returns the counf of unique group associated with the subject
-        """
-        return Group.objects.filter(subject=obj).count()
+# Group fields a schedule conflict depends on.
+SCHEDULE_FIELDS = (
+    "teacher",
+    "lesson_days",
+    "start_date",
+    "end_date",
+    "lesson_start_time",
+    "lesson_end_time",
+)
 
 
-class GroupSerializer(ModelSerializer):
-    teacher = TeacherSerializer()
+class GroupSerializer(TimedSerializerMixin, FieldSelectionMixin, ModelSerializer):
     subject = SerializerMethodField()
-    students = SerializerMethodField()
+    students = IntegerField(source="students_count", read_only=True)
+
+    expandable_fields = {"teacher": TeacherSerializer, "subject": SubjectSerializer}
+    field_dependencies = {"subject": ("subject__name",)}
 
     class Meta:
         model = Group
-        fields = "__all__"
+        exclude = ["students_count"]
 
     def get_subject(self, obj):
         return obj.subject.name
 
-    def get_students(self, obj):
-        return obj.user_set.filter(role="student").count()
+    def validate(self, attrs):
+        """
+        Rejects a schedule that overlaps another active group of the same teacher
+        on the same lesson days, and lessons that end before they start. Updates
+        that leave the schedule alone (e.g. a rename) are not checked.
+        """
+        schedule = {
+            name: attrs.get(name, getattr(self.instance, name, None))
+            for name in SCHEDULE_FIELDS
+        }
+        is_active = attrs.get("is_active", getattr(self.instance, "is_active", True))
+        if not is_active or None in schedule.values():
+            return attrs
+        if self.instance is not None and not any(
+            attrs[name] != getattr(self.instance, name)
+            for name in (*SCHEDULE_FIELDS, "is_active")
+            if name in attrs
+        ):
+            return attrs
+
+        if schedule["lesson_end_time"] <= schedule["lesson_start_time"]:
+            raise ValidationError({"lesson_end_time": "Must be after lesson_start_time."})
+
+        conflicts = Group.objects.overlapping(
+            schedule["teacher"],
+            schedule["lesson_days"],
+            schedule["start_date"],
+            schedule["end_date"],
+            schedule["lesson_start_time"],
+            schedule["lesson_end_time"],
+        )
+        if self.instance is not None:
+            conflicts = conflicts.exclude(pk=self.instance.pk)
+        names = list(conflicts.order_by("name").values_list("name", flat=True)[:5])
+        if names:
+            raise ValidationError(
+                {"teacher": f"The teacher already teaches {', '.join(names)} at this time."}
+            )
+
+        return attrs
+
+
+class LessonSerializer(TimedSerializerMixin, FieldSelectionMixin, ModelSerializer):
+    expandable_fields = {"group": GroupSerializer}
+
+    class Meta:
+        model = Lesson
+        fields = "__all__"
+
+
+class AttendanceSerializer(TimedSerializerMixin, FieldSelectionMixin, ModelSerializer):
+    expandable_fields = {"lesson": LessonSerializer, "student": StudentSerializer}
+
+    class Meta:
+        model = Attendance
+        fields = "__all__"
+
+
+class LessonOccurrenceSerializer(TimedSerializerMixin, ModelSerializer):
+    """
+    A timetable entry. "lesson" is the {"id", "theme"} of the group's Lesson on
+    that date, looked up in the "lessons" context, or null if none was created yet.
+    """
+
+    group_name = CharField(source="group.name", read_only=True)
+    subject = CharField(source="group.subject.name", read_only=True)
+    teacher = CharField(source="group.teacher.full_name", read_only=True)
+    lesson = SerializerMethodField()
+
+    class Meta:
+        model = LessonOccurrence
+        fields = [
+            "date",
+            "start_time",
+            "end_time",
+            "group",
+            "group_name",
+            "subject",
+            "teacher",
+            "lesson",
+        ]
+
+    def get_lesson(self, obj):
+        return self.context.get("lessons", {}).get((obj.group_id, obj.date))
+
+
+class AttendanceMarkSerializer(Serializer):
+    student = IntegerField()
+    is_absent = BooleanField()
+
+
+class AttendanceRosterSerializer(Serializer):
+    """
+    Validates a whole lesson roster, given as a list of {"student", "is_absent"}
+    items, against the students of the lesson's group with a single query.
+    """
+
+    attendance = AttendanceMarkSerializer(many=True, allow_empty=False)
+
+    def validate_attendance(self, value):
+        lesson = self.context["lesson"]
+        student_ids = [mark["student"] for mark in value]
+
+        if len(set(student_ids)) != len(student_ids):
+            raise ValidationError("Each student may only be marked once.")
+
+        enrolled = set(
+            User.objects.filter(
+                pk__in=student_ids, role="student", student_groups=lesson.group_id
+            ).values_list("pk", flat=True)
+        )
+        unknown = [pk for pk in student_ids if pk not in enrolled]
+        if unknown:
+            raise ValidationError(
+                f"Students {unknown} are not enrolled in the lesson's group."
+            )
+
+        return value
+
+
+def absence_rate(absences, total):
+    return round(absences / total, 4) if total else 0.0
+
+
+class StudentAttendanceSummarySerializer(
+    TimedSerializerMixin, FieldSelectionMixin, ModelSerializer
+):
+    absence_rate = SerializerMethodField()
+
+    expandable_fields = {"student": StudentSerializer, "group": GroupSerializer}
+    field_dependencies = {"absence_rate": ("absences_count", "lessons_count")}
+
+    class Meta:
+        model = StudentAttendanceSummary
+        fields = "__all__"
+
+    def get_absence_rate(self, obj):
+        return absence_rate(obj.absences_count, obj.lessons_count)
+
+
+class LessonAttendanceSummarySerializer(
+    TimedSerializerMixin, FieldSelectionMixin, ModelSerializer
+):
+    absence_rate = SerializerMethodField()
+
+    expandable_fields = {"group": GroupSerializer}
+    field_dependencies = {"absence_rate": ("absent_count", "present_count")}
+
+    class Meta:
+        model = LessonAttendanceSummary
+        fields = "__all__"
+
+    def get_absence_rate(self, obj):
+        return absence_rate(obj.absent_count, obj.present_count + obj.absent_count)
+
+
+class AttendanceTotalsSerializer(TimedSerializerMixin, FieldSelectionMixin, Serializer):
+    """
+    Attendance totals of a group or subject, summed from StudentAttendanceSummary rows
+    into "lessons_count"/"absences_count" annotations.
+    """
+
+    id = IntegerField()
+    name = CharField()
+    lessons_count = IntegerField()
+    absences_count = IntegerField()
+    absence_rate = SerializerMethodField()
+
+    field_dependencies = {"absence_rate": ("absences_count", "lessons_count")}
+
+    def get_absence_rate(self, obj):
+        return absence_rate(obj.absences_count, obj.lessons_count)
+
+
+class BatchItemSerializer(Serializer):
+    method = ChoiceField(choices=["GET", "HEAD", "OPTIONS", "POST", "PUT", "PATCH", "DELETE"])
+    path = CharField(max_length=2000)
+    body = JSONField(required=False)
+    headers = DictField(child=CharField(), required=False)
+
+    def validate_headers(self, value):
+        allowed = {name.lower() for name in SUB_REQUEST_HEADERS}
+        invalid = [name for name in value if name.lower() not in allowed]
+        if invalid:
+            raise ValidationError(
+                f"Headers {invalid} cannot be set; allowed: {', '.join(SUB_REQUEST_HEADERS)}."
+            )
+        return value
+
+
+class BatchSerializer(Serializer):
+    """
+    A batch of API calls: {"requests": [{"method", "path", "body"?, "headers"?}, ...],
+    "parallel": <bool>}.
+    """
+
+    requests = ListField(
+        child=BatchItemSerializer(),
+        allow_empty=False,
+        max_length=getattr(settings, "BATCH_MAX_REQUESTS", 20),
+    )
+    parallel = BooleanField(default=False)
@@ -0,0 +1,317 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import cache
+from .authentication import user_store
+from .images import schedule_profile_photo_variants
+from .models import (
+    Admin,
+    Attendance,
+    Group,
+    Lesson,
+    LessonAttendanceSummary,
+    LessonOccurrence,
+    Parent,
+    Student,
+    StudentAttendanceSummary,
+    Subject,
+    Teacher,
+    Tombstone,
+    User,
+)
+
+# Proxy models send model signals with themselves as the sender.
+USER_MODELS = (User, Admin, Teacher, Student, Parent)
+
+
+def refresh_enrollment_counters(group_ids=None, subject_ids=None):
+    """
+    Recompute the stored counters of the given groups, and of the given subjects
+    together with the subjects of those groups, inside a single transaction.
+    """
+    group_ids = set(group_ids or ())
+    subject_ids = set(subject_ids or ())
+
+    with transaction.atomic():
+        if group_ids:
+            Group.objects.filter(pk__in=group_ids).refresh_counters()
+            subject_ids.update(
+                Group.objects.filter(pk__in=group_ids).values_list("subject_id", flat=True)
+            )
+        if subject_ids:
+            Subject.objects.filter(pk__in=subject_ids).refresh_counters()
+
+
+@receiver(m2m_changed, sender=User.student_groups.through)
+def student_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keeps the counters in sync when students are added to or removed from groups,
+    from either side of the relation, and marks the affected users as updated.
+    """
+    if action == "pre_clear":
+        # The cleared rows are gone by "post_clear", so remember what they were.
+        if reverse:
+            instance._cleared_pks = set(instance.user_set.values_list("pk", flat=True))
+        else:
+            instance._cleared_pks = set(instance.student_groups.values_list("pk", flat=True))
+        return
+
+    if action == "post_clear":
+        pks = getattr(instance, "_cleared_pks", set())
+    elif action in ("post_add", "post_remove"):
+        pks = set(pk_set or ())
+    else:
+        return
+
+    group_ids, user_ids = ({instance.pk}, pks) if reverse else (pks, {instance.pk})
+    with transaction.atomic():
+        refresh_enrollment_counters(group_ids=group_ids)
+        User.objects.filter(pk__in=user_ids).update(updated=timezone.now())
+
+    cache.invalidate("students", "groups", "subjects", "timetables")
+
+
+def stored_values(instance, fields):
+    """
+    Returns the stored values of `fields` of a saved instance: those it was loaded
+    with (see LoadedValuesMixin), or else read from the database. Returns None if
+    the row does not exist.
+    """
+    loaded = getattr(instance, "_loaded_values", {})
+    if all(field in loaded for field in fields):
+        return [loaded[field] for field in fields]
+    row = (
+        instance._meta.concrete_model._base_manager.filter(pk=instance.pk)
+        .values_list(*fields)
+        .first()
+    )
+    return list(row) if row is not None else None
+
+
+def user_pre_save(sender, instance, update_fields=None, **kwargs):
+    """
+    Remembers whether the role of an existing user is about to change,
+    since only students are counted.
+    """
+    instance._role_changed = False
+    if instance.pk is None or (update_fields is not None and "role" not in update_fields):
+        return
+
+    stored = stored_values(instance, ["role"])
+    instance._role_changed = stored is not None and stored[0] != instance.role
+
+
+def user_post_save(sender, instance, **kwargs):
+    if getattr(instance, "_role_changed", False):
+        refresh_enrollment_counters(
+            group_ids=instance.student_groups.values_list("pk", flat=True)
+        )
+
+
+def user_pre_delete(sender, instance, **kwargs):
+    # Deleting a user removes its memberships without sending m2m_changed.
+    instance._deleted_group_ids = set(
+        instance.student_groups.values_list("pk", flat=True)
+    )
+
+
+def user_post_delete(sender, instance, **kwargs):
+    refresh_enrollment_counters(group_ids=getattr(instance, "_deleted_group_ids", ()))
+
+
+# Group fields that the lesson occurrences are computed from.
+SCHEDULE_FIELDS = (
+    "lesson_days",
+    "start_date",
+    "end_date",
+    "lesson_start_time",
+    "lesson_end_time",
+    "is_active",
+)
+
+
+@receiver(pre_save, sender=Group)
+def group_pre_save(sender, instance, **kwargs):
+    """
+    Remembers the previous subject so both subjects get recounted on change,
+    and the previous schedule so the occurrences are only rebuilt when it changes.
+    """
+    instance._old_subject_id = None
+    instance._old_schedule = None
+    if instance.pk is not None:
+        old = stored_values(instance, ["subject_id", *SCHEDULE_FIELDS])
+        if old is not None:
+            instance._old_subject_id, *instance._old_schedule = old
+
+
+@receiver(post_save, sender=Group)
+def group_post_save(sender, instance, created, **kwargs):
+    old_subject_id = getattr(instance, "_old_subject_id", None)
+    if created or old_subject_id != instance.subject_id:
+        refresh_enrollment_counters(subject_ids={old_subject_id, instance.subject_id} - {None})
+
+    # Saved values may still be strings, e.g. straight from a form.
+    schedule = [
+        Group._meta.get_field(name).to_python(getattr(instance, name)) for name in SCHEDULE_FIELDS
+    ]
+    if schedule != getattr(instance, "_old_schedule", None):
+        LessonOccurrence.objects.refresh(group_ids=[instance.pk])
+
+
+@receiver(post_delete, sender=Group)
+def group_post_delete(sender, instance, **kwargs):
+    refresh_enrollment_counters(subject_ids={instance.subject_id})
+
+
+def refresh_attendance_summaries(student_group_keys=(), lesson_keys=()):
+    """
+    Recompute the attendance summaries of the given (student_id, group_id) and
+    (group_id, lesson_date) pairs inside a single transaction.
+    """
+    students_by_group = defaultdict(set)
+    for student_id, group_id in student_group_keys:
+        students_by_group[group_id].add(student_id)
+
+    with transaction.atomic():
+        for group_id, student_ids in students_by_group.items():
+            StudentAttendanceSummary.objects.refresh(
+                group_ids=[group_id], student_ids=student_ids
+            )
+        if lesson_keys:
+            LessonAttendanceSummary.objects.refresh(keys=lesson_keys)
+
+
+def attendance_keys(student_id, lesson_id):
+    group_id, lesson_date = Lesson.objects.values_list("group_id", "lesson_date").get(pk=lesson_id)
+    return (student_id, group_id), (group_id, lesson_date)
+
+
+@receiver(pre_save, sender=Attendance)
+def attendance_pre_save(sender, instance, **kwargs):
+    """Remembers the previous lesson and student so that both summaries get refreshed."""
+    instance._old_keys = None
+    if instance.pk is not None:
+        old = Attendance.objects.filter(pk=instance.pk).values_list("student_id", "lesson_id").first()
+        if old and old != (instance.student_id, instance.lesson_id):
+            instance._old_keys = attendance_keys(*old)
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+def attendance_changed(sender, instance, **kwargs):
+    """Keeps the summaries in sync with attendance written outside of bulk marking."""
+    keys = [attendance_keys(instance.student_id, instance.lesson_id)]
+    if getattr(instance, "_old_keys", None):
+        keys.append(instance._old_keys)
+
+    refresh_attendance_summaries(
+        student_group_keys=[student_key for student_key, _ in keys],
+        lesson_keys=[lesson_key for _, lesson_key in keys],
+    )
+
+
+@receiver(pre_save, sender=Lesson)
+def lesson_pre_save(sender, instance, **kwargs):
+    """Remembers the previous group and date of a lesson that has attendance."""
+    instance._old_key = None
+    if instance.pk is not None:
+        instance._old_key = Lesson.objects.filter(
+            pk=instance.pk, attendance__isnull=False
+        ).values_list("group_id", "lesson_date").first()
+
+
+@receiver(post_save, sender=Lesson)
+def lesson_post_save(sender, instance, **kwargs):
+    old_key = getattr(instance, "_old_key", None)
+    new_key = (instance.group_id, instance.lesson_date)
+    if old_key is None or old_key == new_key:
+        return
+
+    student_ids = list(instance.attendance_set.values_list("student_id", flat=True))
+    refresh_attendance_summaries(
+        student_group_keys=[
+            (student_id, group_id)
+            for student_id in student_ids
+            for group_id in {old_key[0], new_key[0]}
+        ],
+        lesson_keys=[old_key, new_key],
+    )
+
+
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Drops the user from the authentication cache on any change, e.g. of role or is_active."""
+    user_store.invalidate(instance.pk)
+
+
+def queue_profile_photo_variants(sender, instance, **kwargs):
+    """Renders the variants of a newly uploaded profile photo once the upload is committed."""
+    source = instance.profile_photo.name
+    default = User._meta.get_field("profile_photo").get_default()
+    if not source or source == default:
+        return
+    if (instance.profile_photo_derivatives or {}).get("source") == source:
+        return
+
+    transaction.on_commit(lambda: schedule_profile_photo_variants(instance.pk, source))
+
+
+# Cached list responses that show data of each model.
+CACHED_RESOURCES = {
+    # Role changes and deletions recount Subject.students_count with update().
+    User: ("teachers", "students", "groups", "subjects", "timetables"),
+    Group: ("groups", "subjects", "students", "timetables"),
+    Subject: ("subjects", "groups", "timetables"),
+    Lesson: ("timetables",),
+}
+
+
+def invalidate_cached_responses(sender, instance, **kwargs):
+    cache.invalidate(*CACHED_RESOURCES[sender._meta.concrete_model])
+
+
+SYNC_RESOURCES = {
+    User: "users",
+    Group: "groups",
+    Subject: "subjects",
+    Lesson: "lessons",
+}
+
+
+def record_tombstone(sender, instance, **kwargs):
+    """Leaves a tombstone behind for every deleted row served by the sync endpoint."""
+    resource = SYNC_RESOURCES[sender._meta.concrete_model]
+    Tombstone.objects.create(resource=resource, object_id=instance.pk)
+
+
+def record_bulk_changes(model, deleted_pks=()):
+    """
+    Does for rows written in bulk what the save and delete receivers do per row:
+    leaves the tombstones of the deleted rows with one INSERT and invalidates the
+    cached responses of the model once.
+    """
+    resource = SYNC_RESOURCES[model._meta.concrete_model]
+    Tombstone.objects.bulk_create(
+        [Tombstone(resource=resource, object_id=pk) for pk in deleted_pks], batch_size=1000
+    )
+    cache.invalidate(*CACHED_RESOURCES[model._meta.concrete_model])
+
+
+for model in USER_MODELS:
+    pre_save.connect(user_pre_save, sender=model)
+    post_save.connect(user_post_save, sender=model)
+    pre_delete.connect(user_pre_delete, sender=model)
+    post_delete.connect(user_post_delete, sender=model)
+    post_save.connect(invalidate_cached_user, sender=model)
+    post_delete.connect(invalidate_cached_user, sender=model)
+    post_save.connect(queue_profile_photo_variants, sender=model)
+
+for model in (*USER_MODELS, Group, Subject, Lesson):
+    post_delete.connect(record_tombstone, sender=model)
+
+for model in (*USER_MODELS, Group, Subject, Lesson):
+    post_save.connect(invalidate_cached_responses, sender=model)
+    post_delete.connect(invalidate_cached_responses, sender=model)
@@ -0,0 +1,119 @@
+import base64
+import binascii
+import json
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .pagination import keyset_condition
+
+# Rows per resource (and tombstones) in one sync response.
+SYNC_PAGE_SIZE = getattr(settings, "SYNC_PAGE_SIZE", 500)
+# Tombstones are kept this long; clients that last synced earlier must start over.
+SYNC_TOMBSTONE_RETENTION = timedelta(days=getattr(settings, "SYNC_TOMBSTONE_RETENTION_DAYS", 30))
+# Headroom for transactions still in flight and for app server clock skew.
+SYNC_WATERMARK_LAG = timedelta(seconds=getattr(settings, "SYNC_WATERMARK_LAG", 60))
+
+INVALID_CURSOR = "Invalid cursor."
+
+
+class FullResyncRequired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = "Changes this old are no longer kept. Sync again without 'since'."
+    default_code = "full_resync_required"
+
+
+def database_now(using):
+    """Returns the current time of the database server behind `using`."""
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT CURRENT_TIMESTAMP")
+        now = cursor.fetchone()[0]
+
+    if isinstance(now, str):
+        # SQLite returns "YYYY-MM-DD HH:MM:SS" in UTC.
+        now = parse_datetime(now)
+    if timezone.is_naive(now):
+        now = timezone.make_aware(now, dt_timezone.utc)
+    return now
+
+
+def start_state(since, now):
+    """
+    Returns the sync state of a first page: the changes in [since, watermark) of
+    every resource, with the watermark a little behind the database clock so that
+    rows saved by transactions still running are left to the next sync.
+
+    Raises FullResyncRequired if the tombstones of deletions after `since` may
+    already have been pruned.
+    """
+    if since is not None and since < now - SYNC_TOMBSTONE_RETENTION:
+        raise FullResyncRequired()
+
+    watermark = now - SYNC_WATERMARK_LAG
+    if since is not None and since > watermark:
+        # Nothing can be read yet that the client has not seen.
+        watermark = since
+    return {"since": since, "watermark": watermark, "positions": {}, "done": []}
+
+
+def encode_state(state):
+    payload = {
+        "since": state["since"].isoformat() if state["since"] else None,
+        "watermark": state["watermark"].isoformat(),
+        "positions": {
+            name: [value.isoformat(), pk] for name, (value, pk) in state["positions"].items()
+        },
+        "done": state["done"],
+    }
+    encoded = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(encoded).decode()
+
+
+def decode_state(cursor):
+    """Parses a cursor of encode_state(), raising ValidationError if it is malformed."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        since = parse_datetime(payload["since"]) if payload["since"] else None
+        watermark = parse_datetime(payload["watermark"])
+        positions = {
+            name: (parse_datetime(value), int(pk))
+            for name, (value, pk) in payload["positions"].items()
+        }
+        done = [str(name) for name in payload["done"]]
+    except (binascii.Error, ValueError, TypeError, KeyError, AttributeError):
+        raise ValidationError({"cursor": INVALID_CURSOR})
+
+    if watermark is None or None in (value for value, _ in positions.values()):
+        raise ValidationError({"cursor": INVALID_CURSOR})
+    return {"since": since, "watermark": watermark, "positions": positions, "done": done}
+
+
+def page_queryset(queryset, state, name, field):
+    """
+    Returns the next page of `queryset` for the resource `name`, plus one row to
+    tell whether another page follows, in (field, id) order. Pages are read by
+    keyset from the last row sent, so rows changing between pages cannot shift
+    them; a row updated meanwhile moves past the watermark to the next sync.
+    """
+    queryset = queryset.filter(**{f"{field}__lt": state["watermark"]})
+    if state["since"] is not None:
+        queryset = queryset.filter(**{f"{field}__gte": state["since"]})
+    position = state["positions"].get(name)
+    if position is not None:
+        queryset = queryset.filter(keyset_condition((field, "id"), position))
+    return queryset.order_by(field, "id")[: SYNC_PAGE_SIZE + 1]
+
+
+def advance_state(state, name, field, rows):
+    """Records the rows of `name` just read and returns the ones to send."""
+    if len(rows) > SYNC_PAGE_SIZE:
+        rows = rows[:SYNC_PAGE_SIZE]
+        state["positions"][name] = (getattr(rows[-1], field), rows[-1].id)
+    else:
+        state["done"].append(name)
+    return rows
@@ -0,0 +1,1650 @@
+import csv
+import gzip
+import io
+import math
+import re
+import tempfile
+from datetime import date, time, timedelta
+from unittest import mock, skipUnless
+
+import brotli
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.admin import site as admin_site
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.models import Count
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from PIL import Image
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import batch
+from . import cache as response_cache
+from .admin import estimate_count
+from .authentication import user_store
+from .batch import build_request, run_batch
+from .benchmarks import seed_dataset
+from .compression import CompressionMiddleware
+from .exports import attendance_matrix_rows
+from .images import (
+    PROFILE_PHOTO_SIZES,
+    generate_profile_photo_variants,
+    update_profile_photo_variants,
+    variant_names,
+)
+from .imports import POOL_THRESHOLD, hash_passwords, import_users
+from .models import (
+    Attendance,
+    Group,
+    Lesson,
+    LessonAttendanceSummary,
+    LessonOccurrence,
+    StudentAttendanceSummary,
+    Subject,
+    Tombstone,
+)
+from .routers import PIN_COOKIE, ReplicaRoutingMiddleware, read_from_replica
+from .serializers import GroupSerializer
+from .signals import refresh_enrollment_counters
+from .sync import SYNC_TOMBSTONE_RETENTION, SYNC_WATERMARK_LAG, FullResyncRequired
+from .utils import LessonDays, Roles
+from .views import StudentViewSet, TeacherViewSet
+
+User = get_user_model()
+
+
+class ListQueryCountTests(TestCase):
+    """
+    The group, teacher and student lists cost the same number of queries at any
+    number of groups: related rows are joined or prefetched, never fetched per row.
+    """
+
+    sizes = (10, 100, 1000)
+
+    def assert_constant_queries(self, resource, expected):
+        for groups in self.sizes:
+            with self.subTest(groups=groups), transaction.atomic():
+                dataset = seed_dataset(
+                    students=groups * 2, groups=groups, teachers=max(1, groups // 4), weeks=2
+                )
+                cache.clear()
+
+                with self.assertNumQueries(expected):
+                    response = self.client.get(f"/api/v1/{resource}/", {"page_size": 200})
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()["results"]), min(200, dataset[resource]))
+                transaction.set_rollback(True)
+
+    def test_groups(self):
+        # Validators, then the page with teacher and subject joined.
+        self.assert_constant_queries("groups", 2)
+
+    def test_teachers(self):
+        self.assert_constant_queries("teachers", 2)
+
+    def test_students(self):
+        # Validators, the page and the prefetched groups of its students.
+        self.assert_constant_queries("students", 3)
+
+
+class EnrollmentCounterTests(TestCase):
+    """The stored student and group counters follow every change of enrollments or roles."""
+
+    def setUp(self):
+        self.subject = Subject.objects.create(name="Math")
+        teacher = User.objects.create(
+            email="teacher@example.com", first_name="T", last_name="T", role=Roles.TEACHER
+        )
+        self.groups = [
+            Group.objects.create(
+                name=f"Math {number}",
+                teacher_id=teacher.pk,
+                subject=self.subject,
+                lesson_days=LessonDays.odd,
+                start_date=date.today(),
+                end_date=date.today() + timedelta(weeks=4),
+                lesson_start_time=time(9 + number),
+                lesson_end_time=time(10 + number),
+            )
+            for number in range(2)
+        ]
+        self.students = [
+            User.objects.create(
+                email=f"student{number}@example.com", first_name="S", last_name=str(number)
+            )
+            for number in range(3)
+        ]
+
+    def counters(self):
+        groups = [Group.objects.get(pk=group.pk).students_count for group in self.groups]
+        subject = Subject.objects.get(pk=self.subject.pk)
+        return groups, (subject.groups_count, subject.students_count)
+
+    def test_membership_changes(self):
+        first, second, third = self.students
+        first.student_groups.add(*self.groups)
+        self.assertEqual(self.counters(), ([1, 1], (2, 1)))
+
+        self.groups[0].user_set.add(second, third)
+        self.assertEqual(self.counters(), ([3, 1], (2, 3)))
+
+        first.student_groups.remove(self.groups[0])
+        self.assertEqual(self.counters(), ([2, 1], (2, 3)))
+
+        first.student_groups.clear()
+        self.assertEqual(self.counters(), ([2, 0], (2, 2)))
+
+        self.groups[0].user_set.clear()
+        self.assertEqual(self.counters(), ([0, 0], (2, 0)))
+
+    def test_role_changes(self):
+        self.groups[0].user_set.add(*self.students)
+        student = User.objects.get(pk=self.students[0].pk)
+
+        student.role = Roles.PARENT
+        student.save()
+        self.assertEqual(self.counters(), ([2, 0], (2, 2)))
+
+        # Compared with the role as saved last, not as loaded.
+        student.role = Roles.STUDENT
+        student.save()
+        self.assertEqual(self.counters(), ([3, 0], (2, 3)))
+
+        # Changed by another writer: refresh_from_db() picks up the stored role.
+        User.objects.filter(pk=student.pk).update(role=Roles.PARENT)
+        refresh_enrollment_counters(group_ids=[self.groups[0].pk])
+        student.refresh_from_db()
+        student.role = Roles.STUDENT
+        student.save()
+        self.assertEqual(self.counters(), ([3, 0], (2, 3)))
+
+    def test_deleting_a_student(self):
+        self.groups[0].user_set.add(*self.students)
+
+        self.students[0].delete()
+        self.assertEqual(self.counters(), ([2, 0], (2, 2)))
+
+    def test_saves_do_not_read_the_row_again(self):
+        user = User.objects.get(pk=self.students[0].pk)
+        group = Group.objects.get(pk=self.groups[0].pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            user.first_name = "Renamed"
+            user.save()
+            group.name = "Renamed"
+            group.save()
+
+        selects = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith(('SELECT "app_api_user"."role"', 'SELECT "app_api_group"'))
+        ]
+        self.assertEqual(selects, [])
+
+    def test_deferred_role_is_read(self):
+        self.groups[0].user_set.add(self.students[0])
+        user = User.objects.only("email").get(pk=self.students[0].pk)
+
+        user.role = Roles.PARENT
+        user.save()
+        self.assertEqual(self.counters(), ([0, 0], (2, 0)))
+
+
+class CursorPaginationTests(TestCase):
+    """Pages are fetched by (created, id) keyset, also across rows sharing "created"."""
+
+    def setUp(self):
+        subjects = Subject.objects.bulk_create(
+            [Subject(name=f"Subject {number}") for number in range(25)]
+        )
+        # Ties on "created", as rows inserted by one bulk_create() may have.
+        tied = timezone.now()
+        Subject.objects.filter(pk__in=[subject.pk for subject in subjects[5:20]]).update(
+            created=tied
+        )
+        self.expected = list(
+            Subject.objects.order_by("-created", "-id").values_list("pk", flat=True)
+        )
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                data = self.client.get(url).json()
+            self.assertFalse(any("OFFSET" in query["sql"] for query in queries))
+            pages.append([row["id"] for row in data["results"]])
+            url = data[link]
+        return pages
+
+    def test_forward_and_back(self):
+        pages = self.walk("/api/v1/subjects/?page_size=4", "next")
+        self.assertEqual([pk for page in pages for pk in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [4] * 6 + [1])
+
+        last = self.client.get("/api/v1/subjects/?page_size=4").json()
+        for _ in range(6):
+            last = self.client.get(last["next"]).json()
+        self.assertIsNone(last["next"])
+
+        pages = self.walk(last["previous"], "previous")
+        self.assertEqual([pk for page in reversed(pages) for pk in page], self.expected[:-1])
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/v1/subjects/", {"cursor": "cD1ub3QtYS1kYXRl"})
+        self.assertEqual(response.status_code, 404)
+
+
+@mock.patch("app_api.sync.SYNC_PAGE_SIZE", 3)
+class SyncTests(TestCase):
+    """Sync is paged by keyset, bounded by a database watermark and by tombstone retention."""
+
+    def setUp(self):
+        self.subjects = Subject.objects.bulk_create(
+            [Subject(name=f"Subject {number}") for number in range(7)]
+        )
+        # Rows newer than the watermark are left to the next sync.
+        self.past = timezone.now() - timedelta(hours=1)
+        Subject.objects.update(updated=self.past)
+
+    def walk(self, params):
+        pages = []
+        url, params = "/api/v1/sync/", params
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.json())
+            url, params = pages[-1]["next"], None
+        return pages
+
+    def test_initial_sync_is_paged(self):
+        pages = self.walk({})
+        self.assertEqual([len(page["subjects"]) for page in pages], [3, 3, 1])
+        self.assertEqual(
+            [row["id"] for page in pages for row in page["subjects"]],
+            [subject.pk for subject in self.subjects],
+        )
+        self.assertEqual(len({page["watermark"] for page in pages}), 1)
+
+    def test_watermark_trails_database_clock(self):
+        Subject.objects.filter(pk=self.subjects[0].pk).update(updated=timezone.now())
+        page = self.walk({})[-1]
+
+        watermark = parse_datetime(page["watermark"])
+        self.assertLess(watermark, timezone.now() - SYNC_WATERMARK_LAG + timedelta(seconds=5))
+        self.assertNotIn(self.subjects[0].pk, [row["id"] for row in page["subjects"]])
+
+    def test_deletions_since(self):
+        deleted = self.subjects[0].pk
+        Subject.objects.filter(pk=deleted).delete()
+        Tombstone.objects.update(created=self.past)
+
+        pages = self.walk({"since": (self.past - timedelta(minutes=1)).isoformat()})
+        self.assertEqual([pk for page in pages for pk in page["deleted"]["subjects"]], [deleted])
+        self.assertEqual(sum(len(page["subjects"]) for page in pages), 6)
+
+    def test_since_before_retention(self):
+        since = timezone.now() - SYNC_TOMBSTONE_RETENTION - timedelta(days=1)
+        response = self.client.get("/api/v1/sync/", {"since": since.isoformat()})
+
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.json()["detail"], FullResyncRequired.default_detail)
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/v1/sync/", {"cursor": "bm90LWpzb24"})
+        self.assertEqual(response.status_code, 400)
+
+
+class AttendanceMarkingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(students=20, groups=2, teachers=1, weeks=4)
+        # A lesson not held yet, so that it has no attendance.
+        cls.lesson = Lesson.objects.filter(lesson_date__gt=date.today()).earliest("lesson_date")
+        cls.students = list(
+            User.objects.filter(role=Roles.STUDENT, student_groups=cls.lesson.group_id)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        cls.path = f"/api/v1/lessons/{cls.lesson.pk}/attendance/"
+
+    def post(self, marks):
+        return self.client.post(
+            self.path,
+            {
+                "attendance": [
+                    {"student": student, "is_absent": is_absent}
+                    for student, is_absent in marks.items()
+                ]
+            },
+            content_type="application/json",
+        )
+
+    def test_roster_is_upserted_in_one_statement(self):
+        marks = {student: index % 3 == 0 for index, student in enumerate(self.students)}
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(marks)
+
+        self.assertEqual(response.status_code, 200)
+        inserts = [
+            query for query in queries if query["sql"].startswith('INSERT INTO "app_api_attendance"')
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual({row["student"]: row["is_absent"] for row in response.json()}, marks)
+
+    def test_repeated_post(self):
+        marks = dict.fromkeys(self.students, False)
+        first = self.post(marks).json()
+        ids = set(Attendance.objects.filter(lesson=self.lesson).values_list("pk", flat=True))
+
+        second = self.post(marks).json()
+        self.assertEqual(
+            [(row["id"], row["student"], row["is_absent"]) for row in second],
+            [(row["id"], row["student"], row["is_absent"]) for row in first],
+        )
+        self.assertEqual(
+            set(Attendance.objects.filter(lesson=self.lesson).values_list("pk", flat=True)), ids
+        )
+
+        # A later roster updates the listed students in place and keeps the others.
+        response = self.post({self.students[0]: True})
+        rows = {row["student"]: row for row in response.json()}
+        self.assertEqual(len(rows), len(self.students))
+        self.assertTrue(rows[self.students[0]]["is_absent"])
+        self.assertFalse(rows[self.students[1]]["is_absent"])
+        self.assertEqual({row["id"] for row in rows.values()}, ids)
+
+    def test_students_outside_the_group_are_rejected(self):
+        outsider = (
+            User.objects.filter(role=Roles.STUDENT)
+            .exclude(student_groups=self.lesson.group_id)
+            .values_list("pk", flat=True)
+            .first()
+        )
+        self.assertIsNotNone(outsider)
+
+        response = self.post({self.students[0]: False, outsider: True})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(outsider), str(response.json()["attendance"]))
+        self.assertFalse(Attendance.objects.filter(lesson=self.lesson).exists())
+
+    def test_summaries_are_refreshed(self):
+        student = self.students[0]
+        summary = StudentAttendanceSummary.objects.filter(
+            student_id=student, group_id=self.lesson.group_id
+        ).first()
+        lessons, absences = (summary.lessons_count, summary.absences_count) if summary else (0, 0)
+
+        self.post({student: True, self.students[1]: False})
+
+        summary = StudentAttendanceSummary.objects.get(
+            student_id=student, group_id=self.lesson.group_id
+        )
+        self.assertEqual(
+            (summary.lessons_count, summary.absences_count), (lessons + 1, absences + 1)
+        )
+        lesson_summary = LessonAttendanceSummary.objects.get(
+            group_id=self.lesson.group_id, lesson_date=self.lesson.lesson_date
+        )
+        self.assertEqual((lesson_summary.present_count, lesson_summary.absent_count), (1, 1))
+
+
+class MaterializeLessonsTests(TestCase):
+    """Lessons dropped from the schedule are deleted in bulk, with one tombstone INSERT."""
+
+    def test_deleted_lessons(self):
+        seed_dataset(students=20, groups=10, teachers=2, weeks=8)
+        groups = Group.objects.all()
+        groups.update(end_date=date.today())
+        dropped = set(
+            Lesson.objects.filter(lesson_date__gt=date.today()).values_list("pk", flat=True)
+        )
+        self.assertTrue(dropped)
+
+        with CaptureQueriesContext(connection) as queries:
+            created, deleted, kept = groups.materialize_lessons(batch_size=50)
+
+        self.assertEqual((created, deleted, kept), (0, len(dropped), 0))
+        self.assertFalse(Lesson.objects.filter(pk__in=dropped).exists())
+        self.assertEqual(
+            set(Tombstone.objects.filter(resource="lessons").values_list("object_id", flat=True)),
+            dropped,
+        )
+        tombstone_table = Tombstone._meta.db_table
+        inserts = [query for query in queries if f'INSERT INTO "{tombstone_table}"' in query["sql"]]
+        self.assertEqual(len(inserts), 1)
+
+    def test_keeps_lessons_marked_before_the_delete(self):
+        seed_dataset(students=20, groups=2, teachers=2, weeks=8)
+        groups = Group.objects.all()
+        groups.update(end_date=date.today())
+        dropped = Lesson.objects.filter(lesson_date__gt=date.today())
+        lesson = dropped.first()
+        others = set(dropped.exclude(pk=lesson.pk).values_list("pk", flat=True))
+        student = User.objects.filter(role="student").first()
+        marked = False
+
+        def mark(execute, sql, params, many, context):
+            # Marks attendance on a dropped lesson once the ids to delete have been read.
+            nonlocal marked
+            if not marked and sql.startswith(f'DELETE FROM "{Lesson._meta.db_table}"'):
+                marked = True
+                Attendance.objects.create(lesson=lesson, student=student)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(mark):
+            created, deleted, kept = groups.materialize_lessons()
+
+        self.assertTrue(marked)
+        self.assertEqual((created, deleted, kept), (0, len(others), 1))
+        self.assertTrue(Lesson.objects.filter(pk=lesson.pk).exists())
+        self.assertEqual(
+            set(Tombstone.objects.filter(resource="lessons").values_list("object_id", flat=True)),
+            others,
+        )
+
+
+class AttendanceSummaryTests(TestCase):
+    """Refreshing the summaries updates them in place, so report URLs stay valid."""
+
+    def setUp(self):
+        seed_dataset(students=20, groups=4, teachers=2, weeks=4)
+
+    def test_refresh_keeps_ids(self):
+        students = dict(StudentAttendanceSummary.objects.values_list("pk", "lessons_count"))
+        lessons = set(LessonAttendanceSummary.objects.values_list("pk", flat=True))
+        self.assertTrue(students and lessons)
+
+        summary = StudentAttendanceSummary.objects.first()
+        StudentAttendanceSummary.objects.refresh()
+        LessonAttendanceSummary.objects.refresh()
+
+        self.assertEqual(
+            dict(StudentAttendanceSummary.objects.values_list("pk", "lessons_count")), students
+        )
+        self.assertEqual(set(LessonAttendanceSummary.objects.values_list("pk", flat=True)), lessons)
+        response = self.client.get(f"/api/v1/reports/students/{summary.pk}/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_refresh_deletes_unmarked(self):
+        summary = StudentAttendanceSummary.objects.first()
+        others = set(
+            StudentAttendanceSummary.objects.exclude(pk=summary.pk).values_list("pk", flat=True)
+        )
+        # Each deletion refreshes the summary of its (student, group).
+        Attendance.objects.filter(
+            student_id=summary.student_id, lesson__group_id=summary.group_id
+        ).delete()
+
+        self.assertEqual(set(StudentAttendanceSummary.objects.values_list("pk", flat=True)), others)
+
+
+@override_settings(DATABASE_REPLICAS=[])
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user_store.local.clear()
+        self.user = User.objects.create(
+            email="teacher@example.com", first_name="T", last_name="T", role=Roles.TEACHER
+        )
+        self.user.set_password("old-password")
+        self.user.save()
+        self.path = f"/api/v1/subjects/{Subject.objects.create(name='Math').pk}/"
+
+    def get(self, token):
+        """Returns the response and the number of queries on the user table."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.path, headers={"Authorization": f"Bearer {token}"})
+        return response, sum('"app_api_user"' in query["sql"] for query in queries)
+
+    def test_miss_then_hit(self):
+        token = AccessToken.for_user(self.user)
+
+        response, user_queries = self.get(token)
+        self.assertEqual((response.status_code, user_queries), (200, 1))
+        response, user_queries = self.get(token)
+        self.assertEqual((response.status_code, user_queries), (200, 0))
+
+    def test_entry_holds_no_password_hash(self):
+        self.get(AccessToken.for_user(self.user))
+
+        entry = cache.get(f"{user_store.key_prefix}{self.user.pk}")
+        self.assertNotIn(self.user.password, repr(entry))
+        user, _ = user_store.get(self.user.pk)
+        self.assertIn("password", user.get_deferred_fields())
+        # Deferred fields are read on access.
+        self.assertTrue(user.check_password("old-password"))
+
+    def test_deactivation(self):
+        token = AccessToken.for_user(self.user)
+        self.get(token)
+
+        self.user.is_active = False
+        self.user.save()
+
+        response, _ = self.get(token)
+        self.assertEqual(response.status_code, 401)
+
+    def test_role_change(self):
+        token = AccessToken.for_user(self.user)
+        self.get(token)
+
+        self.user.role = Roles.STUDENT
+        self.user.save()
+
+        response, user_queries = self.get(token)
+        self.assertEqual((response.status_code, user_queries), (200, 1))
+        self.assertEqual(user_store.get(self.user.pk)[0].role, Roles.STUDENT)
+
+    def test_revoked_token_on_cache_hit(self):
+        # simplejwt's modules keep the settings object they imported, so it is patched.
+        with mock.patch.object(jwt_settings, "CHECK_REVOKE_TOKEN", True):
+            old = AccessToken.for_user(self.user)
+            self.assertEqual(self.get(old)[0].status_code, 200)
+
+            self.user.set_password("new-password")
+            self.user.save()
+            # Caches the user again, with the new password.
+            new = AccessToken.for_user(self.user)
+            self.assertEqual(self.get(new)[0].status_code, 200)
+
+            response, user_queries = self.get(old)
+            self.assertEqual((response.status_code, user_queries), (401, 0))
+            self.assertEqual(response.json()["code"], "password_changed")
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class ImportUsersTests(TestCase):
+    rows = [
+        {"email": f"user{number}@example.com", "first_name": "User", "last_name": str(number)}
+        for number in range(3)
+    ]
+
+    def test_hash_passwords_in_threads(self):
+        passwords = [f"secret-{number}" for number in range(POOL_THRESHOLD)]
+        with mock.patch("app_api.imports.make_password", wraps=make_password) as hasher:
+            hashes = hash_passwords(passwords, workers=4)
+
+        self.assertEqual(hasher.call_count, len(passwords))
+        self.assertTrue(all(map(check_password, passwords, hashes)))
+
+    def test_concurrent_import(self):
+        def hash_and_race(passwords, workers=None):
+            # Another import takes the second email after the rows were checked.
+            User.objects.create(email="user1@example.com", first_name="Other", last_name="1")
+            return [make_password(password) for password in passwords]
+
+        with mock.patch("app_api.imports.hash_passwords", side_effect=hash_and_race):
+            report = import_users(self.rows)
+
+        self.assertEqual(report["created"], 2)
+        self.assertEqual([error["row"] for error in report["errors"]], [1])
+        self.assertEqual(
+            set(User.objects.filter(first_name="User").values_list("email", flat=True)),
+            {"user0@example.com", "user2@example.com"},
+        )
+
+
+class ProfilePhotoVariantTests(TestCase):
+    """Variants that no user photo refers to any more are deleted from the storage."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.user = User.objects.create(email="photo@example.com", first_name="P", last_name="P")
+
+    def upload(self, name):
+        buffer = io.BytesIO()
+        Image.new("RGB", (300, 200), "teal").save(buffer, "PNG")
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def stored_variants(self):
+        return {name for name in variant_names(self.derivatives()) if default_storage.exists(name)}
+
+    def derivatives(self):
+        return User.objects.values_list("profile_photo_derivatives", flat=True).get(
+            pk=self.user.pk
+        )
+
+    def test_new_photo_replaces_variants(self):
+        first = self.upload("users/first.png")
+        User.objects.filter(pk=self.user.pk).update(profile_photo=first)
+        self.assertTrue(update_profile_photo_variants(self.user.pk, first))
+        old = self.stored_variants()
+        self.assertEqual(len(old), len(PROFILE_PHOTO_SIZES) * 2)
+
+        second = self.upload("users/second.png")
+        User.objects.filter(pk=self.user.pk).update(profile_photo=second)
+        self.assertTrue(update_profile_photo_variants(self.user.pk, second))
+
+        self.assertEqual(len(self.stored_variants()), len(old))
+        self.assertFalse(any(default_storage.exists(name) for name in old))
+
+    def test_replaced_photo(self):
+        first = self.upload("users/first.png")
+        second = self.upload("users/second.png")
+        User.objects.filter(pk=self.user.pk).update(profile_photo=second)
+
+        self.assertFalse(update_profile_photo_variants(self.user.pk, first))
+        self.assertEqual(self.derivatives(), {})
+        _, variants = default_storage.listdir("users/variants")
+        self.assertEqual(variants, [])
+
+    def test_job_closes_connections(self):
+        with mock.patch("app_api.images.connections") as connections, self.assertLogs(
+            "app_api.images", "ERROR"
+        ):
+            generate_profile_photo_variants(self.user.pk, "users/missing.png")
+        connections.close_all.assert_called_once_with()
+
+
+@override_settings(DATABASE_REPLICAS=[])
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.subjects = Subject.objects.bulk_create(
+            [Subject(name=f"Subject {number}") for number in range(3)]
+        )
+        for hours, subject in enumerate(reversed(self.subjects), start=1):
+            Subject.objects.filter(pk=subject.pk).update(
+                updated=timezone.now() - timedelta(hours=hours)
+            )
+        self.detail = f"/api/v1/subjects/{self.subjects[-1].pk}/"
+
+    def test_retrieve_not_modified(self):
+        first = self.client.get(self.detail)
+
+        for headers in (
+            {"If-None-Match": first["ETag"]},
+            {"If-Modified-Since": first["Last-Modified"]},
+        ):
+            with self.subTest(headers=headers):
+                response = self.client.get(self.detail, headers=headers)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response["ETag"], first["ETag"])
+
+    def test_retrieve_after_update(self):
+        first = self.client.get(self.detail)
+        subject = self.subjects[-1]
+        subject.name = "Renamed"
+        subject.save()
+
+        for headers in (
+            {"If-None-Match": first["ETag"]},
+            {"If-Modified-Since": first["Last-Modified"]},
+        ):
+            with self.subTest(headers=headers):
+                response = self.client.get(self.detail, headers=headers)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()["name"], "Renamed")
+
+    def test_list_not_modified(self):
+        first = self.client.get("/api/v1/subjects/")
+        response = self.client.get("/api/v1/subjects/", headers={"If-None-Match": first["ETag"]})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn("Last-Modified", first)
+
+    def test_list_after_update(self):
+        first = self.client.get("/api/v1/subjects/")
+        self.subjects[0].save()
+
+        response = self.client.get("/api/v1/subjects/", headers={"If-None-Match": first["ETag"]})
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_after_deleting_an_older_row(self):
+        first = self.client.get("/api/v1/subjects/")
+        self.subjects[0].delete()
+
+        for headers in (
+            {"If-None-Match": first["ETag"]},
+            {"If-Modified-Since": http_date()},
+        ):
+            with self.subTest(headers=headers):
+                response = self.client.get("/api/v1/subjects/", headers=headers)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()["results"]), 2)
+
+    @override_settings(ROOT_URLCONF="app_api.tests")
+    async def test_async_list_not_modified(self):
+        first = await self.async_client.get("/api/v1/subjects/")
+        response = await self.async_client.get(
+            "/api/v1/subjects/", headers={"If-None-Match": first["ETag"]}
+        )
+
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn("Last-Modified", first)
+
+
+# Without replicas, whose lag keeps lists built right after a write out of the cache.
+@override_settings(DATABASE_REPLICAS=[])
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.subject = Subject.objects.create(name="Math")
+
+    def test_validators_come_from_the_cached_entry(self):
+        first = self.client.get("/api/v1/subjects/")
+        # Changed without signals, so the cached response outlives the change.
+        Subject.objects.filter(pk=self.subject.pk).update(name="Maths", updated=timezone.now())
+
+        with self.assertNumQueries(0):
+            cached = self.client.get("/api/v1/subjects/")
+            not_modified = self.client.get("/api/v1/subjects/", HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(cached.json(), first.json())
+        self.assertEqual(cached["ETag"], first["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified["ETag"], first["ETag"])
+
+    def test_role_change_refreshes_subjects(self):
+        teacher = User.objects.create(
+            email="teacher@example.com", first_name="T", last_name="T", role=Roles.TEACHER
+        )
+        group = Group.objects.create(
+            name="Math 1",
+            teacher_id=teacher.pk,
+            subject=self.subject,
+            lesson_days=LessonDays.odd,
+            start_date=date.today(),
+            end_date=date.today() + timedelta(weeks=4),
+            lesson_start_time=time(9),
+            lesson_end_time=time(10),
+        )
+        student = User.objects.create(email="student@example.com", first_name="S", last_name="S")
+        student.student_groups.add(group)
+
+        self.assertEqual(self.students_counts(), [1])
+
+        student.role = Roles.PARENT
+        student.save()
+        self.assertEqual(self.students_counts(), [0])
+
+    def students_counts(self):
+        return [row["students"] for row in self.client.get("/api/v1/subjects/").json()["results"]]
+
+
+@override_settings(ROOT_URLCONF="app_api.tests", DATABASE_REPLICAS=[])
+class AsyncReadTests(TestCase):
+    async def test_list_uses_response_cache(self):
+        await sync_to_async(cache.clear)()
+        await Subject.objects.acreate(name="Math")
+
+        first = await self.async_client.get("/api/v1/subjects/")
+        await Subject.objects.aupdate(name="Maths", updated=timezone.now())
+        cached = await self.async_client.get("/api/v1/subjects/")
+        not_modified = await self.async_client.get(
+            "/api/v1/subjects/", headers={"If-None-Match": first["ETag"]}
+        )
+
+        self.assertEqual(cached.json(), first.json())
+        self.assertEqual(cached["ETag"], first["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+        stats = await sync_to_async(response_cache.stats)()
+        self.assertEqual(stats["subjects"], {"hits": 2, "misses": 1})
+
+
+urlpatterns = [path("api/v1/", include("app_api.async_urls"))]
+
+
+class MetricsTests(TestCase):
+    def test_internal_network(self):
+        self.assertEqual(self.client.get("/metrics/").status_code, 200)
+
+    def test_external_address(self):
+        response = self.client.get("/metrics/", REMOTE_ADDR="203.0.113.7")
+        self.assertEqual(response.status_code, 403)
+
+    def test_proxied_request(self):
+        response = self.client.get("/metrics/", HTTP_X_FORWARDED_FOR="203.0.113.7")
+        self.assertEqual(response.status_code, 403)
+
+    def test_staff(self):
+        staff = User.objects.create(
+            email="staff@example.com", first_name="S", last_name="S", is_staff=True
+        )
+        self.client.force_login(staff)
+        response = self.client.get("/metrics/", REMOTE_ADDR="203.0.113.7")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"http_request_db_queries", response.content)
+
+    def test_server_timing(self):
+        Subject.objects.create(name="Math")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/v1/lessons/")
+        self.assertIn(f'desc="{len(queries)} queries"', response["Server-Timing"])
+
+    @override_settings(ROOT_URLCONF="app_api.tests")
+    async def test_server_timing_async(self):
+        await Subject.objects.acreate(name="Math")
+        response = await self.async_client.get("/api/v1/subjects/", {"page_size": 5})
+
+        self.assertEqual(response.status_code, 200)
+        queries = int(re.search(r'desc="(\d+) queries"', response["Server-Timing"]).group(1))
+        self.assertGreater(queries, 0)
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_every_route_succeeds(self):
+        output = io.StringIO()
+        call_command(
+            "bench_api",
+            students=40,
+            groups=4,
+            teachers=2,
+            weeks=2,
+            iterations=1,
+            warmup=0,
+            stdout=output,
+            stderr=io.StringIO(),
+        )
+
+        for route in ("GET timetable/", "GET exports/attendance/", "POST users/import/"):
+            self.assertIn(route, output.getvalue())
+
+    def test_seeded_tables_are_analyzed(self):
+        seed_dataset(students=20, groups=2, teachers=1, weeks=2)
+
+        table = Attendance._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s", [table])
+            else:
+                cursor.execute("SELECT COUNT(*) FROM sqlite_stat1 WHERE tbl = %s", [table])
+            self.assertGreater(cursor.fetchone()[0], 0)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.bulk_create(
+            [
+                User(
+                    email=f"{role}{number}@example.com",
+                    first_name=f"{role.title()}{number}",
+                    last_name=f"Valiyev{number}",
+                    role=role,
+                )
+                for role in (Roles.TEACHER, Roles.STUDENT)
+                for number in range(20)
+            ]
+        )
+        User.objects.create(
+            email="ali@example.com", first_name="Ali", last_name="Karimov", role=Roles.STUDENT
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_short_terms_match_anywhere(self):
+        response = self.client.get("/api/v1/students/", {"search": "ri", "page_size": 50})
+
+        emails = {student["email"] for student in response.json()["results"]}
+        self.assertEqual(emails, {"ali@example.com"})
+
+    def test_terms_are_combined(self):
+        response = self.client.get("/api/v1/teachers/", {"search": "valiyev1 teacher12"})
+
+        emails = [teacher["email"] for teacher in response.json()["results"]]
+        self.assertEqual(emails, ["teacher12@example.com"])
+
+
+@skipUnless(connection.vendor == "postgresql", "The trigram indexes are PostgreSQL only.")
+class SearchQueryPlanTests(TransactionTestCase):
+    def setUp(self):
+        User.objects.bulk_create(
+            [
+                User(
+                    email=f"{role}{number}@example.com",
+                    first_name=f"{role.title()}{number}",
+                    last_name=f"Valiyev{number}",
+                    role=role,
+                )
+                for role in (Roles.TEACHER, Roles.STUDENT)
+                for number in range(5000)
+            ]
+        )
+        with connection.cursor() as cursor:
+            # Outside of a transaction, so that the GIN statistics are current too.
+            cursor.execute("VACUUM ANALYZE app_api_user")
+
+    def explain(self, viewset, term):
+        request = Request(APIRequestFactory().get("/", {"search": term}))
+        queryset = SearchFilter().filter_queryset(
+            request, viewset.queryset.all(), viewset()
+        )
+        return queryset.explain()
+
+    def test_search_uses_the_trigram_index_of_the_role(self):
+        for viewset, index in (
+            (TeacherViewSet, "teacher_search_trgm_idx"),
+            (StudentViewSet, "student_search_trgm_idx"),
+        ):
+            with self.subTest(index=index):
+                self.assertIn(f"Bitmap Index Scan on {index}", self.explain(viewset, "yev4321"))
+                self.assertIn(
+                    f"Bitmap Index Scan on {index}", self.explain(viewset, "ALIYEV12 r123@")
+                )
+
+
+# Without replicas, whose lag keeps lists built right after a write out of the cache.
+@override_settings(DATABASE_REPLICAS=[])
+class SparseFieldsTests(TestCase):
+    """?fields= and ?expand= shape the response and the SQL behind it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(students=5, groups=2, teachers=1, weeks=2)
+
+    def setUp(self):
+        cache.clear()
+
+    def select(self, url, params, table):
+        """Returns the results and the SQL of the query reading the page of `table` rows."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        # Unlike the validators' aggregate, the page query selects the rows' ids first.
+        selects = [
+            query["sql"] for query in queries if query["sql"].startswith(f'SELECT "{table}"."id"')
+        ]
+        self.assertEqual(len(selects), 1)
+        return response.json()["results"], selects[0]
+
+    def test_fields_narrow_the_columns(self):
+        table = Group._meta.db_table
+        results, sql = self.select("/api/v1/groups/", {"fields": "id,name"}, table)
+
+        self.assertEqual({tuple(group) for group in results}, {("id", "name")})
+        self.assertIn(f'"{table}"."name"', sql)
+        self.assertNotIn(f'"{table}"."lesson_days"', sql)
+        self.assertNotIn("JOIN", sql)
+
+        results, sql = self.select("/api/v1/groups/", {"fields": "id,subject"}, table)
+        self.assertEqual({tuple(group) for group in results}, {("id", "subject")})
+        self.assertIn(f'JOIN "{Subject._meta.db_table}"', sql)
+        self.assertNotIn(f'JOIN "{User._meta.db_table}"', sql)
+
+    def test_expand_adds_the_join(self):
+        table = Lesson._meta.db_table
+        group_table = Group._meta.db_table
+        results, sql = self.select("/api/v1/lessons/", {}, table)
+        self.assertIsInstance(results[0]["group"], int)
+        self.assertNotIn("JOIN", sql)
+
+        results, sql = self.select("/api/v1/lessons/", {"expand": "group"}, table)
+        lesson = Lesson.objects.get(pk=results[0]["id"])
+        self.assertEqual(results[0]["group"]["id"], lesson.group_id)
+        self.assertIn(f'JOIN "{group_table}"', sql)
+
+        results, sql = self.select("/api/v1/lessons/", {"fields": "id,group.name"}, table)
+        self.assertEqual({tuple(lesson) for lesson in results}, {("id", "group")})
+        self.assertEqual(set(results[0]["group"]), {"name"})
+        self.assertIn(f'"{group_table}"."name"', sql)
+        self.assertNotIn(f'"{group_table}"."lesson_days"', sql)
+        self.assertNotIn(f'"{table}"."theme"', sql)
+
+    def test_unknown_fields_are_rejected(self):
+        for params in [
+            {"fields": "id,nickname"},
+            {"fields": "id,group.nickname"},
+            {"expand": "teacher"},
+        ]:
+            with self.subTest(**params):
+                response = self.client.get("/api/v1/lessons/", params)
+                self.assertEqual(response.status_code, 400)
+
+
+class CompressionTests(TestCase):
+    rows = [f"{number},student{number}@example.com\n".encode() for number in range(500)]
+    decompress = {"br": brotli.decompress, "gzip": gzip.decompress}
+
+    def request(self, encoding):
+        return RequestFactory().get("/", HTTP_ACCEPT_ENCODING=encoding)
+
+    def streaming_response(self, content):
+        return StreamingHttpResponse(content, content_type="text/csv")
+
+    def test_compresses_responses(self):
+        content = {"results": [{"id": number, "name": "Student"} for number in range(100)]}
+        middleware = CompressionMiddleware(lambda request: JsonResponse(content))
+
+        for encoding, decompress in self.decompress.items():
+            with self.subTest(encoding=encoding):
+                response = middleware(self.request(encoding))
+
+                self.assertEqual(response["Content-Encoding"], encoding)
+                self.assertEqual(decompress(response.content), JsonResponse(content).content)
+
+    def test_compresses_streams_as_one_stream(self):
+        middleware = CompressionMiddleware(lambda request: self.streaming_response(iter(self.rows)))
+
+        for encoding, decompress in self.decompress.items():
+            with self.subTest(encoding=encoding):
+                response = middleware(self.request(encoding))
+                chunks = list(response.streaming_content)
+
+                self.assertEqual(response["Content-Encoding"], encoding)
+                self.assertEqual(decompress(b"".join(chunks)), b"".join(self.rows))
+                # Compressed chunk by chunk, the rows would not shrink to a few chunks.
+                self.assertLess(len(chunks), 10)
+
+    async def test_compresses_async_streams(self):
+        async def rows():
+            for row in self.rows:
+                yield row
+
+        async def get_response(request):
+            return self.streaming_response(rows())
+
+        middleware = CompressionMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        for encoding, decompress in self.decompress.items():
+            with self.subTest(encoding=encoding):
+                response = await middleware(self.request(encoding))
+                chunks = [chunk async for chunk in response.streaming_content]
+
+                self.assertTrue(response.is_async)
+                self.assertEqual(response["Content-Encoding"], encoding)
+                self.assertEqual(decompress(b"".join(chunks)), b"".join(self.rows))
+                self.assertLess(len(chunks), 10)
+
+
+class BatchTests(TransactionTestCase):
+    """Parallel reads run on pool threads with their own connections: no test transaction."""
+
+    def setUp(self):
+        cache.clear()
+        self.subjects = Subject.objects.bulk_create(
+            [Subject(name=f"Subject {number}") for number in range(4)]
+        )
+
+    def post(self, requests, parallel=False):
+        response = self.client.post(
+            "/api/v1/batch/",
+            {"requests": requests, "parallel": parallel},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_responses_keep_the_request_order(self):
+        requests = [
+            {"method": "GET", "path": f"/api/v1/subjects/{subject.pk}/"}
+            for subject in reversed(self.subjects)
+        ]
+        for parallel in (False, True):
+            with self.subTest(parallel=parallel):
+                responses = self.post(requests, parallel).json()
+                self.assertEqual(
+                    [response["body"]["id"] for response in responses],
+                    [subject.pk for subject in reversed(self.subjects)],
+                )
+
+    def test_reads_see_earlier_writes(self):
+        for parallel in (False, True):
+            with self.subTest(parallel=parallel):
+                name = f"Added {parallel}"
+                responses = self.post(
+                    [
+                        {"method": "GET", "path": "/api/v1/subjects/"},
+                        {"method": "POST", "path": "/api/v1/subjects/", "body": {"name": name}},
+                        {"method": "GET", "path": "/api/v1/subjects/"},
+                        {"method": "GET", "path": f"/api/v1/subjects/{self.subjects[0].pk}/"},
+                    ],
+                    parallel,
+                ).json()
+
+                self.assertEqual([response["status"] for response in responses], [200, 201, 200, 200])
+                names = [row["name"] for row in responses[2]["body"]["results"]]
+                self.assertNotIn(name, [row["name"] for row in responses[0]["body"]["results"]])
+                self.assertIn(name, names)
+
+    def test_parallel_reads_count_in_the_batch_metrics(self):
+        requests = [
+            {"method": "GET", "path": f"/api/v1/subjects/{subject.pk}/"} for subject in self.subjects
+        ]
+        queries = [
+            int(re.search(r'desc="(\d+) queries"', response["Server-Timing"]).group(1))
+            for response in (self.post(requests), self.post(requests, parallel=True))
+        ]
+
+        self.assertGreaterEqual(queries[0], len(self.subjects))
+        self.assertEqual(queries[1], queries[0])
+
+    def test_parallel_reads_keep_the_replica_routing(self):
+        outer = RequestFactory().post("/api/v1/batch/")
+        requests = [{"method": "GET", "path": f"/api/v1/subjects/{n}/"} for n in range(4)]
+
+        def run_one(outer, item):
+            return {"status": 200, "headers": {}, "body": read_from_replica.get()}
+
+        token = read_from_replica.set(True)
+        try:
+            with mock.patch("app_api.batch.run_one", side_effect=run_one):
+                responses = run_batch(outer, requests, parallel=True)
+        finally:
+            read_from_replica.reset(token)
+
+        self.assertEqual([response["body"] for response in responses], [True] * 4)
+
+    def test_streaming_responses_are_refused(self):
+        responses = self.post([{"method": "GET", "path": "/api/v1/exports/rosters/"}]).json()
+        self.assertEqual(responses[0]["status"], 406)
+
+    def test_failed_sub_request(self):
+        run_one = batch.run_one
+
+        def failing(outer, item):
+            if item["path"].endswith(f"/{self.subjects[1].pk}/"):
+                raise RuntimeError("Boom")
+            return run_one(outer, item)
+
+        requests = [
+            {"method": "GET", "path": f"/api/v1/subjects/{subject.pk}/"} for subject in self.subjects
+        ]
+        for parallel in (False, True):
+            with self.subTest(parallel=parallel), mock.patch(
+                "app_api.batch.run_one", side_effect=failing
+            ), self.assertLogs("app_api.batch", "ERROR"):
+                responses = self.post(requests, parallel).json()
+                self.assertEqual([response["status"] for response in responses], [200, 500, 200, 200])
+
+    def test_conditional_sub_request(self):
+        path = f"/api/v1/subjects/{self.subjects[0].pk}/"
+        etag = self.post([{"method": "GET", "path": path}]).json()[0]["headers"]["ETag"]
+
+        responses = self.post(
+            [{"method": "GET", "path": path, "headers": {"If-None-Match": etag}}]
+        ).json()
+        self.assertEqual(responses[0]["status"], 304)
+
+    def test_headers_outside_the_allowlist(self):
+        response = self.client.post(
+            "/api/v1/batch/",
+            {
+                "requests": [
+                    {"method": "GET", "path": "/api/v1/subjects/", "headers": {"Host": "evil"}}
+                ]
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+        outer = RequestFactory().post("/api/v1/batch/", HTTP_X_FORWARDED_FOR="203.0.113.7")
+        request = build_request(
+            outer, "GET", "/api/v1/subjects/", headers={"X-Forwarded-For": "10.0.0.1"}
+        )
+        self.assertEqual(request.META["HTTP_X_FORWARDED_FOR"], "203.0.113.7")
+
+
+# Without replicas, whose lag keeps lists built right after a write out of the cache.
+@override_settings(DATABASE_REPLICAS=[])
+class TimetableTests(TestCase):
+    """Timetables are read from the occurrences, which follow the groups' schedules."""
+
+    # A Monday.
+    start = date(2025, 3, 3)
+
+    def setUp(self):
+        cache.clear()
+        teacher = User.objects.create(
+            email="teacher@example.com", first_name="T", last_name="T", role=Roles.TEACHER
+        )
+        subject = Subject.objects.create(name="Math")
+        self.odd, self.even = (
+            Group.objects.create(
+                name=f"Math {lesson_days.label}",
+                teacher=teacher,
+                subject=subject,
+                lesson_days=lesson_days,
+                start_date=self.start,
+                end_date=self.start + timedelta(weeks=4),
+                lesson_start_time=time(9),
+                lesson_end_time=time(10),
+            )
+            for lesson_days in (LessonDays.odd, LessonDays.even)
+        )
+        self.student = User.objects.create(
+            email="student@example.com", first_name="S", last_name="S"
+        )
+        self.student.student_groups.add(self.odd)
+
+    def occurrences(self, group):
+        return list(
+            LessonOccurrence.objects.filter(group=group)
+            .order_by("date")
+            .values_list("pk", "date", "start_time")
+        )
+
+    def timetable(self):
+        # The second week of the term.
+        start = self.start + timedelta(weeks=1)
+        response = self.client.get(
+            "/api/v1/timetable/",
+            {"student": self.student.pk, "start": start, "end": start + timedelta(days=6)},
+        )
+        self.assertEqual(response.status_code, 200)
+        return [(entry["date"], entry["group"], entry["lesson"]) for entry in response.json()]
+
+    def test_schedule_changes_rebuild_occurrences(self):
+        occurrences = self.occurrences(self.odd)
+        others = self.occurrences(self.even)
+        self.assertEqual(
+            [(day, start_time) for _, day, start_time in occurrences],
+            [(day, time(9)) for day in self.odd.lesson_dates()],
+        )
+
+        self.odd.name = "Math 1"
+        self.odd.save()
+        self.assertEqual(self.occurrences(self.odd), occurrences)
+
+        self.odd.lesson_days = LessonDays.even
+        self.odd.lesson_start_time = time(11)
+        self.odd.lesson_end_time = time(12)
+        self.odd.save()
+        self.assertEqual(
+            [(day, start_time) for _, day, start_time in self.occurrences(self.odd)],
+            [(day, time(11)) for day in self.odd.lesson_dates()],
+        )
+        self.assertEqual(self.occurrences(self.even), others)
+
+        self.odd.is_active = False
+        self.odd.save()
+        self.assertEqual(self.occurrences(self.odd), [])
+
+    def test_weekly_timetable_of_a_student(self):
+        monday = self.start + timedelta(weeks=1)
+        lesson = Lesson.objects.create(group=self.odd, lesson_date=monday, theme="Fractions")
+
+        self.assertEqual(
+            self.timetable(),
+            [
+                (str(monday), self.odd.pk, {"id": lesson.pk, "theme": "Fractions"}),
+                (str(monday + timedelta(days=2)), self.odd.pk, None),
+                (str(monday + timedelta(days=4)), self.odd.pk, None),
+            ],
+        )
+
+    def test_enrollment_changes_invalidate_timetables(self):
+        self.assertEqual({group for _, group, _ in self.timetable()}, {self.odd.pk})
+        with self.assertNumQueries(0):
+            self.timetable()
+
+        self.student.student_groups.add(self.even)
+        timetable = self.timetable()
+        self.assertEqual(len(timetable), 6)
+        self.assertEqual({group for _, group, _ in timetable}, {self.odd.pk, self.even.pk})
+
+        self.student.student_groups.remove(self.odd)
+        self.assertEqual({group for _, group, _ in self.timetable()}, {self.even.pk})
+
+
+class ScheduleConflictTests(TestCase):
+    """A teacher's active groups on the same lesson days must not overlap in time and term."""
+
+    def setUp(self):
+        self.teacher, self.other_teacher = (
+            User.objects.create(
+                email=f"teacher{number}@example.com",
+                first_name="T",
+                last_name=str(number),
+                role=Roles.TEACHER,
+            )
+            for number in (1, 2)
+        )
+        self.subject = Subject.objects.create(name="Math")
+        self.group = self.create_group("Math 1", time(9), time(10, 30))
+
+    def create_group(self, name, start_time, end_time, **fields):
+        return Group.objects.create(
+            **{
+                "name": name,
+                "teacher": self.teacher,
+                "subject": self.subject,
+                "lesson_days": LessonDays.odd,
+                "start_date": date(2025, 3, 1),
+                "end_date": date(2025, 3, 31),
+                "lesson_start_time": start_time,
+                "lesson_end_time": end_time,
+                **fields,
+            }
+        )
+
+    def errors(self, **data):
+        """Validation errors of a new group with the schedule of self.group, changed by data."""
+        serializer = GroupSerializer(
+            data={
+                "name": "Math 2",
+                "teacher": self.teacher.pk,
+                "lesson_days": LessonDays.odd,
+                "start_date": "2025-03-01",
+                "end_date": "2025-03-31",
+                "lesson_start_time": "09:00",
+                "lesson_end_time": "10:30",
+                **data,
+            }
+        )
+        serializer.is_valid()
+        return serializer.errors
+
+    def test_overlapping_schedules_are_rejected(self):
+        for data in [
+            {},
+            {"lesson_start_time": "10:00", "lesson_end_time": "11:00"},
+            {"lesson_start_time": "08:00", "lesson_end_time": "09:30"},
+            {"start_date": "2025-03-31", "end_date": "2025-04-30"},
+        ]:
+            with self.subTest(**data):
+                self.assertEqual(
+                    self.errors(**data),
+                    {"teacher": ["The teacher already teaches Math 1 at this time."]},
+                )
+
+        self.assertIn("lesson_end_time", self.errors(lesson_end_time="09:00"))
+
+    def test_other_schedules_are_allowed(self):
+        for data in [
+            {"lesson_start_time": "10:30", "lesson_end_time": "11:30"},
+            {"lesson_start_time": "08:00", "lesson_end_time": "09:00"},
+            {"lesson_days": LessonDays.even},
+            {"start_date": "2025-04-01", "end_date": "2025-04-30"},
+            {"teacher": self.other_teacher.pk},
+            {"is_active": False},
+        ]:
+            with self.subTest(**data):
+                self.assertEqual(self.errors(**data), {})
+
+        # Updates that leave the schedule alone are not checked.
+        self.create_group("Math 2", time(10), time(11))
+        serializer = GroupSerializer(self.group, data={"name": "Math 1A"}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_conflict_report(self):
+        overlapping = self.create_group("Math 2", time(10), time(11))
+        # Adjacent to self.group, overlaps Math 2.
+        adjacent = self.create_group("Math 3", time(10, 30), time(11, 30))
+        self.create_group(
+            "Math 4",
+            time(9),
+            time(10),
+            start_date=date(2025, 4, 1),
+            end_date=date(2025, 4, 30),
+        )
+        self.create_group("Math 5", time(9), time(10), lesson_days=LessonDays.even)
+        self.create_group("Math 6", time(9), time(10), is_active=False)
+        other = [
+            self.create_group(name, time(9), time(10), teacher=self.other_teacher)
+            for name in ("Math 7", "Math 8")
+        ]
+
+        def conflicts(**params):
+            response = self.client.get("/api/v1/reports/conflicts/", params)
+            self.assertEqual(response.status_code, 200)
+            return [
+                (entry["teacher"], entry["lesson_days"], [group["id"] for group in entry["groups"]])
+                for entry in response.json()
+            ]
+
+        self.assertEqual(
+            conflicts(),
+            [
+                (self.teacher.pk, LessonDays.odd, [self.group.pk, overlapping.pk]),
+                (self.teacher.pk, LessonDays.odd, [overlapping.pk, adjacent.pk]),
+                (self.other_teacher.pk, LessonDays.odd, [group.pk for group in other]),
+            ],
+        )
+        self.assertEqual(
+            conflicts(teacher=self.other_teacher.pk),
+            [(self.other_teacher.pk, LessonDays.odd, [group.pk for group in other])],
+        )
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(students=20, groups=2, teachers=1, weeks=2)
+        cls.enrollments = Group.user_set.through.objects.filter(user__role=Roles.STUDENT).count()
+
+    def rows(self, content):
+        return list(csv.reader(io.StringIO(content.decode("utf-8-sig"))))
+
+    def test_rosters(self):
+        response = self.client.get("/api/v1/exports/rosters/")
+
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.is_async)
+        rows = self.rows(b"".join(response.streaming_content))
+        self.assertEqual(rows[0][:3], ["group_id", "group", "student_id"])
+        self.assertEqual(len(rows), self.enrollments + 1)
+
+    @mock.patch("app_api.exports.EXPORT_CHUNK_SIZE", 5)
+    async def test_rosters_are_streamed_under_asgi(self):
+        response = await self.async_client.get("/api/v1/exports/rosters/")
+
+        # An async iterator is sent as it is read; a sync one would be read whole first.
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        # The byte order mark, the header and a line per enrollment, five per chunk.
+        self.assertEqual(len(chunks), math.ceil((self.enrollments + 2) / 5))
+        self.assertEqual(len(self.rows(b"".join(chunks))), self.enrollments + 1)
+
+    def marks(self, group):
+        return dict(
+            Attendance.objects.filter(lesson__group=group)
+            .values_list("student_id")
+            .annotate(Count("pk"))
+        )
+
+    def test_attendance_matrix(self):
+        group = Group.objects.first()
+        marks = self.marks(group)
+
+        response = self.client.get(f"/api/v1/exports/attendance/?group={group.pk}")
+
+        rows = self.rows(b"".join(response.streaming_content))
+        lessons = Lesson.objects.filter(group=group).count()
+        self.assertEqual(len(rows[0]), lessons + 5)
+        self.assertEqual({int(row[0]): int(row[-1]) for row in rows[1:] if int(row[-1])}, marks)
+        for row in rows[1:]:
+            self.assertEqual(row[3:-2].count("A") + row[3:-2].count("P"), int(row[-1]))
+
+    def test_attendance_matrix_ignores_lessons_added_while_streaming(self):
+        group = Group.objects.first()
+        marks = self.marks(group)
+        rows = attendance_matrix_rows(group.pk)
+        header = next(rows)
+
+        lesson = Lesson.objects.filter(group=group).earliest("lesson_date")
+        added = Lesson.objects.create(
+            group=group, theme="Added", lesson_date=lesson.lesson_date - timedelta(days=1)
+        )
+        Attendance.objects.create(lesson=added, student_id=next(iter(marks)), is_absent=True)
+
+        rows = list(rows)
+        self.assertTrue(all(len(row) == len(header) for row in rows))
+        self.assertEqual({row[0]: row[-1] for row in rows if row[-1]}, marks)
+
+    def test_attendance_matrix_keeps_marks_of_renamed_students(self):
+        group = Group.objects.first()
+        marks = self.marks(group)
+        renamed = False
+
+        def rename(execute, sql, params, many, context):
+            # Renames the marked students, to sort first, once attendance has been read.
+            nonlocal renamed
+            result = execute(sql, params, many, context)
+            if not renamed and '"app_api_attendance"' in sql:
+                renamed = True
+                for student_id in marks:
+                    User.objects.filter(pk=student_id).update(last_name=f"{student_id:010}")
+            return result
+
+        with connection.execute_wrapper(rename):
+            rows = list(attendance_matrix_rows(group.pk))
+
+        self.assertTrue(renamed)
+        self.assertEqual({row[0]: row[-1] for row in rows[1:] if row[-1]}, marks)
+
+
+class LargeTableAdminTests(TestCase):
+    """The changelists of the large tables cost a fixed number of queries."""
+
+    changelists = ["user", "student", "lesson", "attendance"]
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(students=20, groups=2, teachers=2, weeks=2)
+        cls.admin = User.objects.create_superuser(
+            email="root@example.com", password="secret", first_name="Root", last_name="Root"
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self, name, per_page):
+        model_admin = next(
+            model_admin
+            for model, model_admin in admin_site._registry.items()
+            if model._meta.model_name == name
+        )
+        with mock.patch.object(model_admin, "list_per_page", per_page):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(f"/admin/app_api/{name}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["cl"].result_list), per_page)
+        return [query["sql"] for query in queries]
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        for name in self.changelists:
+            with self.subTest(name):
+                self.assertEqual(
+                    len(self.changelist_queries(name, 3)), len(self.changelist_queries(name, 10))
+                )
+
+    @skipUnless(connection.vendor == "postgresql", "Estimates are read from the planner.")
+    def test_large_changelists_show_the_estimate(self):
+        with mock.patch("app_api.admin.ADMIN_EXACT_COUNT_LIMIT", 1):
+            queries = self.changelist_queries("lesson", 5)
+        self.assertFalse([sql for sql in queries if "COUNT(" in sql])
+        self.assertTrue([sql for sql in queries if sql.startswith("EXPLAIN")])
+
+        self.assertIsInstance(estimate_count(Lesson.objects.all()), int)
+
+    @skipUnless(connection.vendor != "postgresql", "Estimates are read from the planner.")
+    def test_other_databases_count_exactly(self):
+        self.assertIsNone(estimate_count(Lesson.objects.all()))
+
+        with mock.patch("app_api.admin.ADMIN_EXACT_COUNT_LIMIT", 1):
+            queries = self.changelist_queries("lesson", 5)
+        self.assertTrue([sql for sql in queries if "COUNT(" in sql])
+
+
+@skipUnless(connection.vendor == "sqlite", "The replica is a copy of the SQLite test database.")
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Routes reads to a second SQLite database, a copy of "default" taken at the start of
+    each test, which stands for a replica that has not caught up with later writes.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        connections.settings["replica"] = {
+            **connections.settings["default"],
+            "NAME": "file:replica?mode=memory&cache=shared",
+        }
+        # Set here rather than on the class, where the test runner would look for the
+        # alias before it exists.
+        cls.databases = {"default", "replica"}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        del connections["replica"]
+        del connections.settings["replica"]
+
+    def setUp(self):
+        cache.clear()
+        user_store.local.clear()
+        Subject.objects.create(name="Math")
+
+        for alias in self.databases:
+            connections[alias].ensure_connection()
+        connections["default"].connection.backup(connections["replica"].connection)
+
+    def subject_names(self, **headers):
+        # Past the response cache, so that the list is read from the database.
+        response_cache.invalidate("subjects")
+        response = self.client.get("/api/v1/subjects/", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        return {subject["name"] for subject in response.json()["results"]}
+
+    def test_safe_requests_read_from_a_replica(self):
+        Subject.objects.create(name="Physics")
+
+        self.assertEqual(self.subject_names(), {"Math"})
+        # Outside of requests, reads stay on the primary.
+        self.assertEqual(Subject.objects.count(), 2)
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        response = self.client.post("/api/v1/subjects/", {"name": "Physics"})
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        self.assertEqual(self.subject_names(), {"Math", "Physics"})
+        # Clients that drop the cookie are pinned by their address.
+        self.client.cookies.clear()
+        self.assertEqual(self.subject_names(), {"Math", "Physics"})
+
+    def test_authentication_reads_the_user_from_the_primary(self):
+        user = User.objects.create(email="new@example.com", first_name="New", last_name="User")
+        authorization = f"Bearer {AccessToken.for_user(user)}"
+
+        self.assertEqual(self.subject_names(authorization=authorization), {"Math"})
+        self.assertEqual(user_store.get(user.pk)[0], user)
+
+    async def test_async_requests_read_from_a_replica(self):
+        await Subject.objects.acreate(name="Physics")
+        await sync_to_async(response_cache.invalidate)("subjects")
+
+        response = await self.async_client.get("/api/v1/subjects/")
+
+        self.assertEqual({subject["name"] for subject in response.json()["results"]}, {"Math"})
+
+    async def test_async_middleware(self):
+        reads = []
+
+        async def get_response(request):
+            reads.append(read_from_replica.get())
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        await middleware(RequestFactory().get("/api/v1/subjects/"))
+        response = await middleware(RequestFactory().post("/api/v1/subjects/"))
+        await middleware(RequestFactory().get("/api/v1/subjects/"))
+
+        self.assertEqual(reads, [True, False, False])
+        self.assertIn(PIN_COOKIE, response.cookies)
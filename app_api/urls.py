@@ -9,5 +9,36 @@ router.register(prefix="teachers", viewset=views.TeacherViewSet, basename="teach
 router.register(prefix="students", viewset=views.StudentViewSet, basename="students")
 router.register(prefix="subjects", viewset=views.SubjectViewSet, basename="subjects")
 router.register(prefix="groups", viewset=views.GroupViewSet, basename="groups")
+router.register(prefix="lessons", viewset=views.LessonViewSet, basename="lessons")
+router.register(prefix="sync", viewset=views.SyncViewSet, basename="sync")
+router.register(prefix="timetable", viewset=views.TimetableViewSet, basename="timetable")
+router.register(prefix="cache-stats", viewset=views.CacheStatsViewSet, basename="cache-stats")
+router.register(prefix="batch", viewset=views.BatchViewSet, basename="batch")
+router.register(prefix="exports", viewset=views.ExportViewSet, basename="exports")
+router.register(
+    prefix="reports/students",
+    viewset=views.StudentAttendanceReportViewSet,
+    basename="student-attendance-reports",
+)
+router.register(
+    prefix="reports/lessons",
+    viewset=views.LessonAttendanceReportViewSet,
+    basename="lesson-attendance-reports",
+)
+router.register(
+    prefix="reports/groups",
+    viewset=views.GroupAttendanceReportViewSet,
+    basename="group-attendance-reports",
+)
+router.register(
+    prefix="reports/subjects",
+    viewset=views.SubjectAttendanceReportViewSet,
+    basename="subject-attendance-reports",
+)
+router.register(
+    prefix="reports/conflicts",
+    viewset=views.ScheduleConflictReportViewSet,
+    basename="schedule-conflict-reports",
+)
 
 urlpatterns = router.urls
@@ -11,3 +11,8 @@ class Roles(TextChoices):
 class LessonDays(TextChoices):
     odd = "1-3-5", "Du, Cho, Jum"
     even = "2-4-6", "Se, Pay, Sha"
+
+    @property
+    def weekdays(self):
+        """ISO weekdays (Monday is 1) on which lessons take place."""
+        return tuple(int(day) for day in self.value.split("-"))
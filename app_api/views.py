@@ -1,64 +1,147 @@
+import csv
+import json
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.filters import SearchFilter
+from rest_framework.mixins import ListModelMixin
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.viewsets import ModelViewSet
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.viewsets import GenericViewSet, ModelViewSet, ReadOnlyModelViewSet, ViewSet
 
-from .models import Group, Student, Subject, Teacher
+from . import cache, sync
+from .batch import run_batch
+from .exports import aiterate, attendance_matrix_rows, roster_rows
+from .imports import import_users, parse_csv
+from .mixins import CachedListMixin, ConditionalGetMixin, SparseFieldsMixin
+from .models import (
+    Attendance,
+    Group,
+    Lesson,
+    LessonAttendanceSummary,
+    LessonOccurrence,
+    Student,
+    StudentAttendanceSummary,
+    Subject,
+    Teacher,
+    Tombstone,
+)
+from .renderers import CSVRenderer, ORJSONRenderer, XLSXRenderer
 from .serializers import (
+    AttendanceRosterSerializer,
+    AttendanceSerializer,
+    AttendanceTotalsSerializer,
+    BatchSerializer,
     GroupSerializer,
+    LessonAttendanceSummarySerializer,
+    LessonOccurrenceSerializer,
+    LessonSerializer,
+    StudentAttendanceSummarySerializer,
     StudentSerializer,
     SubjectSerializer,
     TeacherSerializer,
     UserSerializer,
 )
+from .spreadsheets import stream_csv, stream_xlsx
 
 User = get_user_model()
 
 
-class UserViewSet(ModelViewSet):
-    queryset = User.objects.all()
+def get_id_param(request, name):
+    """Returns the integer query parameter `name`, or None if it is absent."""
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    if not value.isdigit():
+        raise ValidationError({name: "Must be an integer id."})
+    return int(value)
+
+
+class UserViewSet(ConditionalGetMixin, SparseFieldsMixin, ModelViewSet):
+    queryset = User.objects.prefetch_related("groups", "user_permissions", "student_groups")
     # permission_classes = [IsAuthenticated]
     serializer_class = UserSerializer
 
-    def list(self, request, *args, **kwargs):
-        role = request.GET.get("role")
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        role = self.request.query_params.get("role")
 
         if role:
-            self.queryset = self.queryset.filter(role=role)
-        data = self.serializer_class(self.queryset, many=True).data
+            queryset = queryset.filter(role=role)
 
-        return Response(data=data)
+        return queryset
+
+    @action(detail=False, methods=["post"], url_path="import")
+    def bulk_import(self, request):
+        """
+        Creates users in bulk from a JSON list of users or an uploaded CSV/JSON "file".
+        Invalid rows are skipped and reported by their index.
+        """
+        upload = request.FILES.get("file")
+
+        if upload is not None:
+            try:
+                content = upload.read().decode("utf-8-sig")
+                rows = json.loads(content) if upload.name.endswith(".json") else parse_csv(content)
+            except (UnicodeDecodeError, ValueError, csv.Error):
+                raise ValidationError({"file": "Must be a UTF-8 CSV or JSON file."})
+        else:
+            rows = request.data
 
+        if not isinstance(rows, list):
+            raise ValidationError({"non_field_errors": "Expected a list of users."})
 
-class TeacherViewSet(ModelViewSet):
+        report = import_users(rows)
+
+        return Response(data=report, status=status.HTTP_201_CREATED)
+
+
+class TeacherViewSet(CachedListMixin, ConditionalGetMixin, SparseFieldsMixin, ModelViewSet):
     queryset = Teacher.objects.all()
     # permission_classes = [IsAuthenticated]
     serializer_class = TeacherSerializer
+    cache_resource = "teachers"
     filter_backends = [SearchFilter]
     search_fields = ["first_name", "last_name", "email"]
 
 
-class StudentViewSet(ModelViewSet):
-    queryset = Student.objects.all()
+class StudentViewSet(CachedListMixin, ConditionalGetMixin, SparseFieldsMixin, ModelViewSet):
+    queryset = Student.objects.prefetch_related("student_groups")
     # permission_classes = [IsAuthenticated]
     serializer_class = StudentSerializer
+    cache_resource = "students"
     filter_backends = [SearchFilter]
     search_fields = ["first_name", "last_name", "email"]
 
 
-class SubjectViewSet(ModelViewSet):
+class SubjectViewSet(CachedListMixin, ConditionalGetMixin, SparseFieldsMixin, ModelViewSet):
     queryset = Subject.objects.all()
     # permission_classes = [IsAuthenticated]
     serializer_class = SubjectSerializer
+    cache_resource = "subjects"
     filter_backends = [SearchFilter]
     search_fields = ["name"]
 
 
-class GroupViewSet(ModelViewSet):
-    queryset = Group.objects.all()
+class GroupViewSet(CachedListMixin, ConditionalGetMixin, SparseFieldsMixin, ModelViewSet):
+    queryset = Group.objects.with_listing_data()
     # permission_classes = [IsAuthenticated]
     serializer_class = GroupSerializer
+    cache_resource = "groups"
+    conditional_fields = ("updated", "teacher__updated", "subject__updated")
     filter_backends = [SearchFilter]
     search_fields = [
         "name",
@@ -66,3 +149,423 @@ class GroupViewSet(ModelViewSet):
         "teacher__last_name",
         "subject__name",
     ]
+
+
+class LessonViewSet(ConditionalGetMixin, SparseFieldsMixin, ModelViewSet):
+    queryset = Lesson.objects.all()
+    # permission_classes = [IsAuthenticated]
+    serializer_class = LessonSerializer
+    filter_backends = [SearchFilter]
+    search_fields = ["theme", "group__name"]
+
+    @action(detail=True, methods=["get", "post"])
+    def attendance(self, request, pk=None):
+        """
+        GET returns the attendance roster of the lesson.
+
+        POST upserts the whole roster in one statement and returns its final state:
+            {"attendance": [{"student": <id>, "is_absent": <bool>}, ...]}
+        Students not listed keep their current attendance. Repeating a request is safe.
+        """
+        lesson = self.get_object()
+
+        if request.method == "POST":
+            serializer = AttendanceRosterSerializer(
+                data=request.data, context={"lesson": lesson}
+            )
+            serializer.is_valid(raise_exception=True)
+            marks = {
+                mark["student"]: mark["is_absent"]
+                for mark in serializer.validated_data["attendance"]
+            }
+            with transaction.atomic():
+                roster = Attendance.objects.bulk_mark(lesson, marks)
+        else:
+            roster = Attendance.objects.filter(lesson=lesson)
+
+        data = AttendanceSerializer(roster.order_by("student_id"), many=True).data
+
+        return Response(data=data)
+
+
+class SyncViewSet(ViewSet):
+    """
+    Delta sync for the mobile app.
+
+    GET /sync/?since=<ISO 8601 timestamp> returns the users, groups, subjects
+    and lessons whose "updated" is not older than "since", plus the ids of rows
+    deleted since then. Without "since" every row is returned.
+
+    Each response holds at most SYNC_PAGE_SIZE rows per resource and a "next" link
+    while rows remain; the client follows it until it is null. The "watermark" is
+    then sent as "since" on the next sync. It is read from the database clock, less
+    SYNC_WATERMARK_LAG, and rows changed after it are left to the next sync, so a
+    row changed while the client pages is sent again next time instead of being
+    missed. Tombstones are kept for SYNC_TOMBSTONE_RETENTION_DAYS; an older "since"
+    gets 410 with the code "full_resync_required".
+    """
+
+    # permission_classes = [IsAuthenticated]
+    resources = {
+        "users": (UserViewSet.queryset, UserSerializer),
+        "groups": (GroupViewSet.queryset, GroupSerializer),
+        "subjects": (SubjectViewSet.queryset, SubjectSerializer),
+        "lessons": (Lesson.objects.all(), LessonSerializer),
+    }
+    tombstones = Tombstone.objects.only("id", "created", "resource", "object_id")
+
+    @staticmethod
+    def get_since(request):
+        since = request.query_params.get("since")
+        if not since:
+            return None
+
+        since = parse_datetime(since)
+        if since is None:
+            raise ValidationError({"since": "Must be an ISO 8601 timestamp."})
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
+
+    @classmethod
+    def get_state(cls, request):
+        """Returns the sync state carried by the cursor, or that of a first page."""
+        cursor = request.query_params.get("cursor")
+        if cursor:
+            return sync.decode_state(cursor)
+        return sync.start_state(cls.get_since(request), sync.database_now(cls.tombstones.db))
+
+    @classmethod
+    def get_changes(cls, state):
+        """Yields (resource, queryset of the page, serializer class) per unfinished resource."""
+        for resource, (queryset, serializer_class) in cls.resources.items():
+            if resource not in state["done"]:
+                queryset = sync.page_queryset(queryset, state, resource, "updated")
+                yield resource, queryset, serializer_class
+
+    @classmethod
+    def get_tombstones(cls, state):
+        """Returns the page of tombstones, or None if none are to be read."""
+        if state["since"] is None or "deleted" in state["done"]:
+            return None
+        return sync.page_queryset(cls.tombstones, state, "deleted", "created")
+
+    @classmethod
+    def build_data(cls, request, state, changes, tombstones):
+        """
+        Builds the response out of the rows read for each resource and for the
+        tombstones, updating `state` to that of the next page.
+        """
+        data = {"watermark": state["watermark"], "next": None, "deleted": {}}
+
+        for resource, (_, serializer_class) in cls.resources.items():
+            rows = []
+            if resource in changes:
+                rows = sync.advance_state(state, resource, "updated", changes[resource])
+            data[resource] = serializer_class(rows, many=True, context={"request": request}).data
+            data["deleted"][resource] = []
+
+        if tombstones is not None:
+            for tombstone in sync.advance_state(state, "deleted", "created", tombstones):
+                data["deleted"][tombstone.resource].append(tombstone.object_id)
+        elif "deleted" not in state["done"]:
+            state["done"].append("deleted")
+
+        if any(name not in state["done"] for name in [*cls.resources, "deleted"]):
+            data["next"] = replace_query_param(
+                request.build_absolute_uri(), "cursor", sync.encode_state(state)
+            )
+        return data
+
+    def list(self, request):
+        state = self.get_state(request)
+        changes = {
+            resource: list(queryset) for resource, queryset, _ in self.get_changes(state)
+        }
+        tombstones = self.get_tombstones(state)
+        if tombstones is not None:
+            tombstones = list(tombstones)
+        return Response(data=self.build_data(request, state, changes, tombstones))
+
+
+class TimetableViewSet(CachedListMixin, ListModelMixin, GenericViewSet):
+    """
+    Lesson occurrences of a student or a teacher in a date window, in time order:
+
+        GET /timetable/?student=<id>&start=2025-03-03&end=2025-03-09
+        GET /timetable/?teacher=<id>
+
+    The window defaults to the current week (Monday to Sunday) and may span at most
+    TIMETABLE_MAX_DAYS days. Occurrences are read from the precomputed LessonOccurrence
+    rows of the person's groups, so a timetable costs two indexed queries (occurrences
+    and the lessons created for them) however long the groups' schedules are.
+    """
+
+    queryset = LessonOccurrence.objects.select_related("group__subject", "group__teacher")
+    # permission_classes = [IsAuthenticated]
+    serializer_class = LessonOccurrenceSerializer
+    pagination_class = None
+    cache_resource = "timetables"
+
+    def get_window(self):
+        """Returns the (start, end) dates of the requested window, both inclusive."""
+        params = self.request.query_params
+        dates = {}
+        for name in ("start", "end"):
+            value = params.get(name)
+            if value:
+                try:
+                    dates[name] = parse_date(value)
+                except ValueError:
+                    dates[name] = None
+                if dates[name] is None:
+                    raise ValidationError({name: "Must be a YYYY-MM-DD date."})
+
+        if "start" in dates:
+            start = dates["start"]
+        elif "end" in dates:
+            start = dates["end"] - timedelta(days=6)
+        else:
+            today = timezone.localdate()
+            start = today - timedelta(days=today.weekday())
+        end = dates.get("end", start + timedelta(days=6))
+
+        if end < start:
+            raise ValidationError({"end": "Must not be before start."})
+        max_days = getattr(settings, "TIMETABLE_MAX_DAYS", 62)
+        if (end - start).days >= max_days:
+            raise ValidationError({"end": f"The window may span at most {max_days} days."})
+
+        return start, end
+
+    def get_cache_key(self, request):
+        # The default window depends on today's date, not just on the query parameters.
+        start, end = self.get_window()
+        return f"{super().get_cache_key(request)}:{start}:{end}"
+
+    def get_group_ids(self):
+        """Returns a subquery of the ids of the requested student's or teacher's groups."""
+        student = get_id_param(self.request, "student")
+        teacher = get_id_param(self.request, "teacher")
+        if (student is None) == (teacher is None):
+            raise ValidationError(
+                {"non_field_errors": "Pass exactly one of ?student= or ?teacher=."}
+            )
+
+        if student is not None:
+            return Group.user_set.through.objects.filter(user_id=student).values("group_id")
+        return Group.objects.filter(teacher_id=teacher).values("pk")
+
+    def get_queryset(self):
+        return (
+            super()
+            .get_queryset()
+            .filter(group_id__in=self.get_group_ids(), date__range=self.get_window())
+            .order_by("date", "start_time", "group_id")
+        )
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        # Later lessons of a date are overwritten by the first one.
+        lessons = (
+            Lesson.objects.filter(
+                group_id__in=self.get_group_ids(), lesson_date__range=self.get_window()
+            )
+            .order_by("-pk")
+            .values_list("group_id", "lesson_date", "pk", "theme")
+        )
+        context["lessons"] = {
+            (group_id, lesson_date): {"id": pk, "theme": theme}
+            for group_id, lesson_date, pk, theme in lessons
+        }
+        return context
+
+
+class StudentAttendanceReportViewSet(ConditionalGetMixin, SparseFieldsMixin, ReadOnlyModelViewSet):
+    """Absence totals per student per group. Filters: ?student=, ?group=, ?subject=."""
+
+    queryset = StudentAttendanceSummary.objects.all()
+    # permission_classes = [IsAuthenticated]
+    serializer_class = StudentAttendanceSummarySerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        filters = {
+            "student_id": get_id_param(self.request, "student"),
+            "group_id": get_id_param(self.request, "group"),
+            "group__subject_id": get_id_param(self.request, "subject"),
+        }
+
+        return queryset.filter(**{key: value for key, value in filters.items() if value is not None})
+
+
+class LessonAttendanceReportViewSet(ConditionalGetMixin, SparseFieldsMixin, ReadOnlyModelViewSet):
+    """Present/absent totals per group per lesson date. Filters: ?group=."""
+
+    queryset = LessonAttendanceSummary.objects.all()
+    # permission_classes = [IsAuthenticated]
+    serializer_class = LessonAttendanceSummarySerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        group = get_id_param(self.request, "group")
+
+        if group is not None:
+            queryset = queryset.filter(group_id=group)
+
+        return queryset
+
+
+class GroupAttendanceReportViewSet(ConditionalGetMixin, SparseFieldsMixin, ReadOnlyModelViewSet):
+    """Absence totals per group. Filters: ?subject=."""
+
+    queryset = Group.objects.annotate(
+        lessons_count=Coalesce(Sum("studentattendancesummary__lessons_count"), 0),
+        absences_count=Coalesce(Sum("studentattendancesummary__absences_count"), 0),
+    )
+    # permission_classes = [IsAuthenticated]
+    serializer_class = AttendanceTotalsSerializer
+    conditional_fields = ("updated", "studentattendancesummary__updated")
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        subject = get_id_param(self.request, "subject")
+
+        if subject is not None:
+            queryset = queryset.filter(subject_id=subject)
+
+        return queryset
+
+
+class SubjectAttendanceReportViewSet(ConditionalGetMixin, SparseFieldsMixin, ReadOnlyModelViewSet):
+    """Absence totals per subject."""
+
+    queryset = Subject.objects.annotate(
+        lessons_count=Coalesce(Sum("group__studentattendancesummary__lessons_count"), 0),
+        absences_count=Coalesce(Sum("group__studentattendancesummary__absences_count"), 0),
+    )
+    # permission_classes = [IsAuthenticated]
+    serializer_class = AttendanceTotalsSerializer
+    conditional_fields = ("updated", "group__studentattendancesummary__updated")
+
+
+class ScheduleConflictReportViewSet(ViewSet):
+    """
+    Pairs of active groups that the same teacher teaches on the same lesson days
+    at overlapping times and terms. Filters: ?teacher=.
+    """
+
+    # permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        groups = Group.objects.all()
+        teacher = get_id_param(request, "teacher")
+
+        if teacher is not None:
+            groups = groups.filter(teacher_id=teacher)
+
+        data = [
+            {
+                "teacher": earlier["teacher"],
+                "lesson_days": earlier["lesson_days"],
+                "groups": [earlier, later],
+            }
+            for earlier, later in groups.schedule_conflicts()
+        ]
+
+        return Response(data=data)
+
+
+class ExportViewSet(ViewSet):
+    """
+    Streaming spreadsheet exports, as CSV (default) or XLSX, picked with
+    ?format=csv|xlsx or the Accept header:
+
+        GET /exports/attendance/?group=<id>  Students x lessons attendance matrix of a group.
+        GET /exports/rosters/?group=<id>     Enrolled students, of every group without ?group=.
+
+    Rows are read with chunked .iterator() queries and sent as they are produced,
+    so memory use does not grow with the size of the export. Under ASGI the chunks
+    are served through an async iterator, which the server sends as they come.
+    """
+
+    # permission_classes = [IsAuthenticated]
+    renderer_classes = [CSVRenderer, XLSXRenderer]
+
+    def handle_exception(self, exc):
+        # Errors are reported as JSON rather than as a spreadsheet.
+        self.request.accepted_renderer = ORJSONRenderer()
+        self.request.accepted_media_type = ORJSONRenderer.media_type
+        return super().handle_exception(exc)
+
+    def stream(self, rows, name):
+        renderer = self.request.accepted_renderer
+        if renderer.format == "xlsx":
+            content = stream_xlsx(rows, sheet_name=name)
+            content_type = renderer.media_type
+        else:
+            content = stream_csv(rows)
+            content_type = f"{renderer.media_type}; charset={renderer.charset}"
+        if isinstance(self.request._request, ASGIRequest):
+            content = aiterate(content)
+
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{name}.{renderer.format}"'
+        return response
+
+    @action(detail=False)
+    def attendance(self, request):
+        group_id = get_id_param(request, "group")
+        if group_id is None:
+            raise ValidationError({"group": "This parameter is required."})
+        group = get_object_or_404(Group, pk=group_id)
+
+        return self.stream(attendance_matrix_rows(group.pk), f"attendance-group-{group.pk}")
+
+    @action(detail=False)
+    def rosters(self, request):
+        group_id = get_id_param(request, "group")
+        name = "rosters" if group_id is None else f"roster-group-{group_id}"
+
+        return self.stream(roster_rows(group_id), name)
+
+
+class CacheStatsViewSet(ViewSet):
+    """Hit and miss counters of the response cache per resource."""
+
+    # permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        return Response(data=cache.stats())
+
+
+class BatchViewSet(ViewSet):
+    """
+    Runs several API calls in one HTTP round trip, e.g. on app start:
+
+        POST /batch/
+        {
+            "requests": [
+                {"method": "GET", "path": "/api/v1/groups/?fields=id,name"},
+                {"method": "POST", "path": "/api/v1/token/refresh/", "body": {"refresh": "..."}}
+            ],
+            "parallel": true
+        }
+
+    Sub-requests share the batch request's Authorization header and may add their
+    own headers (e.g. If-None-Match). The response lists {"status", "headers", "body"}
+    for every sub-request, in order. With "parallel", consecutive reads run concurrently.
+    """
+
+    # permission_classes = [IsAuthenticated]
+
+    def create(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        responses = run_batch(
+            request._request,
+            serializer.validated_data["requests"],
+            parallel=serializer.validated_data["parallel"],
+        )
+        return Response(data=responses)